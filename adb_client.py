@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+ADB Client - Talks to the local adb server directly
+Speaks the adb host protocol over the server's TCP socket (port 5037) so
+device listing, shell commands and file transfers need no `adb` process.
+"""
+
+import os
+import socket
+import struct
+import time
+
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = int(os.getenv("ANDROID_ADB_SERVER_PORT", "5037"))
+ADB_SOCKET_TIMEOUT = 10
+SYNC_CHUNK_SIZE = 64 * 1024
+
+# shell,v2 packet ids
+SHELL_STDIN = 0
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+SHELL_CLOSE_STDIN = 4
+
+
+class AdbError(Exception):
+    """The adb server or device rejected a request"""
+
+
+class AdbConnection:
+    """One socket to the adb server, used for a single service request"""
+    
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT, timeout=ADB_SOCKET_TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        """Close the socket; a read blocked on it in another thread returns"""
+        try:
+            # close() alone does not wake a thread blocked in recv()
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+    
+    def send_request(self, request):
+        """Send a length-prefixed host request and check the OKAY/FAIL status"""
+        payload = request.encode()
+        self.sock.sendall(b"%04x" % len(payload) + payload)
+        self.read_status()
+    
+    def read_status(self):
+        status = self.read_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_string())
+        raise AdbError(f"Unexpected adb server response: {status!r}")
+    
+    def read_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise AdbError("Connection closed by adb server")
+            data.extend(chunk)
+        return bytes(data)
+    
+    def read_string(self):
+        """Read a hex length-prefixed string"""
+        length = int(self.read_exact(4), 16)
+        return self.read_exact(length).decode(errors="replace")
+    
+    def read_all(self):
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+class AdbClient:
+    """Client for the local adb server"""
+    
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT, timeout=ADB_SOCKET_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+    
+    def _connect(self, timeout=None):
+        return AdbConnection(self.host, self.port, timeout or self.timeout)
+    
+    def _transport(self, serial, timeout=None):
+        """Open a connection switched to the given device"""
+        conn = self._connect(timeout)
+        try:
+            conn.send_request(f"host:transport:{serial}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+    
+    def is_available(self):
+        """Check whether an adb server is listening"""
+        try:
+            with self._connect(timeout=1) as conn:
+                conn.send_request("host:version")
+                conn.read_string()
+            return True
+        except (OSError, AdbError):
+            return False
+    
+    # ---------- Host services ----------
+    
+    @staticmethod
+    def parse_devices(text):
+        """Parse "serial\\tstate" lines into a dict"""
+        states = {}
+        for line in text.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                states[parts[0]] = parts[1]
+        return states
+    
+    def devices(self):
+        """Get serial -> state for every device the server knows"""
+        with self._connect() as conn:
+            conn.send_request("host:devices")
+            return self.parse_devices(conn.read_string())
+    
+    def track_devices(self, conn=None):
+        """Yield the device state dict every time it changes (blocks between updates)
+        
+        Args:
+            conn: AdbConnection to the server to track on. Pass one to be able
+                to stop tracking from another thread: closing it ends the
+                generator with AdbError.
+        """
+        conn = conn or self._connect()
+        try:
+            conn.sock.settimeout(None)
+            conn.send_request("host:track-devices")
+            while True:
+                yield self.parse_devices(conn.read_string())
+        finally:
+            conn.close()
+    
+    def connect_device(self, address):
+        """Ask the server to connect to a TCP device (adb connect)"""
+        with self._connect() as conn:
+            conn.send_request(f"host:connect:{address}")
+            return conn.read_string()
+    
+    # ---------- Device services ----------
+    
+    def shell(self, serial, command, timeout=None):
+        """Run a shell command on a device
+        
+        Uses the shell v2 protocol (separate stdout/stderr and an exit code).
+        Devices without it fall back to the plain shell service, where stderr
+        is merged into stdout and the exit code is echoed after the command.
+        
+        Args:
+            serial: Device serial / address
+            command: Command line as it would be passed to `adb shell`
+            timeout: Socket timeout in seconds
+        
+        Returns:
+            Tuple of (returncode, stdout bytes, stderr bytes)
+        """
+        conn = self._transport(serial, timeout)
+        try:
+            try:
+                conn.send_request(f"shell,v2,raw:{command}")
+            except AdbError:
+                conn.close()
+                return self._shell_v1(serial, command, timeout)
+            
+            stdout, stderr = bytearray(), bytearray()
+            returncode = 255
+            while True:
+                try:
+                    header = conn.read_exact(5)
+                except AdbError:
+                    break
+                packet_id, length = struct.unpack("<BI", header)
+                data = conn.read_exact(length)
+                if packet_id == SHELL_STDOUT:
+                    stdout.extend(data)
+                elif packet_id == SHELL_STDERR:
+                    stderr.extend(data)
+                elif packet_id == SHELL_EXIT:
+                    returncode = data[0] if data else 255
+                    break
+            return returncode, bytes(stdout), bytes(stderr)
+        finally:
+            conn.close()
+    
+    def _shell_v1(self, serial, command, timeout=None):
+        marker = b"__ADBRC__"
+        with self._transport(serial, timeout) as conn:
+            conn.send_request(f"shell:{command}; echo {marker.decode()}$?")
+            output = conn.read_all()
+        
+        head, found, tail = output.rpartition(marker)
+        if not found:
+            return 255, output, b""
+        try:
+            returncode = int(tail.strip())
+        except ValueError:
+            returncode = 255
+        return returncode, head, b""
+    
+    def exec_out(self, serial, command, timeout=None):
+        """Run a command with a raw binary stdout (adb exec-out)"""
+        with self._transport(serial, timeout) as conn:
+            conn.send_request(f"exec:{command}")
+            return conn.read_all()
+    
+    def exec_out_stream(self, serial, command, timeout=None):
+        """Start a long-running exec-out command (e.g. screenrecord)
+        
+        Returns:
+            The open AdbConnection; read conn.sock until it closes, and close()
+            the connection to stop the command
+        """
+        conn = self._transport(serial, timeout)
+        try:
+            conn.send_request(f"exec:{command}")
+        except Exception:
+            conn.close()
+            raise
+        # The output can pause for as long as the command likes
+        conn.sock.settimeout(None)
+        return conn
+    
+    # ---------- Sync (file transfer) ----------
+    
+    def _sync(self, serial, timeout=None):
+        conn = self._transport(serial, timeout)
+        try:
+            conn.send_request("sync:")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+    
+    @staticmethod
+    def _sync_send(conn, command, data=b""):
+        conn.sock.sendall(command + struct.pack("<I", len(data)) + data)
+    
+    def stat(self, serial, remote_path):
+        """Get (mode, size, mtime) of a device file; mode is 0 if it does not exist"""
+        with self._sync(serial) as conn:
+            self._sync_send(conn, b"STAT", remote_path.encode())
+            reply = conn.read_exact(16)
+            if reply[:4] != b"STAT":
+                raise AdbError(f"Unexpected sync response: {reply[:4]!r}")
+            self._sync_send(conn, b"QUIT")
+            return struct.unpack("<III", reply[4:])
+    
+    def pull(self, serial, remote_path, local_path, timeout=None):
+        """Copy a device file to local_path
+        
+        Written to a temporary file and renamed into place, so readers never
+        see a partial file.
+        
+        Returns:
+            Number of bytes received
+        """
+        temp_path = f"{local_path}.part"
+        received = 0
+        try:
+            with self._sync(serial, timeout) as conn, open(temp_path, "wb") as handle:
+                self._sync_send(conn, b"RECV", remote_path.encode())
+                while True:
+                    command, length = struct.unpack("<4sI", conn.read_exact(8))
+                    if command == b"DATA":
+                        handle.write(conn.read_exact(length))
+                        received += length
+                    elif command == b"DONE":
+                        break
+                    elif command == b"FAIL":
+                        raise AdbError(conn.read_exact(length).decode(errors="replace"))
+                    else:
+                        raise AdbError(f"Unexpected sync response: {command!r}")
+                self._sync_send(conn, b"QUIT")
+            os.replace(temp_path, local_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return received
+    
+    def push(self, serial, local_path, remote_path, mode=0o644, timeout=None):
+        """Copy a local file to the device"""
+        with self._sync(serial, timeout) as conn, open(local_path, "rb") as handle:
+            self._sync_send(conn, b"SEND", f"{remote_path},{mode}".encode())
+            for chunk in iter(lambda: handle.read(SYNC_CHUNK_SIZE), b""):
+                self._sync_send(conn, b"DATA", chunk)
+            conn.sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+            
+            command, length = struct.unpack("<4sI", conn.read_exact(8))
+            if command == b"FAIL":
+                raise AdbError(conn.read_exact(length).decode(errors="replace"))
+            if command != b"OKAY":
+                raise AdbError(f"Unexpected sync response: {command!r}")
+            self._sync_send(conn, b"QUIT")
+
+
+# Shared client for the default local server
+client = AdbClient()
@@ -11,10 +11,16 @@ import time
 import hashlib
 import shutil
 import tempfile
+import threading
 import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
+import adb_client
+import adb_shell
+
 # Configuration
 DEVICES = [
     {"ip": "127.0.0.1", "port": "5555", "name": "Local Device"},
@@ -28,9 +34,44 @@ APK_FILENAME = "BCAApp.apk"
 APK_DOWNLOAD_URL = "https://nc.evoonline.co.uk/index.php/s/gWgDSy5nYZnygcC/download"
 APK_EXPECTED_SHA1 = "e37b6394bd95bf792c02de6b792ab2558a381548"
 DATA_FOLDER = "data"
+STATUS_PROBE_TIMEOUT = 8  # Per-device deadline for refresh_status, in seconds
+STATUS_MAX_WORKERS = 32
+DEVICE_POLL_INTERVAL = 30  # Full status re-probe by DeviceMonitor, in seconds
+TRACK_RETRY_DELAY = 10  # Wait before restarting a failed `adb track-devices`
+MONITOR_STOP_TIMEOUT = 10  # Seconds DeviceMonitor.stop() waits for its threads
 DEVICE_SQL_FILE = "/data/data/com.bca.bcatrack/cache/cache/data/sql.db"
 TEMP_SQL_FILE = "/sdcard/sql.db"
 
+# Separates the pm and pidof output of the combined status probe
+STATUS_PROBE_MARKER = "__PIDOF__"
+
+
+def get_adb_device_states(timeout=5):
+    """Get `adb devices` once, from the adb server socket if it is running
+    
+    Returns:
+        Dict of serial -> state ('device', 'offline', 'unauthorized', ...),
+        or None if adb could not be run
+    """
+    try:
+        return adb_client.client.devices()
+    except (OSError, adb_client.AdbError):
+        pass
+    
+    # No adb server yet - the adb binary starts one
+    try:
+        result = subprocess.run(
+            ["adb", "devices"],
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+    except (subprocess.TimeoutExpired, OSError) as e:
+        print(f"⚠️  adb devices failed: {e}")
+        return None
+    
+    return adb_client.AdbClient.parse_devices("\n".join(result.stdout.splitlines()[1:]))
+
 
 def _compute_sha1(file_path):
     """Return the SHA1 hex digest for the given file."""
@@ -86,9 +127,16 @@ class ADBDevice:
         self.slave_mode = False
         
     def run_adb_command(self, command, timeout=10):
-        """Execute ADB command for this device"""
+        """Execute ADB command for this device
+        
+        Shell commands go through the device's persistent adb shell session
+        (see adb_shell); everything else runs as a one-shot adb process.
+        """
         full_command = ["adb", "-s", self.address] + command
         try:
+            if len(command) > 1 and command[0] == "shell":
+                return adb_shell.run_shell(self.address, command[1:], timeout=timeout)
+            
             result = subprocess.run(
                 full_command,
                 capture_output=True,
@@ -106,14 +154,19 @@ class ADBDevice:
     def connect(self):
         """Connect to the device"""
         print(f"🔌 Connecting to {self.name} ({self.address})...")
-        result = subprocess.run(
-            ["adb", "connect", self.address],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        try:
+            message = adb_client.client.connect_device(self.address)
+            returncode = 0
+        except (OSError, adb_client.AdbError):
+            result = subprocess.run(
+                ["adb", "connect", self.address],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            message, returncode = result.stdout, result.returncode
         
-        if result.returncode == 0 and "connected" in result.stdout.lower():
+        if returncode == 0 and "connected" in message.lower():
             self.connected = True
             print(f"✅ {self.name} connected")
             return True
@@ -124,14 +177,8 @@ class ADBDevice:
     
     def check_connection(self):
         """Check if device is still connected"""
-        result = subprocess.run(
-            ["adb", "devices"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        self.connected = self.address in result.stdout
+        states = get_adb_device_states() or {}
+        self.connected = states.get(self.address) == "device"
         return self.connected
     
     def check_app_installed(self):
@@ -160,6 +207,31 @@ class ADBDevice:
         self.app_running = False
         return False
     
+    def probe_status(self, timeout=STATUS_PROBE_TIMEOUT):
+        """Check app installed and running state in a single shell call
+        
+        Returns:
+            True if the probe completed, False if it failed or timed out
+        """
+        if not self.connected:
+            self.app_installed = False
+            self.app_running = False
+            return False
+        
+        result = self.run_adb_command(
+            ["shell", f"pm list packages {APP_PACKAGE}; echo {STATUS_PROBE_MARKER}; pidof {APP_PACKAGE}"],
+            timeout=timeout
+        )
+        if not result or STATUS_PROBE_MARKER not in result.stdout:
+            self.app_installed = False
+            self.app_running = False
+            return False
+        
+        packages, _, pids = result.stdout.partition(STATUS_PROBE_MARKER)
+        self.app_installed = f"package:{APP_PACKAGE}" in packages.split()
+        self.app_running = self.app_installed and bool(pids.strip())
+        return True
+    
     def get_app_status(self):
         """Get comprehensive app status"""
         if not self.connected:
@@ -434,18 +506,22 @@ class ADBDevice:
                 print(f"❌ Failed to copy SQL file on device (root access required)")
                 return False
             
-            # Step 2: Pull file to local machine
+            # Step 2: Pull file to local machine (sync protocol, replaced atomically)
             print(f"  → Downloading to {local_file}...")
-            result = subprocess.run(
-                ["adb", "-s", self.address, "pull", TEMP_SQL_FILE, local_file],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                print(f"❌ Failed to download SQL file")
-                return False
+            try:
+                adb_client.client.pull(self.address, TEMP_SQL_FILE, local_file, timeout=30)
+            except (OSError, adb_client.AdbError) as e:
+                print(f"  → Direct pull failed ({e}), using adb pull")
+                result = subprocess.run(
+                    ["adb", "-s", self.address, "pull", TEMP_SQL_FILE, local_file],
+                    capture_output=True,
+                    text=True,
+                    timeout=30
+                )
+                
+                if result.returncode != 0:
+                    print(f"❌ Failed to download SQL file")
+                    return False
             
             # Step 3: Clean up temp file on device
             self.run_adb_command(["shell", "rm", TEMP_SQL_FILE])
@@ -659,6 +735,7 @@ class ADBManager:
     
     def __init__(self):
         self.devices = [ADBDevice(d["ip"], d["port"], d["name"]) for d in DEVICES]
+        self.status_updated_at = None
         
     def check_adb_installed(self):
         """Check if ADB is installed"""
@@ -685,13 +762,55 @@ class ADBManager:
         
         print()
     
-    def refresh_status(self):
-        """Refresh status for all devices"""
+    def refresh_status(self, timeout=STATUS_PROBE_TIMEOUT):
+        """Refresh status for all devices
+        
+        Runs `adb devices` once, then probes every connected device in parallel
+        so the refresh takes about as long as the slowest device, capped at
+        timeout seconds per device.
+        """
+        states = get_adb_device_states()
+        if states is None:
+            states = {}
+        
+        self.apply_device_states(states, probe=False)
+        self.probe_devices([d for d in self.devices if d.connected], timeout)
+        self.status_updated_at = datetime.now()
+    
+    def apply_device_states(self, states, probe=True, timeout=STATUS_PROBE_TIMEOUT):
+        """Update connected flags from parsed `adb devices` states
+        
+        Args:
+            states: Dict of serial -> state (see get_adb_device_states)
+            probe: Re-probe app status for devices that just came online
+        
+        Returns:
+            List of devices whose connected flag changed
+        """
+        changed = []
         for device in self.devices:
-            device.check_connection()
-            if device.connected:
-                device.check_app_installed()
-                device.check_app_running()
+            connected = states.get(device.address) == "device"
+            if connected != device.connected:
+                changed.append(device)
+            device.connected = connected
+            if not connected:
+                device.app_installed = False
+                device.app_running = False
+        
+        if probe:
+            self.probe_devices([d for d in changed if d.connected], timeout)
+            if changed:
+                self.status_updated_at = datetime.now()
+        return changed
+    
+    def probe_devices(self, devices, timeout=STATUS_PROBE_TIMEOUT):
+        """Run probe_status on the given devices in parallel"""
+        if not devices:
+            return
+        
+        workers = min(len(devices), STATUS_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="adb-status") as executor:
+            list(executor.map(lambda device: device.probe_status(timeout), devices))
     
     def show_devices(self):
         """Display all devices and their status"""
@@ -825,6 +944,164 @@ class ADBManager:
         return device.uninstall_app()
 
 
+class DeviceMonitor:
+    """Keeps ADBManager device state current in the background
+    
+    Connection changes are picked up from `adb track-devices` as they happen
+    and trigger a status probe of just that device. App install/running state
+    is not reported by adb, so every device is also re-probed each
+    poll_interval; if track-devices is unavailable this poll is all that runs.
+    
+    Each start() begins a new generation with its own wake event; the loops
+    only carry on while their generation is current, so threads a timed-out
+    stop() left behind exit instead of running alongside the new ones.
+    """
+    
+    def __init__(self, manager, poll_interval=DEVICE_POLL_INTERVAL):
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.tracking = False
+        self.running = False
+        self._refresh_lock = threading.Lock()
+        self._state_lock = threading.Lock()  # running/generation vs publishing the track stream
+        self._generation = 0
+        self._wake = threading.Event()
+        self._threads = []
+        self._track_process = None
+        self._track_conn = None
+    
+    def start(self):
+        """Start the tracking and polling threads"""
+        with self._state_lock:
+            if self.running:
+                return False
+            self.running = True
+            self._generation += 1
+            self._wake = threading.Event()
+            args = (self._generation, self._wake)
+        self._threads = [
+            threading.Thread(target=self._poll_loop, args=args, name="adb-poll", daemon=True),
+            threading.Thread(target=self._track_loop, args=args, name="adb-track", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return True
+    
+    def stop(self, timeout=MONITOR_STOP_TIMEOUT):
+        """Stop both threads and wait (up to timeout seconds) for them to exit"""
+        with self._state_lock:
+            self.running = False
+            self._wake.set()
+            process = self._track_process
+            conn = self._track_conn
+        if process and process.poll() is None:
+            process.kill()
+        if conn:
+            conn.close()
+        
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(max(0, deadline - time.monotonic()))
+    
+    def _active(self, generation):
+        return self.running and self._generation == generation
+    
+    def _publish_track_stream(self, generation, conn=None, process=None):
+        """Make the track stream visible to stop(); False if this generation has been stopped"""
+        with self._state_lock:
+            if not self._active(generation):
+                return False
+            if conn:
+                self._track_conn = conn
+            if process:
+                self._track_process = process
+            return True
+    
+    def refresh(self):
+        """Probe every device now (serialised with the background poll)"""
+        with self._refresh_lock:
+            self.manager.refresh_status()
+        return self.manager.status_updated_at
+    
+    def _poll_loop(self, generation, wake):
+        while self._active(generation):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️  Device poll failed: {e}")
+            wake.wait(self.poll_interval)
+    
+    def _track_loop(self, generation, wake):
+        while self._active(generation):
+            try:
+                self._track_devices(generation)
+            except Exception as e:
+                print(f"⚠️  adb track-devices failed: {e}")
+            if self._generation == generation:
+                self.tracking = False
+            if self._active(generation):
+                wake.wait(TRACK_RETRY_DELAY)
+    
+    def _track_devices(self, generation):
+        """Follow device list updates until the stream ends
+        
+        Reads host:track-devices straight from the adb server when it is
+        running, otherwise from an `adb track-devices` process.
+        """
+        if adb_client.client.is_available():
+            conn = adb_client.AdbConnection(adb_client.client.host, adb_client.client.port)
+            # stop() may have run before the connection was published
+            if not self._publish_track_stream(generation, conn=conn):
+                conn.close()
+            try:
+                for states in adb_client.client.track_devices(conn):
+                    if not self._active(generation):
+                        return
+                    self.tracking = True
+                    with self._refresh_lock:
+                        self.manager.apply_device_states(states)
+            except (OSError, adb_client.AdbError):
+                # stop() closes the connection to end the blocking read
+                if self._active(generation):
+                    raise
+            finally:
+                with self._state_lock:
+                    if self._track_conn is conn:
+                        self._track_conn = None
+                conn.close()
+            return
+        
+        # The output is a stream of device lists, each prefixed with its length
+        # as 4 hex digits and containing "serial\tstate" lines
+        process = subprocess.Popen(
+            ["adb", "track-devices"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        if not self._publish_track_stream(generation, process=process):
+            process.kill()
+        try:
+            while self._active(generation):
+                header = process.stdout.read(4)
+                if len(header) < 4:
+                    break
+                payload = process.stdout.read(int(header, 16)).decode(errors="replace")
+                self.tracking = True
+                
+                states = adb_client.AdbClient.parse_devices(payload)
+                
+                with self._refresh_lock:
+                    self.manager.apply_device_states(states)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            with self._state_lock:
+                if self._track_process is process:
+                    self._track_process = None
+
+
 def show_menu():
     """Display main menu"""
     print("\n" + "="*60)
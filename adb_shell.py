@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+ADB Shell Sessions - Persistent `adb shell` per device
+Runs shell commands through one long-lived `adb -s <address> shell` process
+per device instead of starting a new adb client for every tap or pidof
+"""
+
+import os
+import socket
+import subprocess
+import threading
+import time
+import uuid
+
+import adb_client
+
+SESSION_START_TIMEOUT = 5  # Seconds to wait for a new shell to answer
+SESSION_RETRY_DELAY = 5  # Seconds before retrying a device whose session died
+
+# address -> ShellSession
+_sessions = {}
+# address -> time.monotonic() of the last session failure
+_failed_at = {}
+# address -> lock held while that device's session is being started
+_start_locks = {}
+_sessions_lock = threading.Lock()
+
+
+class ShellSessionError(Exception):
+    """The shell session died while running a command"""
+
+
+class ShellSession:
+    """One `adb shell` process with framed command/response
+    
+    Each command runs in its own subshell, so it behaves like a one-shot
+    `adb shell` (no cwd or variables carried over, `exit` ends only the
+    command), and is followed by markers echoed on stdout (with the exit
+    code) and stderr, so output can be split per command without closing the
+    shell.
+    Commands run one at a time; callers that find the session busy should use
+    a one-shot subprocess instead of waiting.
+    """
+    
+    def __init__(self, address):
+        self.address = address
+        self.lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+        self._closed = False
+        self.process = subprocess.Popen(
+            ["adb", "-s", address, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        for name in ('stdout', 'stderr'):
+            threading.Thread(
+                target=self._read_stream,
+                args=(name, getattr(self.process, name)),
+                name=f"adb-shell-{name}",
+                daemon=True
+            ).start()
+    
+    @property
+    def alive(self):
+        return not self._closed and self.process.poll() is None
+    
+    def _read_stream(self, name, stream):
+        fd = stream.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            with self._cond:
+                if not chunk:
+                    self._closed = True
+                    self._cond.notify_all()
+                    return
+                self._buffers[name].extend(chunk)
+                self._cond.notify_all()
+    
+    def _wait_for(self, predicate, timeout):
+        """Wait until predicate() is true; raise on timeout or EOF"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not predicate():
+                if self._closed:
+                    raise ShellSessionError(f"adb shell for {self.address} closed")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(["adb", "-s", self.address, "shell"], timeout)
+                self._cond.wait(remaining)
+    
+    def _write(self, data):
+        try:
+            self.process.stdin.write(data.encode())
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            self._closed = True
+            raise ShellSessionError(f"adb shell for {self.address} closed: {e}")
+    
+    def start(self, timeout=SESSION_START_TIMEOUT):
+        """Wait for the shell to answer, so a dead device fails before any command is sent"""
+        token = f"__ADBSH_{uuid.uuid4().hex}__"
+        self._write(f"echo {token}\n")
+        marker = f"{token}\n".encode()
+        self._wait_for(lambda: marker in self._buffers['stdout'], timeout)
+        with self._cond:
+            self._buffers['stdout'].clear()
+            self._buffers['stderr'].clear()
+    
+    def run(self, command, timeout=30):
+        """Run a shell command line in this session
+        
+        Must be called with self.lock held.
+        
+        Args:
+            command: Command line as it would be passed to `adb shell`
+            timeout: Seconds to wait for the command to finish
+        
+        Returns:
+            Tuple of (returncode, stdout bytes, stderr bytes)
+        """
+        token = f"__ADBSH_{uuid.uuid4().hex}__"
+        out_marker = f"\n{token}:".encode()
+        err_marker = f"\n{token}\n".encode()
+        
+        # The subshell keeps cd, variables and `exit` from touching the session;
+        # stdin is detached so the command cannot swallow the markers; the
+        # extra newlines before each marker are stripped again below
+        self._write(
+            f"( {command}\n) </dev/null\n"
+            f"__rc=$?; echo; echo {token}:$__rc; echo >&2; echo {token} >&2\n"
+        )
+        
+        def finished():
+            stdout = self._buffers['stdout']
+            start = stdout.find(out_marker)
+            if start < 0 or stdout.find(b"\n", start + len(out_marker)) < 0:
+                return False
+            # Devices without the shell v2 protocol merge stderr into stdout
+            return err_marker in self._buffers['stderr'] or err_marker in stdout[start:]
+        
+        self._wait_for(finished, timeout)
+        
+        with self._cond:
+            stdout = bytes(self._buffers['stdout'])
+            stderr = bytes(self._buffers['stderr'])
+            self._buffers['stdout'].clear()
+            self._buffers['stderr'].clear()
+        
+        start = stdout.find(out_marker)
+        end = stdout.find(b"\n", start + len(out_marker))
+        returncode = int(stdout[start + len(out_marker):end].strip() or 255)
+        
+        if err_marker in stderr:
+            stderr = stderr[:stderr.find(err_marker)]
+        else:
+            # Merged streams: whatever came after the exit code is stderr
+            tail = stdout[end + 1:]
+            stderr = tail[:tail.find(err_marker)] if err_marker in tail else tail
+            stderr = stderr[:-1] if stderr.endswith(b"\n") else stderr
+        
+        return returncode, stdout[:start], stderr
+    
+    def close(self):
+        """Terminate the adb shell process"""
+        self._closed = True
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+def _get_session(address):
+    """Get the session for a device, starting one if needed
+    
+    Returns:
+        ShellSession, or None if the device recently failed to start one
+    """
+    with _sessions_lock:
+        session = _sessions.get(address)
+        if session and session.alive:
+            return session
+        start_lock = _start_locks.setdefault(address, threading.Lock())
+    
+    # Only one thread starts a device's session; other devices are not held up
+    with start_lock:
+        with _sessions_lock:
+            session = _sessions.get(address)
+            if session and session.alive:
+                return session
+            failed_at = _failed_at.get(address)
+            if failed_at and time.monotonic() - failed_at < SESSION_RETRY_DELAY:
+                return None
+            _sessions.pop(address, None)
+        
+        if session:
+            session.close()
+        
+        new_session = None
+        try:
+            new_session = ShellSession(address)
+            new_session.start()
+        except (ShellSessionError, subprocess.TimeoutExpired, OSError) as e:
+            print(f"⚠️  Could not open adb shell session for {address}: {e}")
+            if new_session:
+                new_session.close()
+            with _sessions_lock:
+                _failed_at[address] = time.monotonic()
+            return None
+        
+        with _sessions_lock:
+            _failed_at.pop(address, None)
+            _sessions[address] = new_session
+        return new_session
+
+
+def _drop_session(address, session):
+    """Close a broken session so the next command starts a fresh one"""
+    with _sessions_lock:
+        if _sessions.get(address) is session:
+            del _sessions[address]
+    session.close()
+
+
+def close_session(address):
+    """Close the session for a device (e.g. after disconnecting it)"""
+    with _sessions_lock:
+        session = _sessions.pop(address, None)
+    if session:
+        session.close()
+
+
+def close_all_sessions():
+    """Close every open session"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def run_shell(address, args, timeout=30, text=True):
+    """Run `adb -s <address> shell <args>` through the device's session
+    
+    Falls back to a direct adb server request (or a one-shot adb process if
+    the server cannot be reached) when the session is busy with another
+    command or cannot be started. If the session dies part-way through a
+    command it is not re-run (it may already have taken effect); the result
+    has returncode 255 like an adb connection error.
+    
+    Args:
+        address: Device address (ip:port)
+        args: Shell arguments, joined with spaces as adb itself does
+        timeout: Seconds before subprocess.TimeoutExpired is raised
+        text: Decode stdout/stderr as text
+    
+    Returns:
+        subprocess.CompletedProcess
+    """
+    full_command = ["adb", "-s", address, "shell"] + list(args)
+    
+    session = _get_session(address)
+    if session and session.lock.acquire(blocking=False):
+        try:
+            returncode, stdout, stderr = session.run(" ".join(str(a) for a in args), timeout)
+        except subprocess.TimeoutExpired:
+            _drop_session(address, session)
+            raise
+        except ShellSessionError as e:
+            _drop_session(address, session)
+            returncode, stdout, stderr = 255, b"", str(e).encode()
+        finally:
+            session.lock.release()
+        
+        if text:
+            stdout = stdout.decode(errors="replace")
+            stderr = stderr.decode(errors="replace")
+        return subprocess.CompletedProcess(full_command, returncode, stdout, stderr)
+    
+    # Straight to the adb server socket; the adb binary is the last resort
+    try:
+        returncode, stdout, stderr = adb_client.client.shell(address, " ".join(str(a) for a in args), timeout)
+    except socket.timeout:
+        raise subprocess.TimeoutExpired(full_command, timeout)
+    except (OSError, adb_client.AdbError):
+        return subprocess.run(full_command, capture_output=True, text=text, timeout=timeout)
+    
+    if text:
+        stdout = stdout.decode(errors="replace")
+        stderr = stderr.decode(errors="replace")
+    return subprocess.CompletedProcess(full_command, returncode, stdout, stderr)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Detection pool benchmark
+Runs detect_current_screen over the bundled screen_templates with the shared
+matching pool at several sizes, first one detection at a time and then with
+several devices detecting concurrently, and reports the speedup over
+inline (single worker) matching.
+
+Usage: python3 benchmarks/bench_detection_pool.py [workers ...]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+
+import screen_detector
+import init_screen_control_db
+from bench_template_matching import create_background, place_template
+
+DEFAULT_WORKERS = sorted({1, 2, 4, os.cpu_count() or 1})
+CONCURRENT_DEVICES = 4
+DETECTIONS = 5
+
+
+def create_template_database(db_path):
+    """Create screen_templates with the bundled defaults"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE screen_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            filename TEXT,
+            confidence_threshold REAL DEFAULT 0.7,
+            priority INTEGER DEFAULT 0,
+            search_region TEXT,
+            exclusive INTEGER DEFAULT 0,
+            capture_width INTEGER,
+            capture_height INTEGER
+        )
+    """)
+    width, height = init_screen_control_db.BUNDLED_TEMPLATE_RESOLUTION
+    conn.executemany(
+        "INSERT INTO screen_templates (name, filename, confidence_threshold, priority, capture_width, capture_height) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(name, filename, threshold, priority, width, height)
+         for name, filename, threshold, priority in init_screen_control_db.DEFAULT_TEMPLATES]
+    )
+    conn.commit()
+    conn.close()
+
+
+def detect_many(screenshot, count):
+    """Run count exhaustive detections (every template evaluated)"""
+    for _ in range(count):
+        screen_detector.detect_current_screen(screenshot, exhaustive=True)
+
+
+def time_sequential(screenshot):
+    start = time.perf_counter()
+    detect_many(screenshot, DETECTIONS)
+    return (time.perf_counter() - start) / DETECTIONS
+
+
+def time_concurrent(screenshot):
+    """Several devices detecting at once, like parallel /current-screen calls"""
+    threads = [
+        threading.Thread(target=detect_many, args=(screenshot, DETECTIONS))
+        for _ in range(CONCURRENT_DEVICES)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - start) / (DETECTIONS * CONCURRENT_DEVICES)
+
+
+def run_benchmark(worker_counts):
+    """Time detection for each pool size"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'screen_control.db')
+        create_template_database(db_path)
+        screen_detector.DB_PATH = db_path
+        screen_detector.TEMPLATES_DIR = os.path.join(BENCH_DIR, '..', 'screen_templates')
+        screen_detector.get_templates(refresh=True)
+
+        template = cv2.imread(os.path.join(screen_detector.TEMPLATES_DIR, 'noload.png'))
+        screenshot, _ = place_template(create_background(), template, 1.0, seed=0)
+
+        # Warm the template store
+        detect_many(screenshot, 1)
+
+        print(f"Detection pool benchmark ({os.cpu_count()} CPUs, "
+              f"{len(screen_detector.get_templates())} templates)")
+        print("=" * 66)
+        print(f"{'workers':>7} {'single ms':>10} {'speedup':>8} "
+              f"{f'{CONCURRENT_DEVICES} devices ms':>16} {'speedup':>8}")
+        print("-" * 66)
+
+        baseline = None
+        for workers in worker_counts:
+            screen_detector.set_match_workers(workers)
+            single = time_sequential(screenshot)
+            concurrent = time_concurrent(screenshot)
+            if baseline is None:
+                baseline = (single, concurrent)
+            print(f"{workers:>7} {single * 1000:>10.1f} {baseline[0] / single:>7.1f}x "
+                  f"{concurrent * 1000:>16.1f} {baseline[1] / concurrent:>7.1f}x")
+
+        print("=" * 66)
+        print("(times are per detection; speedups relative to the first row)")
+
+
+if __name__ == "__main__":
+    requested = [int(arg) for arg in sys.argv[1:]] or DEFAULT_WORKERS
+    run_benchmark(requested)
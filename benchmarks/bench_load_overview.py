@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Load overview benchmark
+Feeds get_load_overview synthetic DWJJOB/DWVVEH tables of increasing size
+and reports how the load index build and overview time scale with the
+number of rows.
+
+Usage: python3 benchmarks/bench_load_overview.py [rows ...]
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import server
+import vehicle_lookup
+import load_index
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+VEHICLES_PER_LOAD = 8
+REPEATS = 3
+
+
+def create_synthetic_database(db_path, total_rows, seed=42):
+    """Create a sql.db lookalike with roughly total_rows DWJJOB + DWVVEH rows"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE DWJJOB (
+            dwjLoad TEXT, dwjType TEXT, dwjDate INTEGER, dwjTime TEXT,
+            dwjCust TEXT, dwjName TEXT, dwjTown TEXT, dwjPostco TEXT,
+            dwjVehs INTEGER, dwjAdrCod TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE DWVVEH (
+            dwvLoad TEXT, dwvPos INTEGER, dwvVehRef TEXT, dwvModDes TEXT,
+            dwvColDes TEXT, dwvStatus TEXT, dwvColCus TEXT, dwvColCod TEXT,
+            dwvDelCus TEXT, dwvDelCod TEXT
+        )
+    """)
+    
+    jobs = []
+    vehicles = []
+    load_seq = 0
+    while len(jobs) + len(vehicles) < total_rows:
+        load_seq += 1
+        load_num = f"L{load_seq:07d}"
+        day = 20250101 + (load_seq % 28) + 100 * (load_seq % 12)
+        
+        # One in five loads collects from two sites
+        collections = [(f"CUST{rng.randint(1, 50)}", f"C{n}") for n in range(1 if load_seq % 5 else 2)]
+        delivery = (f"CUST{rng.randint(1, 50)}", "D1")
+        
+        for cust, code in collections:
+            jobs.append((load_num, 'C', day, '08:00', cust, f"Site {code}", 'Town', 'AB1 2CD', VEHICLES_PER_LOAD, code))
+        jobs.append((load_num, 'D', day, '14:00', delivery[0], 'Depot', 'City', 'EF3 4GH', VEHICLES_PER_LOAD, delivery[1]))
+        
+        for pos in range(1, VEHICLES_PER_LOAD + 1):
+            col_cust, col_code = collections[pos % len(collections)]
+            vehicles.append((
+                load_num, pos, f"AB{load_seq % 100:02d}{pos}XYZ", 'FORD FOCUS', 'BLUE', 'N',
+                col_cust, col_code, delivery[0], delivery[1]
+            ))
+    
+    cursor.executemany("INSERT INTO DWJJOB VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", jobs)
+    cursor.executemany("INSERT INTO DWVVEH VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", vehicles)
+    conn.commit()
+    conn.close()
+    
+    return len(jobs), len(vehicles), load_seq
+
+
+def create_override_database(db_path):
+    """Create an empty vehicle_overrides table so lookups behave as in production"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE vehicle_overrides (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            registration TEXT UNIQUE,
+            make_model TEXT,
+            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+
+def time_call(func, repeats=REPEATS, before=None):
+    """Return the best wall time of func over several runs"""
+    timings = []
+    for _ in range(repeats):
+        if before:
+            before()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def reset_index(db_path):
+    """Force the next ensure_index call to rebuild the derived database"""
+    load_index._index_state['signature'] = None
+    index_path = load_index.get_index_path(db_path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+
+def reset_snapshot():
+    """Force the next get_load_overview call to re-read sql.db"""
+    server.load_snapshot = None
+
+
+def run_benchmark(sizes):
+    """Time get_load_overview for each synthetic table size"""
+    print("Load overview benchmark")
+    print("=" * 78)
+    print(f"{'rows':>8} {'jobs':>8} {'vehicles':>9} {'loads':>7} {'index ms':>9} "
+          f"{'cold ms':>9} {'us/row':>8} {'cached ms':>10}")
+    print("-" * 78)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        override_db = os.path.join(tmp_dir, 'screen_control.db')
+        create_override_database(override_db)
+        vehicle_lookup.DB_PATH = override_db
+        
+        for size in sizes:
+            db_path = os.path.join(tmp_dir, f'sql_{size}.db')
+            job_count, vehicle_count, load_count = create_synthetic_database(db_path, size)
+            server.get_db_path = lambda path=db_path: path
+            
+            # Index: derived database built once per pulled sql.db
+            index, _ = time_call(lambda: load_index.ensure_index(db_path), before=lambda: reset_index(db_path))
+            
+            # Cold: read the index and build the overview from scratch
+            cold, overview = time_call(lambda: server.get_load_overview('date_desc'), before=reset_snapshot)
+            
+            if 'error' in overview:
+                print(f"{size:>8} error: {overview['error']}")
+                continue
+            
+            # Cached: database unchanged since the previous call
+            cached, _ = time_call(lambda: server.get_load_overview('date_desc'))
+            
+            rows = job_count + vehicle_count
+            print(f"{rows:>8} {job_count:>8} {vehicle_count:>9} {overview['total_loads']:>7} "
+                  f"{index * 1000:>9.1f} {cold * 1000:>9.1f} {cold * 1e6 / rows:>8.2f} {cached * 1000:>10.3f}")
+    
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    requested = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    run_benchmark(requested)
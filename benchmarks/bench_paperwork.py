@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Paperwork generation benchmark
+Generates loadsheets and timesheets from synthetic rows, first reading the
+workbook template and signatures from disk for every document (as the
+scripts do on their own) and then through paperwork_engine.TemplateCache,
+and reports the time per document and whether the outputs match.
+
+PDF conversion runs too if LibreOffice is installed, which will dominate
+the timings; without it only the xlsx is produced.
+
+Usage: python3 benchmarks/bench_paperwork.py [documents]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from openpyxl import load_workbook
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+
+import paperwork_engine
+from scripts import loadsheet, timesheet
+
+DEFAULT_DOCUMENTS = 10
+WEEK_DATES = ['20251013', '20251014', '20251015', '20251016', '20251017']
+
+
+def loadsheet_data(index):
+    """One load with a collection, a delivery and 8 cars"""
+    load_number = f"$S{300000 + index}"
+    jobs = [
+        {'dwjtype': job_type, 'dwjload': load_number, 'dwjdate': WEEK_DATES[index % len(WEEK_DATES)],
+         'dwjname': name, 'dwjpostco': postcode, 'dwjcust': 'BCA', 'dwjadrcod': code,
+         'dwjtown': town, 'dwjvehs': 8}
+        for job_type, name, postcode, code, town in [
+            ('C', 'WBAC ASHFORD', 'TN24 0SE', '1', 'ASHFORD'),
+            ('D', 'BCA BLACKBUSHE', 'GU17 9LG', '2', 'BLACKBUSHE'),
+        ]
+    ]
+    cars = [
+        {'dwvvehref': f"AB{index % 100:02d}C{car:02d}", 'dwvmoddes': 'FORD FOCUS 1.0 TITANIUM',
+         'dwvcolcus': 'BCA', 'dwvcolcod': '1', 'dwvdelcus': 'BCA', 'dwvdelcod': '2'}
+        for car in range(8)
+    ]
+    return {'data': jobs + cars}
+
+
+def timesheet_data(index):
+    """A week of loads plus time entries"""
+    rows = []
+    for day, date in enumerate(WEEK_DATES):
+        for load in range(2):
+            load_number = f"$S{400000 + index * 100 + day * 10 + load}"
+            for job_type, town in (('C', 'ASHFORD'), ('D', 'BLACKBUSHE')):
+                rows.append({'dwjtype': job_type, 'dwjload': load_number, 'dwjdate': date,
+                             'dwjcust': 'BCA', 'dwjtown': town, 'dwjvehs': 8})
+        rows.append({
+            'date': f"{date[6:8]}/{date[4:6]}/{date[2:4]}", 'day': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'][day],
+            'start_time': '07:00', 'finsh_time': '17:30', 'total_hours': '10.5',
+            'driver': 'A DRIVER', 'fleet_reg': 'FL21 ABC', 'start_mileage': '1000', 'end_mileage': '1400'
+        })
+    return {'data': rows}
+
+
+def sheet_values(path):
+    """Cell values of the generated sheet, for comparing the two runs"""
+    sheet = load_workbook(path).active
+    return [cell.value for row in sheet.iter_rows() for cell in row], len(sheet._images)
+
+
+def time_documents(generate, make_data, documents, templates):
+    """Generate documents and return (ms per document, last excel path)"""
+    start = time.perf_counter()
+    excel_path = None
+    for index in range(documents):
+        excel_path, _ = generate(make_data(index), templates=templates)
+        if not excel_path:
+            raise RuntimeError("Generation failed, see logs/")
+    return (time.perf_counter() - start) * 1000 / documents, excel_path
+
+
+def run_benchmark(documents):
+    output_root = tempfile.mkdtemp(prefix="bench-paperwork-")
+    try:
+        for module in (loadsheet, timesheet):
+            module.PAPERWORK_ROOT = output_root
+        loadsheet.TEMPLATE_PATH = os.path.join(REPO_DIR, 'templates', 'loadsheet.xlsx')
+        timesheet.TEMPLATE_PATH = os.path.join(REPO_DIR, 'templates', 'timesheet.xlsx')
+        loadsheet.SIGNATURE_ROOT = os.path.join(REPO_DIR, 'signature')
+
+        pdf = 'yes' if shutil.which('libreoffice') else 'no (xlsx only)'
+        print(f"Paperwork benchmark ({documents} documents each, PDF conversion: {pdf})")
+        print("=" * 66)
+        print(f"{'document':<10} {'from disk ms':>13} {'cached ms':>10} {'speedup':>8} {'same output':>12}")
+        print("-" * 66)
+
+        for name, generate, make_data in [
+            ('loadsheet', loadsheet.generate_loadsheet, loadsheet_data),
+            ('timesheet', timesheet.generate_timesheet, timesheet_data),
+        ]:
+            uncached, uncached_path = time_documents(generate, make_data, documents, None)
+            uncached_values = sheet_values(uncached_path)
+
+            cache = paperwork_engine.TemplateCache()
+            # First document parses the template, as after a server start
+            generate(make_data(0), templates=cache)
+            cached, cached_path = time_documents(generate, make_data, documents, cache)
+            same = 'yes' if sheet_values(cached_path) == uncached_values else 'NO'
+
+            print(f"{name:<10} {uncached:>13.1f} {cached:>10.1f} {uncached / cached:>7.1f}x {same:>12}")
+
+        print("=" * 66)
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DOCUMENTS)
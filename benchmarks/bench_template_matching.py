@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Template matching benchmark
+Pastes each bundled screen_templates image into a synthetic screenshot at
+several scales and compares match_template_multiscale (full resolution at
+every scale) with match_template_coarse_to_fine (reduced-resolution pass plus
+full-resolution refinement) for accuracy and time.
+
+Usage: python3 benchmarks/bench_template_matching.py [scale ...]
+"""
+
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import screen_detector
+
+# Resolution the bundled templates were captured at (bionag.png is a full screen)
+SCREEN_WIDTH = 1440
+SCREEN_HEIGHT = 3040
+DEFAULT_TRUE_SCALES = [0.9, 1.0, 1.1]
+THRESHOLD = 0.7
+LOCATION_TOLERANCE = 4  # pixels
+REPEATS = 3
+
+
+def create_background(seed=42):
+    """Create a screenshot lookalike: flat panels, some text-like noise"""
+    rng = np.random.default_rng(seed)
+    screen = np.full((SCREEN_HEIGHT, SCREEN_WIDTH, 3), 235, dtype=np.uint8)
+
+    for _ in range(40):
+        x, y = int(rng.integers(0, SCREEN_WIDTH - 200)), int(rng.integers(0, SCREEN_HEIGHT - 100))
+        w, h = int(rng.integers(100, 600)), int(rng.integers(40, 300))
+        colour = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), colour, -1)
+
+    noise = rng.normal(0, 6, screen.shape)
+    return np.clip(screen + noise, 0, 255).astype(np.uint8)
+
+
+def place_template(background, template, scale, seed):
+    """Paste a resized template at a random position
+
+    Returns:
+        Tuple of (screenshot, (x, y)), or None if the template does not fit
+    """
+    rng = np.random.default_rng(seed)
+    template_h, template_w = template.shape[:2]
+    new_w, new_h = int(template_w * scale), int(template_h * scale)
+    if new_w > SCREEN_WIDTH or new_h > SCREEN_HEIGHT:
+        return None
+
+    resized = cv2.resize(template, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    x = int(rng.integers(0, SCREEN_WIDTH - new_w + 1))
+    y = int(rng.integers(0, SCREEN_HEIGHT - new_h + 1))
+
+    screenshot = background.copy()
+    screenshot[y:y + new_h, x:x + new_w] = resized
+    return screenshot, (x, y)
+
+
+def time_call(func, repeats=REPEATS):
+    """Return the best wall time of func over several runs"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def is_correct(match, position):
+    """Matched, and at the position the template was pasted"""
+    if not match or not match['matched']:
+        return False
+    location = match['location']
+    return (abs(location['x'] - position[0]) <= LOCATION_TOLERANCE
+            and abs(location['y'] - position[1]) <= LOCATION_TOLERANCE)
+
+
+def run_benchmark(true_scales):
+    """Compare both matchers on every bundled template at each scale"""
+    template_paths = sorted(glob.glob(os.path.join(screen_detector.TEMPLATES_DIR, '*.png')))
+    if not template_paths:
+        print(f"No templates found in {screen_detector.TEMPLATES_DIR}")
+        return
+
+    background = create_background()
+    matchers = [
+        ('multiscale', screen_detector.match_template_multiscale),
+        ('coarse-to-fine', screen_detector.match_template_coarse_to_fine),
+    ]
+    totals = {name: {'time': 0.0, 'correct': 0, 'false': 0} for name, _ in matchers}
+    cases = 0
+
+    print("Template matching benchmark")
+    print("=" * 86)
+    print(f"{'template':<18} {'scale':>5} {'full ms':>9} {'conf':>6} {'ok':>3} "
+          f"{'c2f ms':>9} {'conf':>6} {'ok':>3} {'speedup':>8}")
+    print("-" * 86)
+
+    for index, template_path in enumerate(template_paths):
+        template = cv2.imread(template_path)
+        name = os.path.basename(template_path)
+
+        for true_scale in true_scales:
+            placed = place_template(background, template, true_scale, seed=index)
+            if placed is None:
+                continue
+            screenshot, position = placed
+            cases += 1
+
+            row = []
+            for matcher_name, matcher in matchers:
+                # First call warms the template store, as in a running server
+                matcher(screenshot, template_path, THRESHOLD)
+                elapsed, match = time_call(lambda: matcher(screenshot, template_path, THRESHOLD))
+                correct = is_correct(match, position)
+                totals[matcher_name]['time'] += elapsed
+                totals[matcher_name]['correct'] += correct
+                row.append((elapsed, match['confidence'] if match else 0.0, correct))
+
+            (full_time, full_conf, full_ok), (c2f_time, c2f_conf, c2f_ok) = row
+            print(f"{name:<18} {true_scale:>5.2f} {full_time * 1000:>9.1f} {full_conf:>6.3f} {'y' if full_ok else 'n':>3} "
+                  f"{c2f_time * 1000:>9.1f} {c2f_conf:>6.3f} {'y' if c2f_ok else 'n':>3} {full_time / c2f_time:>7.1f}x")
+
+        # Negative case: template absent, neither matcher should report a match
+        for matcher_name, matcher in matchers:
+            match = matcher(background, template_path, THRESHOLD)
+            totals[matcher_name]['false'] += bool(match and match['matched'])
+
+    print("-" * 86)
+    for matcher_name, _ in matchers:
+        total = totals[matcher_name]
+        print(f"{matcher_name:<15} total {total['time'] * 1000:>8.1f} ms, "
+              f"{total['correct']}/{cases} located, {total['false']}/{len(template_paths)} false positives")
+    print("=" * 86)
+
+
+if __name__ == "__main__":
+    requested = [float(arg) for arg in sys.argv[1:]] or DEFAULT_TRUE_SCALES
+    run_benchmark(requested)
@@ -8,6 +8,66 @@ import os
 
 DB_PATH = "data/screen_control.db"
 
+# Screen resolution (width, height) the bundled screen_templates images were captured at
+BUNDLED_TEMPLATE_RESOLUTION = (1440, 3040)
+
+# name, filename, confidence threshold, priority
+DEFAULT_TEMPLATES = [
+    ('login', 'Login.png', 0.7, 5),
+    ('bionag', 'bionag.png', 0.7, 8),
+    ('noload', 'noload.png', 0.7, 10),
+    ('firstloadnag', 'firstloadnag.png', 0.7, 7),
+    ('nagload2', 'nagload2.png', 0.7, 6),
+    ('nagload3', 'nagload3.png', 0.7, 6),
+    ('loadlist', 'loadlist.png', 0.7, 3),
+    ('cartoload', 'cartoload.png', 0.7, 4)
+]
+
+# Columns added to existing tables since their first release: table -> [(column, definition)]
+MIGRATIONS = {
+    'screen_templates': [
+        # "x,y,width,height" as fractions of the screen, NULL = whole screen
+        ('search_region', 'TEXT'),
+        # Stop detection as soon as this template matches
+        ('exclusive', 'INTEGER DEFAULT 0'),
+        # Screen resolution the template image was captured at, NULL = unknown
+        ('capture_width', 'INTEGER'),
+        ('capture_height', 'INTEGER'),
+    ],
+    'device_settings': [
+        # How text actions are typed: batch, chunked or per_char
+        ('text_input_mode', "TEXT DEFAULT 'batch'"),
+    ],
+}
+
+
+def migrate_database(cursor):
+    """Add any missing MIGRATIONS columns to existing tables
+    
+    Returns:
+        List of "table.column" names that were added
+    """
+    added = []
+    for table, columns in MIGRATIONS.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        if not existing:
+            continue
+        
+        for column, definition in columns:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                added.append(f"{table}.{column}")
+    
+    # Existing rows for the bundled images get their known capture resolution
+    if 'screen_templates.capture_width' in added:
+        width, height = BUNDLED_TEMPLATE_RESOLUTION
+        cursor.executemany("""
+            UPDATE screen_templates SET capture_width = ?, capture_height = ?
+            WHERE filename = ? AND capture_width IS NULL
+        """, [(width, height, filename) for _, filename, _, _ in DEFAULT_TEMPLATES])
+    return added
+
 def init_database():
     """Initialize the screen control database"""
     
@@ -40,6 +100,10 @@ def init_database():
             filename TEXT,
             confidence_threshold REAL DEFAULT 0.7,
             priority INTEGER DEFAULT 0,
+            search_region TEXT,
+            exclusive INTEGER DEFAULT 0,
+            capture_width INTEGER,
+            capture_height INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
@@ -104,6 +168,7 @@ def init_database():
             match_threshold REAL DEFAULT 0.7,
             keystroke_delay_ms INTEGER DEFAULT 150,
             post_login_wait_seconds INTEGER DEFAULT 4,
+            text_input_mode TEXT DEFAULT 'batch',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -131,28 +196,21 @@ def init_database():
         )
     """)
     
+    # Add columns introduced after the table was first created
+    migrate_database(cursor)
+    
     print("Tables created successfully!")
     
     # Insert default templates
     print("Inserting default templates...")
     
-    templates = [
-        ('login', 'Login.png', 0.7, 5),
-        ('bionag', 'bionag.png', 0.7, 8),
-        ('noload', 'noload.png', 0.7, 10),
-        ('firstloadnag', 'firstloadnag.png', 0.7, 7),
-        ('nagload2', 'nagload2.png', 0.7, 6),
-        ('nagload3', 'nagload3.png', 0.7, 6),
-        ('loadlist', 'loadlist.png', 0.7, 3),
-        ('cartoload', 'cartoload.png', 0.7, 4)
-    ]
-    
-    for name, filename, threshold, priority in templates:
+    capture_width, capture_height = BUNDLED_TEMPLATE_RESOLUTION
+    for name, filename, threshold, priority in DEFAULT_TEMPLATES:
         cursor.execute("""
             INSERT OR IGNORE INTO screen_templates 
-            (name, filename, confidence_threshold, priority) 
-            VALUES (?, ?, ?, ?)
-        """, (name, filename, threshold, priority))
+            (name, filename, confidence_threshold, priority, capture_width, capture_height) 
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (name, filename, threshold, priority, capture_width, capture_height))
     
     # Get count
     cursor.execute("SELECT COUNT(*) FROM screen_templates")
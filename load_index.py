@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Load Index Module
+Builds a derived, indexed SQLite database from the pulled sql.db
+
+The pulled database is the BCA Track app's own cache and has no indexes for
+the load/date lookups the server makes. It is replaced wholesale on every
+pull, so instead of touching it we copy the DWJJOB/DWVVEH rows into a
+separate database next to it, add the indexes we need and materialise the
+per-load and per-week summaries. The index is rebuilt once per distinct
+sql.db (tracked by SHA1 checksum) and only read afterwards.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from adb_manager import _compute_sha1
+
+INDEX_DB_NAME = "sql_index.db"
+
+# Bump when the derived schema changes so existing indexes are rebuilt
+INDEX_SCHEMA_VERSION = "1"
+
+logger = logging.getLogger(__name__)
+
+# Source file signature -> checksum of the sql.db the index was built from
+_index_state = {'signature': None, 'checksum': None}
+_index_lock = threading.Lock()
+
+INDEX_SCHEMA = [
+    # Same columns as the app tables, only rows that belong to a load
+    """
+    CREATE TABLE DWJJOB AS
+    SELECT * FROM src.DWJJOB
+    WHERE dwjLoad IS NOT NULL AND dwjLoad != ''
+    ORDER BY dwjLoad, dwjType
+    """,
+    """
+    CREATE TABLE DWVVEH AS
+    SELECT * FROM src.DWVVEH
+    WHERE dwvLoad IS NOT NULL AND dwvLoad != ''
+    ORDER BY dwvLoad, dwvPos
+    """,
+    "CREATE INDEX idx_jobs_load ON DWJJOB(dwjLoad, dwjType)",
+    "CREATE INDEX idx_jobs_date ON DWJJOB(CAST(dwjDate AS INTEGER))",
+    "CREATE INDEX idx_vehicles_load ON DWVVEH(dwvLoad, dwvPos)",
+    "CREATE INDEX idx_vehicles_ref ON DWVVEH(dwvVehRef)",
+
+    # One row per load, earliest_date follows build_load_overview (earliest non-empty dwjDate)
+    """
+    CREATE TABLE loads (
+        load_number TEXT PRIMARY KEY,
+        earliest_date INTEGER,
+        week_ending TEXT,
+        job_count INTEGER NOT NULL,
+        vehicle_count INTEGER NOT NULL
+    )
+    """,
+    """
+    INSERT INTO loads (load_number, earliest_date, job_count, vehicle_count)
+    SELECT
+        j.dwjLoad,
+        MIN(NULLIF(NULLIF(j.dwjDate, ''), 0)),
+        COUNT(*),
+        (SELECT COUNT(*) FROM DWVVEH v WHERE v.dwvLoad = j.dwjLoad)
+    FROM DWJJOB j
+    GROUP BY j.dwjLoad
+    """,
+    """
+    UPDATE loads
+    SET week_ending = date(
+        substr(earliest_date, 1, 4) || '-' || substr(earliest_date, 5, 2) || '-' || substr(earliest_date, 7, 2),
+        'weekday 0'
+    )
+    WHERE length(earliest_date) = 8
+    """,
+    "CREATE INDEX idx_loads_date ON loads(earliest_date)",
+    "CREATE INDEX idx_loads_week ON loads(week_ending)",
+
+    # Week ending (Sunday) of every dated job - UK work week is Monday to Sunday
+    """
+    CREATE TABLE job_weeks AS
+    SELECT DISTINCT dwjLoad AS load_number, week_ending
+    FROM (
+        SELECT dwjLoad, date(
+            substr(dwjDate, 1, 4) || '-' || substr(dwjDate, 5, 2) || '-' || substr(dwjDate, 7, 2),
+            'weekday 0'
+        ) AS week_ending
+        FROM DWJJOB
+        WHERE length(dwjDate) = 8
+    )
+    WHERE week_ending IS NOT NULL
+    """,
+    "CREATE INDEX idx_job_weeks_week ON job_weeks(week_ending, load_number)",
+
+    """
+    CREATE TABLE paperwork_weeks AS
+    SELECT
+        week_ending,
+        date(week_ending, '-6 days') AS monday,
+        week_ending AS sunday,
+        COUNT(*) AS load_count
+    FROM job_weeks
+    GROUP BY week_ending
+    ORDER BY week_ending DESC
+    """,
+
+    "CREATE TABLE index_meta (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+
+def get_index_path(source_path):
+    """Get the path of the derived index for a sql.db path"""
+    return os.path.join(os.path.dirname(source_path), INDEX_DB_NAME)
+
+
+def _read_meta(index_path):
+    """Read index_meta from an existing index, or None if unusable"""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        conn = sqlite3.connect(index_path)
+        try:
+            return dict(conn.execute("SELECT key, value FROM index_meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def build_index(source_path, index_path, checksum):
+    """Build the derived database for a sql.db
+    
+    Written to a temporary file and renamed over the old index, so readers
+    holding a connection keep seeing the previous data until they reconnect.
+    
+    Args:
+        source_path: Path to the pulled sql.db
+        index_path: Path of the derived database to (re)create
+        checksum: SHA1 of source_path, recorded in index_meta
+    
+    Returns:
+        Dict with load, job and vehicle counts
+    """
+    temp_path = f"{index_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    
+    started = datetime.now()
+    conn = sqlite3.connect(temp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+        
+        with conn:
+            for statement in INDEX_SCHEMA:
+                conn.execute(statement)
+            
+            counts = {
+                'loads': conn.execute("SELECT COUNT(*) FROM loads").fetchone()[0],
+                'jobs': conn.execute("SELECT COUNT(*) FROM DWJJOB").fetchone()[0],
+                'vehicles': conn.execute("SELECT COUNT(*) FROM DWVVEH").fetchone()[0]
+            }
+            
+            conn.executemany(
+                "INSERT INTO index_meta (key, value) VALUES (?, ?)",
+                [
+                    ('schema_version', INDEX_SCHEMA_VERSION),
+                    ('source_checksum', checksum),
+                    ('built_at', datetime.now().isoformat())
+                ]
+            )
+        
+        conn.execute("DETACH DATABASE src")
+        conn.execute("ANALYZE")
+    except Exception:
+        conn.close()
+        os.remove(temp_path)
+        raise
+    conn.close()
+    
+    os.replace(temp_path, index_path)
+    
+    elapsed = (datetime.now() - started).total_seconds()
+    logger.info(
+        f"Built load index {checksum[:12]} in {elapsed:.2f}s "
+        f"({counts['loads']} loads, {counts['jobs']} jobs, {counts['vehicles']} vehicles)"
+    )
+    return counts
+
+
+def ensure_index(source_path):
+    """Make sure the derived index matches the current sql.db
+    
+    The source file's mtime, size and inode are checked on every call; the
+    checksum is only recomputed when those change, and the index is only
+    rebuilt when the checksum differs from the one it was built from.
+    
+    Args:
+        source_path: Path to the pulled sql.db
+    
+    Returns:
+        Dict with 'path', 'checksum' and 'rebuilt', or None if sql.db does not exist
+    """
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return None
+    
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    index_path = get_index_path(source_path)
+    
+    with _index_lock:
+        if _index_state['signature'] == signature and os.path.exists(index_path):
+            return {'path': index_path, 'checksum': _index_state['checksum'], 'rebuilt': False}
+        
+        checksum = _compute_sha1(source_path)
+        meta = _read_meta(index_path)
+        rebuilt = not (
+            meta
+            and meta.get('source_checksum') == checksum
+            and meta.get('schema_version') == INDEX_SCHEMA_VERSION
+        )
+        if rebuilt:
+            build_index(source_path, index_path, checksum)
+        
+        _index_state['signature'] = signature
+        _index_state['checksum'] = checksum
+        return {'path': index_path, 'checksum': checksum, 'rebuilt': rebuilt}
+
+
+def connect_index(source_path):
+    """Open the derived index for a sql.db, building it first if needed
+
+    Returns:
+        sqlite3 connection with Row factory, or None if sql.db does not exist
+    """
+    index = ensure_index(source_path)
+    if not index:
+        return None
+    conn = sqlite3.connect(index['path'])
+    conn.row_factory = sqlite3.Row
+    return conn
@@ -10,6 +10,7 @@ import os
 import sys
 from datetime import datetime, timedelta
 from typing import Any, Optional
+from urllib.parse import urlencode
 import httpx
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -31,6 +32,16 @@ app = Server("android-paperwork")
 # HTTP client for API calls
 http_client = None
 
+# Last GET response per URL, revalidated with If-None-Match
+etag_cache = {}
+
+# Batch paperwork jobs: seconds between progress polls, and before giving up waiting
+BATCH_POLL_INTERVAL = 1.0
+BATCH_WAIT_TIMEOUT = 600
+
+# Fields needed by format_load_description (keeps /api/loads payloads small)
+LOAD_SUMMARY_FIELDS = "load_number,collections,deliveries,total_vehicles,earliest_date_formatted"
+
 
 async def get_http_client() -> httpx.AsyncClient:
     """Get or create HTTP client"""
@@ -45,10 +56,24 @@ async def api_request(method: str, endpoint: str, **kwargs) -> dict:
     client = await get_http_client()
     url = f"{FLASK_API_URL}{endpoint}"
     
+    cached = etag_cache.get(url) if method == "GET" else None
+    if cached:
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["If-None-Match"] = cached[0]
+        kwargs["headers"] = headers
+    
     try:
         response = await client.request(method, url, **kwargs)
+        if cached and response.status_code == 304:
+            return cached[1]
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        
+        etag = response.headers.get("ETag")
+        if method == "GET" and etag:
+            etag_cache[url] = (etag, data)
+        
+        return data
     except httpx.HTTPError as e:
         return {
             "success": False,
@@ -509,14 +534,6 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     if name == "search_loads_by_date":
         period = arguments.get("period", "today")
         
-        # Get all loads
-        result = await api_request("GET", "/api/loads?sort=date_desc")
-        
-        if not result.get("success"):
-            return [TextContent(type="text", text=f"Error: {result.get('error')}")]
-        
-        loads = result.get("loads", [])
-        
         # Parse the period
         if period in ["today", "yesterday", "this_week", "last_week", "next_week", "this_month"]:
             start_date, end_date = parse_date_range(period)
@@ -524,20 +541,19 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
             # Assume it's a specific date
             start_date = end_date = period
         
-        # Filter loads by date range
-        filtered_loads = []
-        for load in loads:
-            load_date = load.get("earliest_date_formatted")
-            if load_date:
-                # Convert DD/MM/YYYY to YYYY-MM-DD for comparison
-                try:
-                    parts = load_date.split("/")
-                    if len(parts) == 3:
-                        load_date_iso = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                        if start_date <= load_date_iso <= end_date:
-                            filtered_loads.append(load)
-                except:
-                    pass
+        # Let the server filter by date range
+        query = urlencode({
+            "sort": "date_desc",
+            "start_date": start_date,
+            "end_date": end_date,
+            "fields": LOAD_SUMMARY_FIELDS,
+        })
+        result = await api_request("GET", f"/api/loads?{query}")
+        
+        if not result.get("success"):
+            return [TextContent(type="text", text=f"Error: {result.get('error')}")]
+        
+        filtered_loads = result.get("loads", [])
         
         if not filtered_loads:
             return [TextContent(type="text", text=f"No loads found for {period}")]
@@ -552,34 +568,14 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     elif name == "search_loads_by_location":
         location = arguments.get("location", "").lower()
         
-        # Get all loads
-        result = await api_request("GET", "/api/loads")
+        # Server matches collection/delivery name, customer, town and postcode
+        query = urlencode({"location": location, "fields": LOAD_SUMMARY_FIELDS})
+        result = await api_request("GET", f"/api/loads?{query}")
         
         if not result.get("success"):
             return [TextContent(type="text", text=f"Error: {result.get('error')}")]
         
-        loads = result.get("loads", [])
-        
-        # Filter by location
-        filtered_loads = []
-        for load in loads:
-            # Check collections
-            for col in load.get("collections", []):
-                if (location in col.get("location", "").lower() or
-                    location in col.get("customer", "").lower() or
-                    location in col.get("town", "").lower() or
-                    location in col.get("postcode", "").lower()):
-                    filtered_loads.append(load)
-                    break
-            else:
-                # Check deliveries
-                for deliv in load.get("deliveries", []):
-                    if (location in deliv.get("location", "").lower() or
-                        location in deliv.get("customer", "").lower() or
-                        location in deliv.get("town", "").lower() or
-                        location in deliv.get("postcode", "").lower()):
-                        filtered_loads.append(load)
-                        break
+        filtered_loads = result.get("loads", [])
         
         if not filtered_loads:
             return [TextContent(type="text", text=f"No loads found for location: {location}")]
@@ -594,7 +590,8 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     elif name == "get_loads_summary":
         sort = arguments.get("sort", "date_desc")
         
-        result = await api_request("GET", f"/api/loads?sort={sort}")
+        query = urlencode({"sort": sort, "fields": LOAD_SUMMARY_FIELDS})
+        result = await api_request("GET", f"/api/loads?{query}")
         
         if not result.get("success"):
             return [TextContent(type="text", text=f"Error: {result.get('error')}")]
@@ -631,59 +628,51 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     elif name == "generate_all_loadsheets_for_period":
         period = arguments.get("period", "today")
         
-        # First, search for loads in the period
-        search_result = await call_tool("search_loads_by_date", {"period": period})
-        
-        # Get all loads
-        result = await api_request("GET", "/api/loads?sort=date_desc")
-        
-        if not result.get("success"):
-            return [TextContent(type="text", text=f"Error: {result.get('error')}")]
-        
-        loads = result.get("loads", [])
-        
         # Parse the period
         if period in ["today", "yesterday", "this_week", "last_week", "next_week", "this_month"]:
             start_date, end_date = parse_date_range(period)
         else:
             start_date = end_date = period
         
-        # Filter loads by date range
-        filtered_loads = []
-        for load in loads:
-            load_date = load.get("earliest_date_formatted")
-            if load_date:
-                try:
-                    parts = load_date.split("/")
-                    if len(parts) == 3:
-                        load_date_iso = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                        if start_date <= load_date_iso <= end_date:
-                            filtered_loads.append(load)
-                except:
-                    pass
+        # One server-side batch: all loads resolved from one database read, generated in parallel
+        job_result = await api_request(
+            "POST",
+            "/api/paperwork/jobs",
+            json={"start_date": start_date, "end_date": end_date, "include_timesheet": False}
+        )
         
-        if not filtered_loads:
+        if not job_result.get("success"):
+            return [TextContent(type="text", text=f"Error: {job_result.get('error')}")]
+        
+        job = job_result["job"]
+        if job["total"] == 0:
             return [TextContent(type="text", text=f"No loads found for {period}")]
         
-        # Generate loadsheets for each load
-        results = []
-        success_count = 0
+        # Poll progress until the batch finishes
+        deadline = asyncio.get_running_loop().time() + BATCH_WAIT_TIMEOUT
+        while job["status"] not in ("completed", "failed"):
+            if asyncio.get_running_loop().time() > deadline:
+                return [TextContent(
+                    type="text",
+                    text=f"⏳ Still generating ({job['completed']}/{job['total']} done), job {job['id']}"
+                )]
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            status = await api_request("GET", f"/api/paperwork/jobs/{job['id']}")
+            if not status.get("success"):
+                return [TextContent(type="text", text=f"Error: {status.get('error')}")]
+            job = status["job"]
         
-        for load in filtered_loads:
-            load_num = load.get("load_number")
-            gen_result = await api_request(
-                "POST",
-                "/api/paperwork/loadsheet",
-                json={"load_number": load_num}
-            )
-            
-            if gen_result.get("success"):
-                success_count += 1
-                results.append(f"✅ {load_num}")
+        if job["status"] == "failed":
+            return [TextContent(type="text", text=f"❌ Error: {job.get('error')}")]
+        
+        results = []
+        for entry in job["results"]:
+            if entry["status"] == "succeeded":
+                results.append(f"✅ {entry['name']}")
             else:
-                results.append(f"❌ {load_num}: {gen_result.get('error')}")
+                results.append(f"❌ {entry['name']}: {entry.get('error')}")
         
-        response = f"Generated {success_count}/{len(filtered_loads)} loadsheets for {period}:\n\n"
+        response = f"Generated {job['succeeded']}/{job['total']} loadsheets for {period}:\n\n"
         response += "\n".join(results)
         
         return [TextContent(type="text", text=response)]
@@ -991,8 +980,9 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     elif name == "get_load_details":
         load_number = arguments.get("load_number")
         
-        # Get all loads
-        result = await api_request("GET", "/api/loads")
+        # Narrow to loads starting with this number; exact match picked below
+        query = urlencode({"load_prefix": load_number})
+        result = await api_request("GET", f"/api/loads?{query}")
         
         if not result.get("success"):
             return [TextContent(type="text", text=f"Error: {result.get('error')}")]
@@ -9,6 +9,7 @@ import json
 import os
 from datetime import datetime, timedelta
 from typing import Any, Optional
+from urllib.parse import urlencode
 import httpx
 from mcp.server import Server
 from mcp.server.sse import SseServerTransport
@@ -36,6 +37,12 @@ app = Server("android-paperwork")
 # HTTP client for API calls
 http_client = None
 
+# Last GET response per URL, revalidated with If-None-Match
+etag_cache = {}
+
+# Fields needed by format_load_description (keeps /api/loads payloads small)
+LOAD_SUMMARY_FIELDS = "load_number,collections,deliveries,total_vehicles,earliest_date_formatted"
+
 
 async def get_http_client() -> httpx.AsyncClient:
     """Get or create HTTP client"""
@@ -50,10 +57,24 @@ async def api_request(method: str, endpoint: str, **kwargs) -> dict:
     client = await get_http_client()
     url = f"{FLASK_API_URL}{endpoint}"
     
+    cached = etag_cache.get(url) if method == "GET" else None
+    if cached:
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["If-None-Match"] = cached[0]
+        kwargs["headers"] = headers
+    
     try:
         response = await client.request(method, url, **kwargs)
+        if cached and response.status_code == 304:
+            return cached[1]
         response.raise_for_status()
-        return response.json()
+        data = response.json()
+        
+        etag = response.headers.get("ETag")
+        if method == "GET" and etag:
+            etag_cache[url] = (etag, data)
+        
+        return data
     except httpx.HTTPError as e:
         return {
             "success": False,
@@ -376,30 +397,23 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     
     if name == "search_loads_by_date":
         period = arguments.get("period", "today")
-        result = await api_request("GET", "/api/loads?sort=date_desc")
-        
-        if not result.get("success"):
-            return [TextContent(type="text", text=f"Error: {result.get('error')}")]
-        
-        loads = result.get("loads", [])
-        
         if period in ["today", "yesterday", "this_week", "last_week", "next_week", "this_month"]:
             start_date, end_date = parse_date_range(period)
         else:
             start_date = end_date = period
         
-        filtered_loads = []
-        for load in loads:
-            load_date = load.get("earliest_date_formatted")
-            if load_date:
-                try:
-                    parts = load_date.split("/")
-                    if len(parts) == 3:
-                        load_date_iso = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                        if start_date <= load_date_iso <= end_date:
-                            filtered_loads.append(load)
-                except:
-                    pass
+        query = urlencode({
+            "sort": "date_desc",
+            "start_date": start_date,
+            "end_date": end_date,
+            "fields": LOAD_SUMMARY_FIELDS,
+        })
+        result = await api_request("GET", f"/api/loads?{query}")
+        
+        if not result.get("success"):
+            return [TextContent(type="text", text=f"Error: {result.get('error')}")]
+        
+        filtered_loads = result.get("loads", [])
         
         if not filtered_loads:
             return [TextContent(type="text", text=f"No loads found for {period}")]
@@ -412,7 +426,8 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     
     elif name == "get_load_details":
         load_number = arguments.get("load_number")
-        result = await api_request("GET", "/api/loads")
+        query = urlencode({"load_prefix": load_number})
+        result = await api_request("GET", f"/api/loads?{query}")
         
         if not result.get("success"):
             return [TextContent(type="text", text=f"Error: {result.get('error')}")]
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Paperwork Catalogue - In-memory index of generated paperwork
+Keeps every document under the paperwork root keyed by filename, load number
+and week ending, so downloads and "does this load have a loadsheet" checks
+are dictionary lookups instead of an os.walk over every week folder.
+
+Built with one scan at server startup (rebuild) and kept current by the
+paperwork engine, which adds each document as it is written (add_file).
+Files that disappear are dropped when looked up; a miss triggers a rescan
+at most every CATALOGUE_RESCAN_INTERVAL seconds, to pick up documents made
+outside the server (e.g. by running the scripts by hand).
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from scripts import loadsheet
+
+PAPERWORK_ROOT = loadsheet.PAPERWORK_ROOT
+CATALOGUE_RESCAN_INTERVAL = 30  # Minimum seconds between rescans triggered by misses
+# Entries modified this close to a rescan's start survive it even if its
+# listing missed them (filesystems with coarse mtimes)
+SCAN_MTIME_SLACK = 2
+
+FOLDER_DATE_FORMAT = "%d-%m-%y"  # Week folders, e.g. '25-08-25'
+DOCUMENT_FORMATS = ('xlsx', 'pdf')
+
+
+def week_from_folder(folder: str) -> Optional[str]:
+    """Week ending (YYYY-MM-DD) of a week folder name, or None for other folders"""
+    try:
+        return datetime.strptime(folder, FOLDER_DATE_FORMAT).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def folder_from_week(week_ending: str) -> str:
+    """Week folder name for a week ending given as YYYY-MM-DD (or already DD-MM-YY)"""
+    try:
+        return datetime.strptime(week_ending, "%Y-%m-%d").strftime(FOLDER_DATE_FORMAT)
+    except ValueError:
+        return week_ending
+
+
+def describe(path: str) -> Optional[Dict]:
+    """
+    Catalogue entry for a document path
+    
+    Returns:
+        Dict with filename, folder, week_ending, kind ('loadsheet',
+        'timesheet' or 'other'), load_number, format, size and modified, or
+        None if the file is not in a week folder or does not exist
+    """
+    folder = os.path.basename(os.path.dirname(path))
+    week_ending = week_from_folder(folder)
+    if not week_ending:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    
+    filename = os.path.basename(path)
+    stem, ext = os.path.splitext(filename)
+    file_format = ext[1:].lower()
+    load_number = None
+    if stem.startswith('timesheet_'):
+        kind = 'timesheet'
+    elif file_format in DOCUMENT_FORMATS and '_' in stem:
+        # Loadsheets are named <load number>_<collection>
+        kind = 'loadsheet'
+        load_number = stem.split('_', 1)[0]
+    else:
+        kind = 'other'
+    
+    return {
+        'filename': filename,
+        'folder': folder,
+        'week_ending': week_ending,
+        'kind': kind,
+        'load_number': load_number,
+        'format': file_format,
+        'size': stat.st_size,
+        'modified': stat.st_mtime,
+        'path': os.path.abspath(path)
+    }
+
+
+class PaperworkCatalogue:
+    """Documents under the paperwork root, indexed three ways
+    
+    _files maps "<folder>/<filename>" to its entry; _by_name, _by_load and
+    _by_week point back into it. When two week folders hold a file with the
+    same name (or the same load), the most recently modified one wins, and
+    the other takes over if it is removed.
+    """
+    
+    def __init__(self, root: str = PAPERWORK_ROOT):
+        self.root = os.path.abspath(root)
+        self.built_at = None
+        self.last_scan = 0.0
+        self._files = {}  # "<folder>/<filename>" -> entry
+        self._by_name = {}  # filename -> [keys], oldest first
+        self._by_load = {}  # load number -> {format: [keys], oldest first}
+        self._by_week = {}  # week ending -> set of keys
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()  # One scan at a time
+    
+    @staticmethod
+    def _key(entry: Dict) -> str:
+        return f"{entry['folder']}/{entry['filename']}"
+    
+    def _scan(self) -> List[Dict]:
+        entries = []
+        if os.path.isdir(self.root):
+            for folder in os.listdir(self.root):
+                folder_path = os.path.join(self.root, folder)
+                if not week_from_folder(folder) or not os.path.isdir(folder_path):
+                    continue
+                for filename in os.listdir(folder_path):
+                    entry = describe(os.path.join(folder_path, filename))
+                    if entry:
+                        entries.append(entry)
+        return entries
+    
+    def rebuild(self, min_interval: float = 0) -> int:
+        """
+        Scan the paperwork root and replace the index
+        
+        Documents added while the scan runs are kept even if the listing
+        missed them.
+        
+        Args:
+            min_interval: Skip the scan if the last one started less than
+                this many seconds ago (e.g. another thread's rescan just ran)
+        
+        Returns:
+            Number of files in the index
+        """
+        with self._rebuild_lock:
+            if time.monotonic() - self.last_scan < min_interval:
+                with self._lock:
+                    return len(self._files)
+            # Set first, so misses during the scan don't queue up more scans
+            self.last_scan = time.monotonic()
+            scan_started = time.time() - SCAN_MTIME_SLACK
+            
+            entries = {self._key(entry): entry for entry in self._scan()}
+            
+            with self._lock:
+                for key, entry in self._files.items():
+                    if entry['modified'] >= scan_started and (
+                            key not in entries or entry['modified'] > entries[key]['modified']):
+                        entries[key] = entry
+                self._files.clear()
+                self._by_name.clear()
+                self._by_load.clear()
+                self._by_week.clear()
+                for entry in sorted(entries.values(), key=lambda e: e['modified']):
+                    self._insert(entry)
+                self.built_at = time.time()
+                return len(self._files)
+    
+    def add_file(self, path: Optional[str]) -> Optional[Dict]:
+        """Add (or refresh) one document, e.g. right after it was generated"""
+        if not path:
+            return None
+        entry = describe(path)
+        if entry:
+            with self._lock:
+                self._remove(self._key(entry))
+                self._insert(entry)
+        return entry
+    
+    @staticmethod
+    def _push(keys: List[str], key: str, files: Dict):
+        """Add key to a list kept oldest first, so keys[-1] is the newest"""
+        keys.append(key)
+        keys.sort(key=lambda k: files[k]['modified'])
+    
+    def _insert(self, entry: Dict):
+        key = self._key(entry)
+        self._files[key] = entry
+        self._push(self._by_name.setdefault(entry['filename'], []), key, self._files)
+        self._by_week.setdefault(entry['week_ending'], set()).add(key)
+        if entry['load_number']:
+            formats = self._by_load.setdefault(entry['load_number'], {})
+            self._push(formats.setdefault(entry['format'], []), key, self._files)
+    
+    def _remove(self, key: str):
+        entry = self._files.pop(key, None)
+        if not entry:
+            return
+        # Removing from the lists leaves another folder's entry, if any, in charge
+        names = self._by_name.get(entry['filename'])
+        if names and key in names:
+            names.remove(key)
+            if not names:
+                del self._by_name[entry['filename']]
+        week = self._by_week.get(entry['week_ending'])
+        if week:
+            week.discard(key)
+            if not week:
+                del self._by_week[entry['week_ending']]
+        formats = self._by_load.get(entry['load_number'])
+        if formats and key in formats.get(entry['format'], ()):
+            formats[entry['format']].remove(key)
+            if not formats[entry['format']]:
+                del formats[entry['format']]
+            if not formats:
+                del self._by_load[entry['load_number']]
+    
+    def _existing(self, key: Optional[str]) -> Optional[Dict]:
+        """Entry for key if its file is still there (dropped from the index if not)"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._files.get(key)
+        if entry and not os.path.exists(entry['path']):
+            with self._lock:
+                self._remove(key)
+            return None
+        return entry
+    
+    def _resolve(self, lookup) -> Optional[Dict]:
+        """Run lookup() until it names a file that exists (or nothing)"""
+        while True:
+            key = lookup()
+            entry = self._existing(key)
+            if entry or key is None:
+                return entry
+    
+    def _lookup(self, lookup) -> Optional[Dict]:
+        """Run lookup() (returning an index key); on a miss rescan, if not done recently, and retry"""
+        entry = self._resolve(lookup)
+        if entry is None and time.monotonic() - self.last_scan >= CATALOGUE_RESCAN_INTERVAL:
+            self.rebuild(min_interval=CATALOGUE_RESCAN_INTERVAL)
+            entry = self._resolve(lookup)
+        return entry
+    
+    def find_load(self, load_number: str, file_format: str = 'xlsx') -> Optional[Dict]:
+        """Latest loadsheet of a load in 'xlsx' or 'pdf' format"""
+        def lookup():
+            with self._lock:
+                keys = self._by_load.get(load_number, {}).get(file_format)
+                return keys[-1] if keys else None
+        return self._lookup(lookup)
+    
+    def find(self, name: str) -> Optional[Dict]:
+        """
+        Resolve a download name to a document
+        
+        Args:
+            name: "<week folder>/<filename>", a filename, or a load number with
+                an optional .xlsx/.pdf extension (xlsx if none)
+        
+        Returns:
+            Catalogue entry, or None if there is no such document
+        """
+        stem, ext = os.path.splitext(name)
+        file_format = ext[1:].lower()
+        
+        def lookup():
+            with self._lock:
+                if name in self._files:
+                    return name
+                if name in self._by_name:
+                    return self._by_name[name][-1]
+                formats = self._by_load.get(stem if file_format in DOCUMENT_FORMATS else name, {})
+                keys = formats.get(file_format if file_format in DOCUMENT_FORMATS else 'xlsx')
+                return keys[-1] if keys else None
+        return self._lookup(lookup)
+    
+    def list_week(self, week_ending: str) -> List[Dict]:
+        """Documents in a week (YYYY-MM-DD or DD-MM-YY), loadsheets first, then by name"""
+        week_ending = week_from_folder(folder_from_week(week_ending)) or week_ending
+        with self._lock:
+            entries = [self._files[key] for key in self._by_week.get(week_ending, ())]
+        order = {'loadsheet': 0, 'timesheet': 1, 'other': 2}
+        return sorted(
+            (entry for entry in entries if os.path.exists(entry['path'])),
+            key=lambda e: (order[e['kind']], e['filename'])
+        )
+    
+    def list_weeks(self) -> List[Dict]:
+        """Weeks with documents, newest first"""
+        with self._lock:
+            weeks = [
+                {
+                    'week_ending': week,
+                    'folder': folder_from_week(week),
+                    'file_count': len(keys),
+                    'pdf_count': sum(1 for key in keys if self._files[key]['format'] == 'pdf')
+                }
+                for week, keys in self._by_week.items()
+            ]
+        return sorted(weeks, key=lambda w: w['week_ending'], reverse=True)
+    
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'root': self.root,
+                'files': len(self._files),
+                'loads': len(self._by_load),
+                'weeks': len(self._by_week),
+                'built_at': datetime.fromtimestamp(self.built_at).isoformat() if self.built_at else None
+            }
+
+
+catalogue = PaperworkCatalogue()
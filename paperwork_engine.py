@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Paperwork Engine - In-process loadsheet and timesheet generation
+Runs the generators in scripts/ as a library on a small worker pool instead
+of a python3 process per document, so requests don't pay for interpreter
+startup and the openpyxl import, and rows are not passed through argv.
+Workbook templates and signature images are cached between documents
+(TemplateCache), and every document is added to the paperwork catalogue as
+it is written. Batches of documents (a week's loadsheets and timesheet)
+run as background BatchJobs with progress and an optional ZIP bundle.
+"""
+
+import io
+import os
+import pickle
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import openpyxl
+from openpyxl.drawing.image import Image as OpenpyxlImage
+
+import paperwork_catalogue
+import pdf_converter
+from scripts import loadsheet, timesheet
+
+PAPERWORK_WORKERS = int(os.getenv("PAPERWORK_WORKERS", "2"))
+# Jobs allowed to wait for a worker; beyond this new jobs are refused
+PAPERWORK_QUEUE_SIZE = int(os.getenv("PAPERWORK_QUEUE_SIZE", "8"))
+PAPERWORK_TIMEOUT = 60  # Seconds a caller waits for its document
+BATCH_JOB_HISTORY = 20  # Finished batch jobs kept for status/download
+BATCH_RETRY_DELAY = 0.5  # Seconds between submits while the queue is full of other work
+# Queue slots batches leave free, so single requests aren't refused while a batch runs
+BATCH_RESERVED_SLOTS = max(1, PAPERWORK_QUEUE_SIZE // 2)
+
+GENERATORS = {
+    'loadsheet': loadsheet.generate_loadsheet,
+    'timesheet': timesheet.generate_timesheet
+}
+
+SIGNATURE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class TemplateCache:
+    """Parsed workbook templates and signature images, kept between documents
+    
+    Each workbook is parsed once and kept as a pickled snapshot. Unpickling
+    gives every job its own Workbook in a few milliseconds instead of
+    re-parsing the xlsx (copy.deepcopy is not an option: it corrupts the
+    style tables). Files are re-read when their mtime or size changes.
+    """
+    
+    def __init__(self):
+        self._workbooks = {}  # path -> ((mtime_ns, size), pickled Workbook)
+        self._images = {}  # path -> ((mtime_ns, size), file bytes)
+        self._folders = {}  # folder -> (mtime_ns, [image paths])
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _signature(path: str):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load_workbook(self, path: str) -> openpyxl.Workbook:
+        """Get a private copy of a workbook template"""
+        signature = self._signature(path)
+        with self._lock:
+            entry = self._workbooks.get(path)
+        
+        if entry and entry[0] == signature:
+            return pickle.loads(entry[1])
+        
+        workbook = openpyxl.load_workbook(path)
+        snapshot = pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._workbooks[path] = (signature, snapshot)
+        return workbook
+    
+    def signature_files(self, folder: str) -> List[str]:
+        """Image paths in a signature folder (listing refreshed when the folder changes)"""
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            return []
+        
+        with self._lock:
+            entry = self._folders.get(folder)
+        if entry and entry[0] == mtime:
+            return list(entry[1])
+        
+        files = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.lower().endswith(SIGNATURE_EXTENSIONS)
+        )
+        with self._lock:
+            self._folders[folder] = (mtime, files)
+        return list(files)
+    
+    def image(self, path: str) -> OpenpyxlImage:
+        """Get a new openpyxl Image for a file, from cached bytes"""
+        signature = self._signature(path)
+        with self._lock:
+            entry = self._images.get(path)
+        
+        if not entry or entry[0] != signature:
+            with open(path, 'rb') as f:
+                entry = (signature, f.read())
+            with self._lock:
+                self._images[path] = entry
+        return OpenpyxlImage(io.BytesIO(entry[1]))
+    
+    def clear(self):
+        with self._lock:
+            self._workbooks.clear()
+            self._images.clear()
+            self._folders.clear()
+    
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'workbooks': len(self._workbooks),
+                'images': len(self._images),
+                'signature_folders': len(self._folders)
+            }
+
+
+template_cache = TemplateCache()
+
+_pool = None
+_pool_lock = threading.Lock()
+_jobs_in_flight = 0  # Running plus queued
+
+
+def get_pool() -> ThreadPoolExecutor:
+    """Get the shared paperwork worker pool"""
+    global _pool
+    
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, PAPERWORK_WORKERS), thread_name_prefix="paperwork")
+        return _pool
+
+
+def _job_done(_future):
+    global _jobs_in_flight
+    
+    with _pool_lock:
+        _jobs_in_flight -= 1
+
+
+def _run(kind: str, json_data, kwargs: Dict) -> Dict:
+    """Run one generator and shape its result like the script's JSON output"""
+    try:
+        excel_path, pdf_path = GENERATORS[kind](
+            json_data, templates=template_cache, converter=pdf_converter.convert_to_pdf, **kwargs
+        )
+    except Exception as e:
+        print(f"⚠️  {kind.capitalize()} generation failed: {e}")
+        return {'success': False, 'error': f'Unexpected error: {e}', 'reason': 'error'}
+    
+    if not excel_path:
+        return {'success': False, 'error': f'Failed to generate {kind}', 'reason': 'failed'}
+    
+    paperwork_catalogue.catalogue.add_file(excel_path)
+    paperwork_catalogue.catalogue.add_file(pdf_path)
+    return {
+        'success': True,
+        'excel_path': excel_path,
+        'pdf_path': pdf_path,
+        'message': f'{kind.capitalize()} generated successfully'
+    }
+
+
+def submit(kind: str, json_data, reserve: int = 0, **kwargs) -> Optional[Future]:
+    """
+    Queue a document for generation
+    
+    Args:
+        kind: 'loadsheet' or 'timesheet'
+        json_data: Script input ({'data': [...]}, lower-case column names)
+        reserve: Queue slots to leave free for others (batches use BATCH_RESERVED_SLOTS)
+        **kwargs: Passed to the generator (e.g. signature_path for loadsheets)
+    
+    Returns:
+        Future resolving to the result dict, or None if the queue is full
+    """
+    global _jobs_in_flight
+    
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown paperwork type: {kind}")
+    
+    pool = get_pool()
+    with _pool_lock:
+        if _jobs_in_flight >= max(1, PAPERWORK_WORKERS + PAPERWORK_QUEUE_SIZE - reserve):
+            return None
+        _jobs_in_flight += 1
+    
+    try:
+        future = pool.submit(_run, kind, json_data, kwargs)
+    except Exception:
+        _job_done(None)
+        raise
+    future.add_done_callback(_job_done)
+    return future
+
+
+def generate(kind: str, json_data, timeout: float = PAPERWORK_TIMEOUT, **kwargs) -> Dict:
+    """
+    Generate a document and wait for it
+    
+    Returns:
+        Dict with 'success', 'excel_path' and 'pdf_path', or 'error' and
+        'reason' ('queue_full', 'timeout', 'failed' or 'error')
+    """
+    future = submit(kind, json_data, **kwargs)
+    if future is None:
+        return {
+            'success': False,
+            'error': 'Paperwork queue is full, try again shortly',
+            'reason': 'queue_full'
+        }
+    
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        # The job keeps its worker until it finishes; its document is still written
+        return {
+            'success': False,
+            'error': f'{kind.capitalize()} generation timed out after {timeout}s',
+            'reason': 'timeout'
+        }
+
+
+class BatchJob:
+    """A set of documents generated in the background, with progress
+    
+    Documents are fed to the shared pool as slots free up, so a batch never
+    gets "queue_full". A batch keeps at most PAPERWORK_WORKERS documents in
+    flight and all batches together leave BATCH_RESERVED_SLOTS of the queue
+    free, so single requests still get a slot while batches run.
+    """
+    
+    def __init__(self, documents: List[Tuple[str, str, dict]], bundle: bool = False, description: str = ""):
+        """
+        Args:
+            documents: (kind, name, json_data) per document, e.g. ('loadsheet', '$S275052', {...})
+            bundle: Write a ZIP of all generated files when done
+            description: Shown in status (e.g. the week)
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.description = description
+        self.bundle = bundle
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.zip_path = None
+        self.error = None
+        self.version = 0  # Bumped on every change, for progress streams
+        self._documents = list(documents)
+        self._results = [
+            {'kind': kind, 'name': name, 'status': 'pending'}
+            for kind, name, _ in self._documents
+        ]
+        self._cond = threading.Condition()
+    
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed')
+    
+    def _changed(self, **changes):
+        with self._cond:
+            for key, value in changes.items():
+                setattr(self, key, value)
+            self.version += 1
+            self._cond.notify_all()
+    
+    def _record(self, index: int, result: Dict):
+        with self._cond:
+            entry = self._results[index]
+            entry['status'] = 'succeeded' if result['success'] else 'failed'
+            for key in ('excel_path', 'pdf_path', 'error', 'reason'):
+                if result.get(key):
+                    entry[key] = result[key]
+            self.version += 1
+            self._cond.notify_all()
+    
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Block until the job changes past version (or timeout); returns the current version"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > version or self.done, timeout)
+            return self.version
+    
+    def run(self):
+        self._changed(status='running')
+        try:
+            pending = {}  # future -> document index
+            next_index = 0
+            while next_index < len(self._documents) or pending:
+                while next_index < len(self._documents) and len(pending) < PAPERWORK_WORKERS:
+                    kind, _, json_data = self._documents[next_index]
+                    future = submit(kind, json_data, reserve=BATCH_RESERVED_SLOTS)
+                    if future is None:
+                        break
+                    pending[future] = next_index
+                    self._documents[next_index] = None  # Rows are no longer needed
+                    with self._cond:
+                        self._results[next_index]['status'] = 'queued'
+                        self.version += 1
+                        self._cond.notify_all()
+                    next_index += 1
+                
+                if pending:
+                    finished, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self._record(pending.pop(future), future.result())
+                else:
+                    # Queue is full of other requests' documents
+                    time.sleep(BATCH_RETRY_DELAY)
+            
+            if self.bundle:
+                self.zip_path = self._write_zip()
+            self._changed(status='completed', finished_at=time.time())
+        except Exception as e:
+            print(f"❌ Paperwork batch {self.id} failed: {e}")
+            self._changed(status='failed', error=str(e), finished_at=time.time())
+    
+    def _write_zip(self) -> Optional[str]:
+        """Bundle every generated file, keeping their week folders"""
+        files = [
+            entry[key] for entry in self._results for key in ('excel_path', 'pdf_path')
+            if entry.get(key) and os.path.exists(entry[key])
+        ]
+        if not files:
+            return None
+        
+        root = loadsheet.PAPERWORK_ROOT
+        zip_folder = os.path.join(root, 'batches')
+        os.makedirs(zip_folder, exist_ok=True)
+        _prune_batch_zips(zip_folder)
+        zip_path = os.path.join(zip_folder, f"paperwork_{self.id}.zip")
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for path in files:
+                bundle.write(path, os.path.relpath(path, root))
+        return zip_path
+    
+    def to_dict(self, include_results: bool = True) -> Dict:
+        with self._cond:
+            # pending: not handed to the pool yet; queued: waiting for or on a worker
+            counts = {'pending': 0, 'queued': 0, 'succeeded': 0, 'failed': 0}
+            for entry in self._results:
+                counts[entry['status']] += 1
+            job = {
+                'id': self.id,
+                'description': self.description,
+                'status': self.status,
+                'total': len(self._results),
+                'completed': counts['succeeded'] + counts['failed'],
+                **counts,
+                'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+                'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+                'zip_available': bool(self.zip_path),
+                'error': self.error,
+                'version': self.version
+            }
+            if include_results:
+                job['results'] = [dict(entry) for entry in self._results]
+            return job
+
+
+# job id -> BatchJob, oldest first
+_batch_jobs = OrderedDict()
+
+
+def _discard_zip(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _prune_batch_zips(zip_folder: str):
+    """Delete bundles of jobs no longer kept (e.g. left by an earlier server run)"""
+    with _pool_lock:
+        keep = {f"paperwork_{job_id}.zip" for job_id in _batch_jobs}
+    for filename in os.listdir(zip_folder):
+        if filename.startswith('paperwork_') and filename.endswith('.zip') and filename not in keep:
+            _discard_zip(os.path.join(zip_folder, filename))
+
+
+def start_batch(documents: List[Tuple[str, str, dict]], bundle: bool = False, description: str = "") -> BatchJob:
+    """Start generating documents in the background (see BatchJob)"""
+    job = BatchJob(documents, bundle, description)
+    with _pool_lock:
+        _batch_jobs[job.id] = job
+        # Forget the oldest finished jobs, and their bundles
+        finished = [job_id for job_id, old in _batch_jobs.items() if old.done]
+        evicted = [
+            _batch_jobs.pop(job_id)
+            for job_id in finished[:max(0, len(_batch_jobs) - BATCH_JOB_HISTORY)]
+        ]
+    for old in evicted:
+        _discard_zip(old.zip_path)
+    
+    threading.Thread(target=job.run, name=f"paperwork-batch-{job.id}", daemon=True).start()
+    return job
+
+
+def get_batch(job_id: str) -> Optional[BatchJob]:
+    with _pool_lock:
+        return _batch_jobs.get(job_id)
+
+
+def list_batches() -> List[BatchJob]:
+    with _pool_lock:
+        return list(reversed(_batch_jobs.values()))
+
+
+def get_status() -> Dict:
+    """Pool size and current load"""
+    with _pool_lock:
+        in_flight = _jobs_in_flight
+    return {
+        'workers': PAPERWORK_WORKERS,
+        'queue_size': PAPERWORK_QUEUE_SIZE,
+        'running': min(in_flight, PAPERWORK_WORKERS),
+        'queued': max(0, in_flight - PAPERWORK_WORKERS),
+        'batch_jobs_running': sum(1 for job in list_batches() if not job.done),
+        'template_cache': template_cache.status(),
+        'catalogue': paperwork_catalogue.catalogue.status(),
+        'pdf_converter': pdf_converter.get_status()
+    }
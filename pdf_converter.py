@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+PDF Converter - Long-lived headless LibreOffice for xlsx -> PDF
+Keeps PDF_CONVERTER_WORKERS soffice instances running, each with its own
+profile directory and UNO socket, and converts documents through them, so a
+document no longer pays for office-suite startup.
+
+Falls back to a one-shot `soffice --convert-to pdf` when the UNO bindings
+(python3-uno) are not importable or an instance fails. The fallback still
+uses one of the workers' profile directories, so the profile is only
+created once and concurrent conversions don't share a profile (which makes
+LibreOffice hand the job to the other process and silently drop it).
+"""
+
+import atexit
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, Optional
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+
+# No handlers of its own: the server attaches its log handlers to this logger
+logger = logging.getLogger("pdf_converter")
+
+SOFFICE_BINARY = os.getenv("SOFFICE_BINARY", "soffice")
+CONVERTER_WORKERS = int(os.getenv("PDF_CONVERTER_WORKERS", "2"))
+CONVERTER_QUEUE_SIZE = int(os.getenv("PDF_CONVERTER_QUEUE_SIZE", "16"))
+PROFILE_ROOT = os.getenv("PDF_CONVERTER_PROFILES", os.path.join(tempfile.gettempdir(), "pdf-converter"))
+CONVERT_TIMEOUT = 60  # Seconds per document
+SOFFICE_START_TIMEOUT = 30  # Seconds for an instance to accept UNO connections
+
+PDF_FILTER = "calc_pdf_Export"
+
+
+def _profile_url(path: str) -> str:
+    return "file://" + os.path.abspath(path)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _pdf_path(source: str, output_folder: str) -> str:
+    return os.path.join(output_folder, os.path.splitext(os.path.basename(source))[0] + ".pdf")
+
+
+class OfficeInstance:
+    """One headless soffice process and its UNO connection
+    
+    Only used from its worker thread, apart from kill() which a caller that
+    timed out uses to unblock it.
+    """
+    
+    def __init__(self, index: int):
+        self.index = index
+        self.profile_dir = os.path.join(PROFILE_ROOT, f"worker-{index}")
+        self.process = None
+        self.desktop = None
+        self.starts = 0
+        self.conversions = 0
+    
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None and self.desktop is not None
+    
+    def start(self):
+        self.kill()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        port = _free_port()
+        self.process = subprocess.Popen(
+            [SOFFICE_BINARY, "--headless", "--invisible", "--nologo", "--nodefault",
+             "--norestore", "--nolockcheck",
+             f"-env:UserInstallation={_profile_url(self.profile_dir)}",
+             f"--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.starts += 1
+        
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + SOFFICE_START_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+                )
+                break
+            except NoConnectException:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"soffice exited during startup (code {self.process.returncode})")
+                if time.monotonic() > deadline:
+                    self.kill()
+                    raise RuntimeError(f"soffice did not accept connections within {SOFFICE_START_TIMEOUT}s")
+                time.sleep(0.25)
+        
+        self.desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+    
+    def convert(self, source: str, output_folder: str) -> str:
+        if not self.running:
+            self.start()
+        
+        target = _pdf_path(source, output_folder)
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(source)), "_blank", 0,
+            (PropertyValue(Name="Hidden", Value=True),)
+        )
+        if document is None:
+            raise RuntimeError(f"LibreOffice could not open {source}")
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(target)),
+                (PropertyValue(Name="FilterName", Value=PDF_FILTER),)
+            )
+        finally:
+            document.close(True)
+        self.conversions += 1
+        return target
+    
+    def kill(self):
+        self.desktop = None
+        process, self.process = self.process, None
+        if process and process.poll() is None:
+            process.kill()
+            process.wait()
+    
+    def stop(self):
+        if self.running:
+            try:
+                self.desktop.terminate()
+                self.process.wait(5)
+            except Exception:
+                pass
+        self.kill()
+
+
+class PdfConverter:
+    """Worker threads, each owning an OfficeInstance, fed from a bounded queue"""
+    
+    def __init__(self, workers: int = CONVERTER_WORKERS, queue_size: int = CONVERTER_QUEUE_SIZE):
+        self.instances = [OfficeInstance(index) for index in range(max(1, workers))]
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+    
+    def start(self, warm: bool = True):
+        """Start the worker threads; with warm, each starts its soffice straight away"""
+        with self._lock:
+            if self._threads:
+                return
+            for instance in self.instances:
+                thread = threading.Thread(
+                    target=self._worker, args=(instance, warm),
+                    name=f"pdf-converter-{instance.index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+    
+    def submit(self, source: str, output_folder: str) -> Optional[Future]:
+        """Queue a conversion; None if the queue is full"""
+        self.start(warm=False)
+        future = Future()
+        future.instance = None
+        try:
+            self._jobs.put_nowait((future, source, output_folder))
+        except queue.Full:
+            return None
+        return future
+    
+    def abort(self, future: Future):
+        """Give up on a conversion: cancel it if queued, restart its instance if running"""
+        if future.cancel():
+            return
+        instance = future.instance
+        if instance is not None and not future.done():
+            logger.warning(f"PDF conversion timed out, restarting LibreOffice worker {instance.index}")
+            instance.kill()
+    
+    def _worker(self, instance: OfficeInstance, warm: bool):
+        if warm:
+            try:
+                instance.start()
+            except Exception as e:
+                logger.warning(f"LibreOffice worker {instance.index} failed to start: {e}")
+        
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, source, output_folder = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            future.instance = instance
+            try:
+                future.set_result(instance.convert(source, output_folder))
+            except Exception as e:
+                # Crashed, killed after a timeout or failed to start: the next job starts a fresh soffice
+                instance.kill()
+                future.set_exception(e)
+        
+        instance.stop()
+    
+    def stop(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join(10)
+        for instance in self.instances:
+            instance.kill()
+    
+    def status(self) -> Dict:
+        return {
+            'workers': [
+                {
+                    'index': instance.index,
+                    'running': instance.running,
+                    'starts': instance.starts,
+                    'conversions': instance.conversions
+                }
+                for instance in self.instances
+            ],
+            'queued': self._jobs.qsize()
+        }
+
+
+_converter = None
+_converter_lock = threading.Lock()
+
+# Profile directories free for one-shot conversions
+_profiles = queue.Queue()
+for index in range(max(1, CONVERTER_WORKERS)):
+    _profiles.put(os.path.join(PROFILE_ROOT, f"oneshot-{index}"))
+
+
+def service_available() -> bool:
+    """True if conversions can go through long-lived soffice instances"""
+    return uno is not None and shutil.which(SOFFICE_BINARY) is not None
+
+
+def get_converter() -> Optional[PdfConverter]:
+    """Get the shared converter, or None if the UNO service is unavailable"""
+    global _converter
+    
+    if not service_available():
+        return None
+    with _converter_lock:
+        if _converter is None:
+            _converter = PdfConverter()
+        return _converter
+
+
+def start() -> bool:
+    """Start the soffice instances in the background (e.g. at server startup)"""
+    converter = get_converter()
+    if converter is None:
+        return False
+    converter.start(warm=True)
+    return True
+
+
+def shutdown():
+    global _converter
+    
+    with _converter_lock:
+        converter, _converter = _converter, None
+    if converter:
+        converter.stop()
+
+
+atexit.register(shutdown)
+
+
+def convert_with_command(source: str, output_folder: str, timeout: float = CONVERT_TIMEOUT) -> Optional[str]:
+    """
+    Convert with a one-shot `soffice --convert-to pdf`
+    
+    Returns:
+        PDF path, or None if conversion failed
+    """
+    try:
+        profile_dir = _profiles.get(timeout=timeout)
+    except queue.Empty:
+        logger.warning("PDF conversion gave up waiting for a LibreOffice profile")
+        return None
+    
+    try:
+        result = subprocess.run(
+            [SOFFICE_BINARY, "--headless", f"-env:UserInstallation={_profile_url(profile_dir)}",
+             "--convert-to", "pdf", "--outdir", output_folder, source],
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+        target = _pdf_path(source, output_folder)
+        if result.returncode == 0 and os.path.exists(target):
+            return target
+        logger.warning(f"PDF conversion failed: {result.stderr.strip()}")
+    except Exception as e:
+        logger.warning(f"PDF conversion failed: {e}")
+    finally:
+        _profiles.put(profile_dir)
+    return None
+
+
+def convert_to_pdf(source: str, output_folder: Optional[str] = None, timeout: float = CONVERT_TIMEOUT) -> Optional[str]:
+    """
+    Convert a spreadsheet to PDF next to it (or in output_folder)
+    
+    Uses the long-lived soffice instances when available and falls back to a
+    one-shot conversion if the service is unavailable, full, fails or times
+    out. The service gets half of timeout, so that a document stuck behind a
+    hung instance still gets its PDF within timeout.
+    
+    Args:
+        source: Path of the xlsx file
+        output_folder: Folder for the PDF (default: the source's folder)
+        timeout: Seconds to wait for the PDF
+    
+    Returns:
+        PDF path, or None if conversion failed
+    """
+    output_folder = output_folder or os.path.dirname(os.path.abspath(source))
+    converter = get_converter()
+    deadline = time.monotonic() + timeout
+    
+    if converter:
+        future = converter.submit(source, output_folder)
+        if future is None:
+            logger.warning("PDF converter queue full, converting with a one-shot soffice")
+        else:
+            try:
+                return future.result(timeout / 2)
+            except FutureTimeout:
+                converter.abort(future)
+                logger.warning(f"PDF conversion of {os.path.basename(source)} timed out after {timeout / 2:g}s, "
+                               f"converting with a one-shot soffice")
+            except Exception as e:
+                logger.warning(f"PDF converter failed ({e}), converting with a one-shot soffice")
+    
+    return convert_with_command(source, output_folder, max(1.0, deadline - time.monotonic()))
+
+
+def get_status() -> Dict:
+    """Converter mode and worker state for the API"""
+    converter = _converter
+    return {
+        'mode': 'service' if service_available() else 'command',
+        'binary': shutil.which(SOFFICE_BINARY),
+        'uno_available': uno is not None,
+        **(converter.status() if converter else {'workers': [], 'queued': 0})
+    }
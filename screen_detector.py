@@ -8,41 +8,111 @@ import cv2
 import numpy as np
 import sqlite3
 import os
+import struct
+import subprocess
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
+
+import adb_client
+import adb_shell
+import screen_stream
 
 # Database and templates path
 DB_PATH = "data/screen_control.db"
 TEMPLATES_DIR = "screen_templates"
 SCREENSHOTS_DIR = "screenshots"
 
+# Template scales tried by multi-scale matching
+DEFAULT_SCALES = [0.8, 0.9, 1.0, 1.1, 1.2]
+
+# Templates with a known capture resolution are matched at the scale computed
+# for the screenshot's resolution, then at +/- SCALE_SEARCH_STEP if that fails
+SCALE_SEARCH_STEP = 0.05
+
+# Threads shared by every detection in the process for matching templates
+# concurrently (cv2.matchTemplate releases the GIL); 1 matches inline
+MATCH_WORKERS = int(os.getenv("SCREEN_MATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Detection results remembered per device, keyed by a perceptual hash of the frame
+DETECTION_CACHE_SIZE = 16
+# dHash grid: (FRAME_HASH_SIZE + 1) x FRAME_HASH_SIZE pixels -> FRAME_HASH_SIZE^2 bits
+FRAME_HASH_SIZE = 16
+# Frames whose hashes differ in at most this many bits count as the same screen
+# (a clock tick or blinking cursor flips none or a couple, a dialog ~20)
+FRAME_HASH_MAX_DISTANCE = 4
+
+# Minimum seconds between captures in wait_for_screen
+WAIT_POLL_INTERVAL = 0.2
+
+# Coarse-to-fine matching: first pass at 1/COARSE_FACTOR resolution, then the
+# best REFINE_CANDIDATES scales are re-matched at full resolution in a window
+# of REFINE_MARGIN pixels around the coarse location
+COARSE_FACTOR = 4
+REFINE_CANDIDATES = 2
+REFINE_MARGIN = 2 * COARSE_FACTOR
+# Templates smaller than this (pixels) at coarse resolution are matched at full resolution only
+MIN_COARSE_SIZE = 8
+
+# screencap raw pixel formats (android PixelFormat) -> (bytes per pixel, cv2 conversion to BGR)
+SCREENCAP_FORMATS = {
+    1: (4, cv2.COLOR_RGBA2BGR),  # RGBA_8888
+    2: (4, cv2.COLOR_RGBA2BGR),  # RGBX_8888
+    3: (3, cv2.COLOR_RGB2BGR),   # RGB_888
+    5: (4, cv2.COLOR_BGRA2BGR),  # BGRA_8888
+}
+
+# A screenshot can be given as a file path or an already decoded BGR array
+Image = Union[str, np.ndarray]
+
+
+def load_image(image: Image) -> Optional[np.ndarray]:
+    """Return a BGR array for a screenshot/template path or array"""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.imread(image)
 
-def get_device_resolution(device_address: str) -> Optional[Tuple[int, int]]:
+
+# device address -> (width, height), from `wm size` or the last captured screenshot
+_device_resolutions = {}
+
+
+def get_device_resolution(device_address: str, refresh: bool = False) -> Optional[Tuple[int, int]]:
     """
     Get device screen resolution via ADB
     
+    Cached per device; screenshots captured with capture_screenshot_array
+    also update the cache, so ADB is only asked when nothing is known yet.
+    
     Args:
         device_address: ADB device address
+        refresh: Ask the device even if a resolution is cached
     
     Returns:
         Tuple of (width, height) or None if failed
     """
+    if not refresh and device_address in _device_resolutions:
+        return _device_resolutions[device_address]
+    
     try:
-        import subprocess
-        
-        result = subprocess.run(
-            ['adb', '-s', device_address, 'shell', 'wm', 'size'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        result = adb_shell.run_shell(device_address, ['wm', 'size'], timeout=5)
         
         if result.returncode == 0:
-            # Output format: "Physical size: 1440x2560"
-            output = result.stdout.strip()
-            if 'Physical size:' in output:
-                size_str = output.split('Physical size:')[1].strip()
+            # Output format: "Physical size: 1440x2560", plus
+            # "Override size: ..." when the display is scaled
+            sizes = {}
+            for line in result.stdout.splitlines():
+                if ':' in line:
+                    label, value = line.split(':', 1)
+                    sizes[label.strip()] = value.strip()
+            size_str = sizes.get('Override size') or sizes.get('Physical size')
+            if size_str:
                 width, height = map(int, size_str.split('x'))
+                _device_resolutions[device_address] = (width, height)
                 return (width, height)
         
         return None
@@ -51,6 +121,82 @@ def get_device_resolution(device_address: str) -> Optional[Tuple[int, int]]:
         return None
 
 
+def compute_template_scale(capture_resolution: Tuple[int, int], screen_size: Tuple[int, int]) -> float:
+    """
+    Scale that maps a template captured at capture_resolution onto screen_size
+    
+    Uses the short sides, so it holds in either orientation. Rounded so the
+    template store can reuse its resized images across frames.
+    """
+    return round(min(screen_size) / min(capture_resolution), 3)
+
+
+def select_template_scales(template: Dict, screen_size: Tuple[int, int],
+                           use_multiscale: bool = True) -> Tuple[List[float], List[float]]:
+    """
+    Choose the scales to match a template at
+    
+    Args:
+        template: Template dict (see load_templates_from_db)
+        screen_size: (width, height) of the screenshot
+        use_multiscale: Allow more than one scale
+    
+    Returns:
+        Tuple of (scales to try first, scales to try only if those do not match)
+    """
+    capture_resolution = template.get('capture_resolution')
+    if not capture_resolution:
+        return (DEFAULT_SCALES if use_multiscale else [1.0]), []
+    
+    scale = compute_template_scale(capture_resolution, screen_size)
+    if not use_multiscale:
+        return [scale], []
+    return [scale], [round(scale - SCALE_SEARCH_STEP, 3), round(scale + SCALE_SEARCH_STEP, 3)]
+
+
+def parse_search_region(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Parse a screen_templates.search_region value
+    
+    Args:
+        value: "x,y,width,height" as fractions of the screen (0.0-1.0)
+    
+    Returns:
+        Tuple of (x, y, width, height), or None to search the whole screen
+    """
+    if not value:
+        return None
+    
+    try:
+        x, y, width, height = (float(part) for part in str(value).split(','))
+    except ValueError:
+        print(f"⚠️  Ignoring invalid search region: {value!r}")
+        return None
+    
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < width <= 1 and 0 < height <= 1):
+        print(f"⚠️  Ignoring out of range search region: {value!r}")
+        return None
+    return (x, y, width, height)
+
+
+def crop_search_region(image: np.ndarray, region: Optional[Tuple[float, float, float, float]]) -> Tuple[np.ndarray, int, int]:
+    """
+    Crop a screenshot to a template's search region
+    
+    Returns:
+        Tuple of (cropped image, x offset, y offset)
+    """
+    if region is None:
+        return image, 0, 0
+    
+    image_h, image_w = image.shape[:2]
+    x, y, width, height = region
+    left, top = int(x * image_w), int(y * image_h)
+    right = min(image_w, int(round((x + width) * image_w)))
+    bottom = min(image_h, int(round((y + height) * image_h)))
+    return image[top:bottom, left:right], left, top
+
+
 def load_templates_from_db() -> List[Dict]:
     """Load template definitions from database"""
     try:
@@ -58,8 +204,9 @@ def load_templates_from_db() -> List[Dict]:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
+        # SELECT * so databases without the newer columns still load
         cursor.execute("""
-            SELECT id, name, filename, confidence_threshold, priority 
+            SELECT *
             FROM screen_templates
             ORDER BY priority DESC
         """)
@@ -71,13 +218,23 @@ def load_templates_from_db() -> List[Dict]:
         for row in rows:
             template_path = os.path.join(TEMPLATES_DIR, row['filename'])
             if os.path.exists(template_path):
+                columns = row.keys()
                 templates.append({
                     'id': row['id'],
                     'name': row['name'],
                     'filename': row['filename'],
                     'path': template_path,
                     'threshold': row['confidence_threshold'],
-                    'priority': row['priority']
+                    'priority': row['priority'],
+                    'search_region': parse_search_region(
+                        row['search_region'] if 'search_region' in columns else None
+                    ),
+                    'exclusive': bool(row['exclusive']) if 'exclusive' in columns else False,
+                    'capture_resolution': (
+                        (row['capture_width'], row['capture_height'])
+                        if 'capture_width' in columns and row['capture_width'] and row['capture_height']
+                        else None
+                    )
                 })
         
         return templates
@@ -86,148 +243,569 @@ def load_templates_from_db() -> List[Dict]:
         return []
 
 
-def match_template(screenshot_path: str, template_path: str, threshold: float = 0.7) -> Optional[Dict]:
+# Template definitions as last read from screen_templates (None = not loaded yet)
+_template_registry = {'templates': None, 'loaded_at': None}
+_registry_lock = threading.Lock()
+
+
+def get_templates(refresh: bool = False) -> List[Dict]:
     """
-    Match a template against a screenshot using OpenCV
+    Get template definitions from the in-memory registry
+    
+    The registry is read from the database on first use and after
+    invalidate_templates(); detections in between never touch the database.
     
     Args:
-        screenshot_path: Path to screenshot image
-        template_path: Path to template image
-        threshold: Confidence threshold (0.0-1.0)
+        refresh: Re-read screen_templates before returning
     
     Returns:
-        Dict with match info or None if no match
+        List of template dicts (copies, safe for callers to modify)
     """
-    try:
-        # Load images
-        screenshot = cv2.imread(screenshot_path)
-        template = cv2.imread(template_path)
+    with _registry_lock:
+        templates = _template_registry['templates']
+        if refresh or not templates:
+            # An empty result (e.g. database not initialised yet) is not cached
+            templates = load_templates_from_db()
+            _template_registry['templates'] = templates
+            _template_registry['loaded_at'] = time.time()
+            template_store.retain([t['path'] for t in templates])
+            clear_detection_cache()
+        return [dict(t) for t in templates]
+
+
+def invalidate_templates():
+    """Mark the registry stale after screen_templates (or a template file) changed"""
+    with _registry_lock:
+        _template_registry['templates'] = None
+    clear_detection_cache()
+
+
+class TemplateStore:
+    """
+    In-memory cache of template images, preprocessed for matching
+    
+    Each template file is read once and kept as grayscale at every scale that
+    has been asked for. Entries are reloaded when the file's mtime or size
+    changes and dropped when the template leaves the screen_templates table
+    (see retain).
+    """
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def _entry(self, template_path: str) -> Optional[Dict]:
+        """Get the cache entry for a template, (re)loading the file if it changed"""
+        try:
+            stat = os.stat(template_path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        
+        with self._lock:
+            entry = self._entries.get(template_path)
+        
+        if entry is None or entry['signature'] != signature:
+            template = cv2.imread(template_path)
+            if template is None:
+                return None
+            entry = {
+                'signature': signature,
+                'gray': cv2.cvtColor(template, cv2.COLOR_BGR2GRAY),
+                'scaled': {},
+                'coarse': {}
+            }
+            with self._lock:
+                self._entries[template_path] = entry
+        return entry
+    
+    def get(self, template_path: str, scales: List[float]) -> Optional[Dict[float, np.ndarray]]:
+        """
+        Get the grayscale template at each requested scale
+        
+        Returns:
+            Dict of scale -> grayscale array, or None if the file cannot be read
+        """
+        entry = self._entry(template_path)
+        if entry is None:
+            return None
+        
+        scaled = entry['scaled']
+        for scale in scales:
+            if scale not in scaled:
+                scaled[scale] = self._resize(entry['gray'], scale)
+        return {scale: scaled[scale] for scale in scales}
+    
+    def get_coarse(self, template_path: str, scales: List[float],
+                   factor: int = COARSE_FACTOR) -> Optional[Dict[float, np.ndarray]]:
+        """
+        Get the grayscale template at each requested scale, reduced by factor
         
-        if screenshot is None or template is None:
+        Resized straight from the full-resolution image, so the result lines up
+        with a screenshot reduced by the same factor (see downscale).
+        
+        Returns:
+            Dict of scale -> grayscale array, or None if the file cannot be read
+        """
+        entry = self._entry(template_path)
+        if entry is None:
+            return None
+        
+        coarse = entry['coarse']
+        for scale in scales:
+            if (scale, factor) not in coarse:
+                coarse[(scale, factor)] = self._resize(entry['gray'], scale / factor)
+        return {scale: coarse[(scale, factor)] for scale in scales}
+    
+    @staticmethod
+    def _resize(gray: np.ndarray, scale: float) -> np.ndarray:
+        if scale == 1.0:
+            return gray
+        template_h, template_w = gray.shape[:2]
+        new_h, new_w = max(1, int(template_h * scale)), max(1, int(template_w * scale))
+        return cv2.resize(gray, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    
+    def retain(self, template_paths: List[str]):
+        """Drop cached templates that are no longer in use"""
+        keep = set(template_paths)
+        with self._lock:
+            for path in list(self._entries):
+                if path not in keep:
+                    del self._entries[path]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every detection in this process
+template_store = TemplateStore()
+
+_match_pool = None
+_match_pool_lock = threading.Lock()
+
+
+def get_match_pool() -> Optional[ThreadPoolExecutor]:
+    """Get the shared template matching pool, or None when matching inline"""
+    global _match_pool
+    
+    if MATCH_WORKERS <= 1:
+        return None
+    with _match_pool_lock:
+        if _match_pool is None:
+            _match_pool = ThreadPoolExecutor(max_workers=MATCH_WORKERS, thread_name_prefix="template-match")
+        return _match_pool
+
+
+# device address -> OrderedDict of (detection options, frame hash) -> result, oldest first
+_detection_cache = {}
+_detection_cache_lock = threading.Lock()
+
+
+def frame_hash(image: np.ndarray, hash_size: int = FRAME_HASH_SIZE) -> int:
+    """
+    Perceptual difference hash (dHash) of a frame
+    
+    The frame is shrunk to a (hash_size + 1) x hash_size grayscale grid and
+    each bit records whether a pixel is brighter than its right neighbour, so
+    the hash ignores small changes but follows the layout. The frame is
+    subsampled before resizing, which keeps this well under a millisecond.
+    """
+    step = max(1, min(image.shape[:2]) // (hash_size * 8))
+    small = cv2.resize(image[::step, ::step], (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    small = to_grayscale(small)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def get_cached_detection(device_address: str, options: Tuple, frame: int) -> Optional[Dict]:
+    """
+    Get a remembered detection result for this device and frame, if any
+    
+    Args:
+        device_address: ADB device address
+        options: Detection options the result must have been produced with
+        frame: frame_hash of the screenshot
+    
+    Returns:
+        Copy of the result for the nearest remembered frame within
+        FRAME_HASH_MAX_DISTANCE bits, or None
+    """
+    with _detection_cache_lock:
+        results = _detection_cache.get(device_address)
+        if not results:
             return None
         
-        # Convert to grayscale
-        screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-        template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        best_key, best_distance = None, FRAME_HASH_MAX_DISTANCE + 1
+        for key in results:
+            if key[0] == options:
+                distance = bin(key[1] ^ frame).count('1')
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        if best_key is None:
+            return None
+        
+        results.move_to_end(best_key)
+        return copy.deepcopy(results[best_key])
+
+
+def cache_detection(device_address: str, key: Tuple, result: Dict):
+    """Remember a detection result, dropping the device's least recently used one when full"""
+    with _detection_cache_lock:
+        results = _detection_cache.setdefault(device_address, OrderedDict())
+        results[key] = copy.deepcopy(result)
+        results.move_to_end(key)
+        while len(results) > DETECTION_CACHE_SIZE:
+            results.popitem(last=False)
+
+
+def clear_detection_cache(device_address: str = None):
+    """Forget remembered detections for one device, or all of them"""
+    with _detection_cache_lock:
+        if device_address is None:
+            _detection_cache.clear()
+        else:
+            _detection_cache.pop(device_address, None)
+
+
+def set_match_workers(workers: int):
+    """Resize the template matching pool (1 = match inline)"""
+    global _match_pool, MATCH_WORKERS
+    
+    with _match_pool_lock:
+        MATCH_WORKERS = max(1, int(workers))
+        # Not shut down: detections already running still submit to the old
+        # pool. Its idle threads exit once the last of them lets go of it.
+        _match_pool = None
+
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """Convert a BGR screenshot to grayscale (no-op if it already is)"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def downscale(image: np.ndarray, factor: int = COARSE_FACTOR) -> np.ndarray:
+    """Reduce an image by factor for the coarse matching pass"""
+    image_h, image_w = image.shape[:2]
+    return cv2.resize(image, (max(1, image_w // factor), max(1, image_h // factor)), interpolation=cv2.INTER_AREA)
+
+
+def match_scaled_templates(screenshot_gray: np.ndarray, scaled_templates: Dict[float, np.ndarray],
+                           threshold: float, search_region: Tuple[float, float, float, float] = None) -> Optional[Dict]:
+    """
+    Find the best match of a template over its preprocessed scales
+    
+    Args:
+        screenshot_gray: Grayscale screenshot
+        scaled_templates: Dict of scale -> grayscale template (see TemplateStore.get)
+        threshold: Confidence threshold (0.0-1.0)
+        search_region: Optional (x, y, width, height) fractions to search instead of the whole screen
+    
+    Returns:
+        Dict with best match info (location in full screenshot coordinates and
+        'scales_evaluated'), or None if no scale fits inside the search area
+    """
+    search_area, offset_x, offset_y = crop_search_region(screenshot_gray, search_region)
+    
+    best_match = None
+    best_confidence = 0.0
+    scales_evaluated = 0
+    
+    for scale, template_gray in scaled_templates.items():
+        new_h, new_w = template_gray.shape[:2]
+        
+        # Skip if scaled template is larger than the search area
+        if new_h > search_area.shape[0] or new_w > search_area.shape[1]:
+            continue
         
         # Perform template matching
-        result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
+        result = cv2.matchTemplate(search_area, template_gray, cv2.TM_CCOEFF_NORMED)
+        scales_evaluated += 1
         
-        # Get best match
+        # Get best match for this scale
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
         
-        # Check if match exceeds threshold
-        if max_val >= threshold:
-            template_h, template_w = template_gray.shape
-            return {
+        # Update best match if this is better
+        if best_match is None or max_val > best_confidence:
+            best_confidence = max_val
+            best_match = {
                 'confidence': float(max_val),
                 'location': {
-                    'x': int(max_loc[0]),
-                    'y': int(max_loc[1]),
-                    'width': int(template_w),
-                    'height': int(template_h)
+                    'x': int(max_loc[0]) + offset_x,
+                    'y': int(max_loc[1]) + offset_y,
+                    'width': int(new_w),
+                    'height': int(new_h)
                 },
-                'matched': True,
-                'scale': 1.0
+                'scale': scale,
+                'matched': max_val >= threshold
             }
-        else:
-            return {
+    
+    if best_match:
+        best_match['scales_evaluated'] = scales_evaluated
+    return best_match
+
+
+def match_coarse_to_fine(screenshot_gray: np.ndarray, screenshot_coarse: np.ndarray,
+                         scaled_templates: Dict[float, np.ndarray], coarse_templates: Dict[float, np.ndarray],
+                         threshold: float, search_region: Tuple[float, float, float, float] = None,
+                         factor: int = COARSE_FACTOR) -> Optional[Dict]:
+    """
+    Find the best match of a template with a coarse pass and full-resolution refinement
+    
+    Every scale is matched against the reduced screenshot; only the best
+    REFINE_CANDIDATES are matched again at full resolution, inside a small
+    window around where the coarse pass found them. Confidence and location
+    come from the full-resolution match, so the result is comparable with
+    match_scaled_templates.
+    
+    Args:
+        screenshot_gray: Grayscale screenshot
+        screenshot_coarse: screenshot_gray reduced by factor (see downscale)
+        scaled_templates: Dict of scale -> grayscale template (see TemplateStore.get)
+        coarse_templates: Same scales reduced by factor (see TemplateStore.get_coarse)
+        threshold: Confidence threshold (0.0-1.0)
+        search_region: Optional (x, y, width, height) fractions to search instead of the whole screen
+        factor: Reduction between screenshot_gray and screenshot_coarse
+    
+    Returns:
+        Dict with best match info (same format as match_scaled_templates), or
+        None if no scale fits inside the search area
+    """
+    # Too small to survive reduction, match at full resolution instead
+    if not coarse_templates or any(min(coarse_templates[scale].shape[:2]) < MIN_COARSE_SIZE
+                                   for scale in scaled_templates):
+        return match_scaled_templates(screenshot_gray, scaled_templates, threshold, search_region)
+    
+    coarse_area, coarse_x, coarse_y = crop_search_region(screenshot_coarse, search_region)
+    search_area, offset_x, offset_y = crop_search_region(screenshot_gray, search_region)
+    area_h, area_w = search_area.shape[:2]
+    scales_evaluated = 0
+    
+    # Coarse pass: best location per scale, in full screenshot coordinates
+    candidates = []
+    for scale, template_coarse in coarse_templates.items():
+        template_h, template_w = template_coarse.shape[:2]
+        if template_h > coarse_area.shape[0] or template_w > coarse_area.shape[1]:
+            continue
+        
+        result = cv2.matchTemplate(coarse_area, template_coarse, cv2.TM_CCOEFF_NORMED)
+        scales_evaluated += 1
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        candidates.append((max_val, scale, (coarse_x + max_loc[0]) * factor, (coarse_y + max_loc[1]) * factor))
+    
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    
+    # Refine the best candidates at full resolution
+    best_match = None
+    best_confidence = 0.0
+    
+    for coarse_val, scale, x, y in candidates[:REFINE_CANDIDATES]:
+        template_gray = scaled_templates[scale]
+        new_h, new_w = template_gray.shape[:2]
+        if new_h > area_h or new_w > area_w:
+            continue
+        
+        # Window around the coarse location, kept inside the search area
+        left = min(max(0, x - offset_x - REFINE_MARGIN), area_w - new_w)
+        top = min(max(0, y - offset_y - REFINE_MARGIN), area_h - new_h)
+        right = min(area_w, max(left + new_w, x - offset_x + new_w + REFINE_MARGIN))
+        bottom = min(area_h, max(top + new_h, y - offset_y + new_h + REFINE_MARGIN))
+        window = search_area[top:bottom, left:right]
+        
+        result = cv2.matchTemplate(window, template_gray, cv2.TM_CCOEFF_NORMED)
+        scales_evaluated += 1
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        
+        if best_match is None or max_val > best_confidence:
+            best_confidence = max_val
+            best_match = {
                 'confidence': float(max_val),
-                'matched': False,
-                'scale': 1.0
+                'location': {
+                    'x': int(max_loc[0]) + left + offset_x,
+                    'y': int(max_loc[1]) + top + offset_y,
+                    'width': int(new_w),
+                    'height': int(new_h)
+                },
+                'scale': scale,
+                'matched': max_val >= threshold
             }
+    
+    if best_match:
+        best_match['scales_evaluated'] = scales_evaluated
+    return best_match
+
+
+def match_template(screenshot_path: Image, template_path: str, threshold: float = 0.7) -> Optional[Dict]:
+    """
+    Match a template against a screenshot using OpenCV
+    
+    Args:
+        screenshot_path: Path to screenshot image, or decoded BGR/grayscale array
+        template_path: Path to template image
+        threshold: Confidence threshold (0.0-1.0)
+    
+    Returns:
+        Dict with match info or None if no match
+    """
+    try:
+        screenshot = load_image(screenshot_path)
+        templates = template_store.get(template_path, [1.0])
+        
+        if screenshot is None or templates is None:
+            return None
+        
+        match = match_scaled_templates(to_grayscale(screenshot), templates, threshold)
+        if match:
+            del match['scales_evaluated']
+            if not match['matched']:
+                del match['location']
+        return match
     except Exception as e:
         print(f"Error matching template: {e}")
         return None
 
 
-def match_template_multiscale(screenshot_path: str, template_path: str, threshold: float = 0.7, 
+def match_template_multiscale(screenshot_path: Image, template_path: str, threshold: float = 0.7, 
                                scales: List[float] = None) -> Optional[Dict]:
     """
     Match a template against a screenshot using multi-scale template matching
     
     Args:
-        screenshot_path: Path to screenshot image
+        screenshot_path: Path to screenshot image, or decoded BGR/grayscale array
         template_path: Path to template image
         threshold: Confidence threshold (0.0-1.0)
-        scales: List of scales to try (default: [0.8, 0.9, 1.0, 1.1, 1.2])
+        scales: List of scales to try (default: DEFAULT_SCALES)
     
     Returns:
         Dict with best match info or None if no match
     """
     if scales is None:
-        scales = [0.8, 0.9, 1.0, 1.1, 1.2]
+        scales = DEFAULT_SCALES
     
     try:
-        # Load images
-        screenshot = cv2.imread(screenshot_path)
-        template_orig = cv2.imread(template_path)
+        screenshot = load_image(screenshot_path)
+        templates = template_store.get(template_path, scales)
         
-        if screenshot is None or template_orig is None:
+        if screenshot is None or templates is None:
             return None
         
-        # Convert screenshot to grayscale once
-        screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-        
-        best_match = None
-        best_confidence = 0.0
+        match = match_scaled_templates(to_grayscale(screenshot), templates, threshold)
+        if match:
+            del match['scales_evaluated']
+        return match
+    except Exception as e:
+        print(f"Error in multi-scale template matching: {e}")
+        return None
+
+
+def match_template_coarse_to_fine(screenshot_path: Image, template_path: str, threshold: float = 0.7,
+                                  scales: List[float] = None) -> Optional[Dict]:
+    """
+    Multi-scale template matching with a reduced-resolution first pass
+    
+    Same arguments and result as match_template_multiscale (see match_coarse_to_fine).
+    """
+    if scales is None:
+        scales = DEFAULT_SCALES
+    
+    try:
+        screenshot = load_image(screenshot_path)
+        templates = template_store.get(template_path, scales)
+        coarse_templates = template_store.get_coarse(template_path, scales)
         
-        # Try each scale
-        for scale in scales:
-            # Scale template
-            template_h, template_w = template_orig.shape[:2]
-            new_h, new_w = int(template_h * scale), int(template_w * scale)
-            
-            # Skip if scaled template is larger than screenshot
-            if new_h > screenshot.shape[0] or new_w > screenshot.shape[1]:
-                continue
-            
-            # Resize template
-            template_resized = cv2.resize(template_orig, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            template_gray = cv2.cvtColor(template_resized, cv2.COLOR_BGR2GRAY)
-            
-            # Perform template matching
-            result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-            
-            # Get best match for this scale
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            
-            # Update best match if this is better
-            if max_val > best_confidence:
-                best_confidence = max_val
-                best_match = {
-                    'confidence': float(max_val),
-                    'location': {
-                        'x': int(max_loc[0]),
-                        'y': int(max_loc[1]),
-                        'width': new_w,
-                        'height': new_h
-                    },
-                    'scale': scale,
-                    'matched': max_val >= threshold
-                }
+        if screenshot is None or templates is None or coarse_templates is None:
+            return None
         
-        return best_match
+        screenshot_gray = to_grayscale(screenshot)
+        match = match_coarse_to_fine(
+            screenshot_gray,
+            downscale(screenshot_gray),
+            templates,
+            coarse_templates,
+            threshold
+        )
+        if match:
+            del match['scales_evaluated']
+        return match
     except Exception as e:
-        print(f"Error in multi-scale template matching: {e}")
+        print(f"Error in coarse-to-fine template matching: {e}")
+        return None
+
+
+def _match_frame(template: Dict, scales: List[float], screenshot_gray: np.ndarray,
+                 screenshot_coarse: Optional[np.ndarray], threshold: float) -> Optional[Dict]:
+    """Match one template at the given scales (coarse-to-fine if screenshot_coarse is given)"""
+    scaled_templates = template_store.get(template['path'], scales)
+    if not scaled_templates:
         return None
+    
+    if screenshot_coarse is not None:
+        return match_coarse_to_fine(
+            screenshot_gray,
+            screenshot_coarse,
+            scaled_templates,
+            template_store.get_coarse(template['path'], scales),
+            threshold,
+            template['search_region']
+        )
+    return match_scaled_templates(
+        screenshot_gray,
+        scaled_templates,
+        threshold,
+        template['search_region']
+    )
+
+
+def _match_template_in_frame(template: Dict, screenshot_gray: np.ndarray, screenshot_coarse: Optional[np.ndarray],
+                             screen_size: Tuple[int, int], threshold: float, use_multiscale: bool) -> Optional[Dict]:
+    """Match one template for detect_current_screen, trying fallback scales if needed"""
+    # Computed scale for this resolution first, neighbouring scales only if needed
+    scales, fallback_scales = select_template_scales(template, screen_size, use_multiscale)
+    match_result = _match_frame(template, scales, screenshot_gray, screenshot_coarse, threshold)
+    
+    if fallback_scales and not (match_result and match_result['matched']):
+        fallback_result = _match_frame(template, fallback_scales, screenshot_gray, screenshot_coarse, threshold)
+        if fallback_result and match_result:
+            fallback_result['scales_evaluated'] += match_result['scales_evaluated']
+        if fallback_result and (not match_result or fallback_result['confidence'] > match_result['confidence']):
+            match_result = fallback_result
+    
+    return match_result
 
 
-def detect_current_screen(screenshot_path: str, threshold: float = None, use_multiscale: bool = True) -> Optional[Dict]:
+def detect_current_screen(screenshot_path: Image, threshold: float = None, use_multiscale: bool = True,
+                          exhaustive: bool = False, coarse_to_fine: bool = True,
+                          device_address: str = None) -> Optional[Dict]:
     """
     Detect which screen is currently displayed
     
+    Templates are tried in priority order, each only inside its search region
+    and, when its capture resolution is known, at the scale for this
+    screenshot's resolution (see select_template_scales).
+    Unless exhaustive is set, detection stops once a template has matched and
+    the remaining templates have lower priority (they could not win), or
+    straight away when the matched template is exclusive.
+    
+    With a device_address, results are remembered per device by frame_hash,
+    so a frame that looks the same as a recent one skips matching entirely.
+    
     Args:
-        screenshot_path: Path to screenshot image
+        screenshot_path: Path to screenshot image, or decoded BGR array (see capture_screenshot_array)
         threshold: Optional custom confidence threshold (overrides template defaults)
         use_multiscale: Whether to use multi-scale template matching (default: True)
+        exhaustive: Evaluate every template, so all_matches lists every match
+        coarse_to_fine: Locate templates at reduced resolution first (see match_coarse_to_fine)
+        device_address: Device the screenshot came from, enables the detection cache
     
     Returns:
-        Dict with detection results or None
+        Dict with detection results (including templates_evaluated,
+        scales_evaluated and 'cached') or None
     """
     try:
-        # Load all templates
-        templates = load_templates_from_db()
+        # Template definitions (cached, see get_templates)
+        templates = get_templates()
         
         if not templates:
             return {
@@ -235,35 +813,78 @@ def detect_current_screen(screenshot_path: str, threshold: float = None, use_mul
                 'error': 'No templates available'
             }
         
-        # Try to match each template (ordered by priority)
-        matches = []
-        for template in templates:
+        # Decode and grayscale the screenshot once for all templates
+        screenshot = load_image(screenshot_path)
+        if screenshot is None:
+            return {
+                'success': False,
+                'error': 'Could not read screenshot'
+            }
+        
+        # Same-looking frame as a recent detection on this device: reuse its result
+        cache_key = None
+        if device_address:
+            options = (screenshot.shape[:2], threshold, use_multiscale, exhaustive, coarse_to_fine)
+            cache_key = (options, frame_hash(screenshot))
+            cached = get_cached_detection(device_address, *cache_key)
+            if cached:
+                cached['cached'] = True
+                return cached
+        
+        screenshot_gray = to_grayscale(screenshot)
+        screenshot_coarse = downscale(screenshot_gray) if coarse_to_fine else None
+        screen_size = (screenshot_gray.shape[1], screenshot_gray.shape[0])
+        
+        def evaluate(template):
             # Use custom threshold if provided, otherwise use template default
             match_threshold = threshold if threshold is not None else template['threshold']
-            
-            # Choose matching method
-            if use_multiscale:
-                match_result = match_template_multiscale(
-                    screenshot_path, 
-                    template['path'], 
-                    match_threshold
-                )
-            else:
-                match_result = match_template(
-                    screenshot_path, 
-                    template['path'], 
-                    match_threshold
-                )
-            
-            if match_result and match_result['matched']:
-                matches.append({
-                    'template_id': template['id'],
-                    'template_name': template['name'],
-                    'confidence': match_result['confidence'],
-                    'location': match_result['location'],
-                    'priority': template['priority'],
-                    'scale': match_result.get('scale', 1.0)
-                })
+            return _match_template_in_frame(
+                template, screenshot_gray, screenshot_coarse, screen_size, match_threshold, use_multiscale
+            )
+        
+        # The next few templates are matched ahead on the shared pool (at most
+        # one per worker, so concurrent detections interleave); results are
+        # still consumed in priority order so the early exit below is unchanged
+        pool = get_match_pool()
+        futures = {}
+        
+        # Try to match each template (ordered by priority)
+        matches = []
+        templates_evaluated = 0
+        scales_evaluated = 0
+        try:
+            for index, template in enumerate(templates):
+                if matches and not exhaustive:
+                    # Templates are sorted by priority, so the first match is the best so far
+                    if matches[0]['exclusive'] or template['priority'] < matches[0]['priority']:
+                        break
+                
+                if pool:
+                    for ahead in range(index, min(index + MATCH_WORKERS, len(templates))):
+                        if ahead not in futures:
+                            futures[ahead] = pool.submit(evaluate, templates[ahead])
+                    match_result = futures.pop(index).result()
+                else:
+                    match_result = evaluate(template)
+                
+                templates_evaluated += 1
+                if match_result:
+                    scales_evaluated += match_result['scales_evaluated']
+                
+                if match_result and match_result['matched']:
+                    matches.append({
+                        'template_id': template['id'],
+                        'template_name': template['name'],
+                        'confidence': match_result['confidence'],
+                        'location': match_result['location'],
+                        'priority': template['priority'],
+                        'exclusive': template['exclusive'],
+                        'scale': match_result.get('scale', 1.0)
+                    })
+        finally:
+            # Skip look-ahead templates that have not started yet
+            for future in futures.values():
+                future.cancel()
         
         # Return best match (highest priority and confidence)
         if matches:
@@ -271,21 +892,31 @@ def detect_current_screen(screenshot_path: str, threshold: float = None, use_mul
             matches.sort(key=lambda x: (x['priority'], x['confidence']), reverse=True)
             best_match = matches[0]
             
-            return {
+            result = {
                 'success': True,
                 'screen': best_match['template_name'],
                 'template_id': best_match['template_id'],
                 'confidence': best_match['confidence'],
                 'location': best_match['location'],
                 'scale': best_match['scale'],
-                'all_matches': matches
+                'all_matches': matches,
+                'templates_evaluated': templates_evaluated,
+                'scales_evaluated': scales_evaluated,
+                'cached': False
             }
         else:
-            return {
+            result = {
                 'success': True,
                 'screen': None,
-                'message': 'No matching screen detected'
+                'message': 'No matching screen detected',
+                'templates_evaluated': templates_evaluated,
+                'scales_evaluated': scales_evaluated,
+                'cached': False
             }
+        
+        if cache_key:
+            cache_detection(device_address, cache_key, result)
+        return result
     except Exception as e:
         print(f"Error detecting screen: {e}")
         return {
@@ -294,19 +925,106 @@ def detect_current_screen(screenshot_path: str, threshold: float = None, use_mul
         }
 
 
-def capture_screenshot(device_address: str, save_path: Optional[str] = None) -> Optional[str]:
+def decode_raw_screencap(data: bytes) -> Optional[np.ndarray]:
     """
-    Capture screenshot from Android device via ADB
+    Decode raw `screencap` output (no -p) into a BGR array
+    
+    The header is width, height and pixel format as little-endian uint32,
+    followed on Android 9+ by a colour space field.
+    
+    Returns:
+        BGR array, or None if the data is not a supported raw frame
+    """
+    if len(data) < 12:
+        return None
+    
+    width, height, pixel_format = struct.unpack_from('<III', data)
+    if pixel_format not in SCREENCAP_FORMATS or not width or not height:
+        return None
+    
+    bytes_per_pixel, conversion = SCREENCAP_FORMATS[pixel_format]
+    pixel_bytes = width * height * bytes_per_pixel
+    
+    for header_size in (16, 12):
+        if len(data) - header_size >= pixel_bytes:
+            break
+    else:
+        return None
+    
+    pixels = np.frombuffer(data, dtype=np.uint8, count=pixel_bytes, offset=header_size)
+    return cv2.cvtColor(pixels.reshape(height, width, bytes_per_pixel), conversion)
+
+
+def _exec_out(device_address: str, command: str, timeout: int = 10) -> Optional[bytes]:
+    """Run a command with binary stdout, via the adb server socket when possible"""
+    try:
+        return adb_client.client.exec_out(device_address, command, timeout=timeout)
+    except (OSError, adb_client.AdbError):
+        pass
+    
+    result = subprocess.run(
+        ['adb', '-s', device_address, 'exec-out'] + command.split(),
+        capture_output=True,
+        timeout=timeout
+    )
+    if result.returncode != 0:
+        print(f"Error capturing screenshot: {result.stderr.decode(errors='replace')}")
+        return None
+    return result.stdout
+
+
+def capture_screenshot_array(device_address: str, timeout: int = 10, use_stream: bool = True) -> Optional[np.ndarray]:
+    """
+    Capture a screenshot straight into memory
+    
+    Uses the latest frame of the device's screen stream when one is running
+    (see screen_stream). Otherwise streams raw `screencap` pixels over
+    exec-out (no PNG encoding on the device and no temp file on its storage),
+    falling back to PNG if the raw format is not recognised.
     
     Args:
         device_address: ADB device address
-        save_path: Optional custom save path
+        timeout: Seconds to wait for the capture
+        use_stream: Allow the running screen stream's latest frame
+    
+    Returns:
+        BGR array or None
+    """
+    if use_stream:
+        frame = screen_stream.get_latest_frame(device_address)
+        if frame is not None:
+            return frame
+    
+    try:
+        data = _exec_out(device_address, 'screencap', timeout)
+        if not data:
+            return None
+        
+        image = decode_raw_screencap(data)
+        if image is None:
+            data = _exec_out(device_address, 'screencap -p', timeout)
+            if not data:
+                return None
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                print("Error capturing screenshot: could not decode screencap output")
+                return None
+        
+        _device_resolutions[device_address] = (image.shape[1], image.shape[0])
+        return image
+    except Exception as e:
+        print(f"Error capturing screenshot: {e}")
+        return None
+
+
+def save_screenshot(device_address: str, image: np.ndarray, save_path: Optional[str] = None) -> Optional[str]:
+    """
+    Write a captured screenshot to screenshots/<device>/ as PNG
     
     Returns:
         Path to saved screenshot or None
     """
     try:
-        import subprocess
         from datetime import datetime
         
         # Create device-specific screenshot directory
@@ -320,56 +1038,140 @@ def capture_screenshot(device_address: str, save_path: Optional[str] = None) ->
         # Ensure parent directory exists
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         
-        # Capture screenshot via ADB
-        # First capture to device
-        result = subprocess.run(
-            ['adb', '-s', device_address, 'shell', 'screencap', '-p', '/sdcard/screenshot.png'],
-            capture_output=True,
-            timeout=10
-        )
-        
-        if result.returncode != 0:
-            print(f"Error capturing screenshot: {result.stderr.decode()}")
-            return None
-        
-        # Pull screenshot from device
-        result = subprocess.run(
-            ['adb', '-s', device_address, 'pull', '/sdcard/screenshot.png', save_path],
-            capture_output=True,
-            timeout=10
-        )
-        
-        if result.returncode != 0:
-            print(f"Error pulling screenshot: {result.stderr.decode()}")
-            return None
-        
-        # Clean up device screenshot
-        subprocess.run(
-            ['adb', '-s', device_address, 'shell', 'rm', '/sdcard/screenshot.png'],
-            capture_output=True,
-            timeout=5
-        )
-        
-        return save_path if os.path.exists(save_path) else None
+        return save_path if cv2.imwrite(save_path, image) else None
     except Exception as e:
-        print(f"Error capturing screenshot: {e}")
+        print(f"Error saving screenshot: {e}")
+        return None
+
+
+def capture_screenshot(device_address: str, save_path: Optional[str] = None) -> Optional[str]:
+    """
+    Capture screenshot from Android device via ADB and save it
+    
+    Use capture_screenshot_array when the image does not need to be kept.
+    
+    Args:
+        device_address: ADB device address
+        save_path: Optional custom save path
+    
+    Returns:
+        Path to saved screenshot or None
+    """
+    image = capture_screenshot_array(device_address)
+    if image is None:
         return None
+    return save_screenshot(device_address, image, save_path)
 
 
-def get_screenshot_as_base64(screenshot_path: str) -> Optional[str]:
-    """Convert screenshot to base64 for web display"""
+def get_screenshot_as_base64(screenshot_path: Image) -> Optional[str]:
+    """Convert screenshot (path or BGR array) to base64 PNG for web display"""
     try:
         import base64
         
-        with open(screenshot_path, 'rb') as f:
-            image_data = f.read()
-            b64_data = base64.b64encode(image_data).decode('utf-8')
-            return f"data:image/png;base64,{b64_data}"
+        if isinstance(screenshot_path, np.ndarray):
+            ok, encoded = cv2.imencode('.png', screenshot_path)
+            if not ok:
+                return None
+            image_data = encoded.tobytes()
+        else:
+            with open(screenshot_path, 'rb') as f:
+                image_data = f.read()
+        
+        b64_data = base64.b64encode(image_data).decode('utf-8')
+        return f"data:image/png;base64,{b64_data}"
     except Exception as e:
         print(f"Error converting screenshot to base64: {e}")
         return None
 
 
+def wait_for_screen(device_address: str, template_names: Union[str, List[str]], timeout: float = 10.0,
+                    threshold: float = None, poll_interval: float = WAIT_POLL_INTERVAL) -> Dict:
+    """
+    Wait until one of the given screens is displayed
+    
+    Captures frames back to back (or takes each new frame of the device's
+    screen stream, if running) and returns as soon as a target template is
+    detected. Frames that look the same as the previous one (see frame_hash)
+    are not matched again, so waiting on a static screen costs one capture
+    per poll rather than a full detection. A detection that failed is not
+    reused, so one error doesn't last until the timeout.
+    
+    Args:
+        device_address: ADB device address
+        template_names: Template name(s) to wait for (case-insensitive)
+        timeout: Seconds to wait before giving up
+        threshold: Optional custom confidence threshold (overrides template defaults)
+        poll_interval: Minimum seconds between captures
+    
+    Returns:
+        Dict with 'success', 'screen' (target found, or last screen seen on
+        timeout), 'detection', 'elapsed' and frame counts
+    """
+    if isinstance(template_names, str):
+        template_names = [template_names]
+    targets = {name.lower() for name in template_names}
+    
+    started = time.monotonic()
+    deadline = started + timeout
+    detection = None
+    last_hash = None
+    frames = 0
+    frames_matched = 0
+    
+    stream_frame = 0
+    
+    while True:
+        frame_started = time.monotonic()
+        stream = screen_stream.get_stream(device_address)
+        if stream:
+            # The encoder only emits frames when the screen changes, so block until it does
+            latest = stream.wait_for_frame(stream_frame, timeout=max(0.0, min(1.0, deadline - frame_started)))
+            screenshot = latest[1] if latest else None
+            if latest:
+                stream_frame = latest[0]
+        else:
+            screenshot = capture_screenshot_array(device_address)
+        
+        if screenshot is not None:
+            frames += 1
+            current_hash = frame_hash(screenshot)
+            
+            # Only run the matcher when the screen has changed (or it failed last time)
+            if (last_hash is None or detection is None or not detection.get('success')
+                    or bin(current_hash ^ last_hash).count('1') > FRAME_HASH_MAX_DISTANCE):
+                detection = detect_current_screen(screenshot, threshold=threshold, device_address=device_address)
+                last_hash = current_hash
+                frames_matched += 1
+            
+            screen = detection.get('screen') if detection else None
+            if screen and screen.lower() in targets:
+                return {
+                    'success': True,
+                    'screen': screen,
+                    'detection': detection,
+                    'elapsed': round(time.monotonic() - started, 3),
+                    'frames': frames,
+                    'frames_matched': frames_matched
+                }
+        
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if not stream:
+            time.sleep(max(0.0, min(poll_interval - (now - frame_started), deadline - now)))
+    
+    return {
+        'success': False,
+        'error': f"Timed out after {timeout}s waiting for {', '.join(template_names)}",
+        'reason': 'timeout',
+        'screen': detection.get('screen') if detection else None,
+        'detection': detection,
+        'elapsed': round(time.monotonic() - started, 3),
+        'frames': frames,
+        'frames_matched': frames_matched
+    }
+
+
 if __name__ == "__main__":
     # Test the module
     print("Testing screen detector...")
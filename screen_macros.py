@@ -10,14 +10,39 @@ import json
 import sqlite3
 from typing import List, Dict, Optional
 from pathlib import Path
+from xml.etree import ElementTree
+
+import adb_shell
+import screen_detector
 
 # Database path
 DB_PATH = "data/screen_control.db"
 
+# Text input modes, fastest first; per_char is for devices that drop keystrokes
+TEXT_INPUT_MODES = ('batch', 'chunked', 'per_char')
+TEXT_CHUNK_SIZE = 4
+# Seconds to confirm the expected screen is still up before retrying text input
+TEXT_VERIFY_TIMEOUT = 2
+# Seconds allowed for the UI dump that checks what reached the focused field
+UI_DUMP_TIMEOUT = 10
+# Where the UI dump is written on the device (uiautomator's own default)
+UI_DUMP_PATH = "/sdcard/window_dump.xml"
+
+DEFAULT_DEVICE_SETTINGS = {
+    'match_threshold': 0.7,
+    'keystroke_delay_ms': 150,
+    'post_login_wait_seconds': 4,
+    'text_input_mode': 'batch'
+}
+
 
 def execute_adb_command(device_address: str, command: List[str]) -> bool:
-    """Execute an ADB command on a device"""
+    """Execute an ADB command on a device (shell commands use the persistent session)"""
     try:
+        if len(command) > 1 and command[0] == 'shell':
+            result = adb_shell.run_shell(device_address, command[1:], timeout=30, text=False)
+            return result.returncode == 0
+        
         full_command = ['adb', '-s', device_address] + command
         result = subprocess.run(
             full_command,
@@ -43,78 +68,197 @@ def execute_swipe(device_address: str, x1: int, y1: int, x2: int, y2: int, durat
     )
 
 
-def execute_text(device_address: str, text: str, delay_ms: int = 150) -> bool:
+def escape_input_text(text: str) -> str:
+    """
+    Quote text for `input text` in the device shell
+    
+    Spaces become %s (input text's own escape) and the rest is single-quoted,
+    so shell metacharacters in passwords are typed literally. input text has
+    no escape for a literal "%s", so build_text_command types text containing
+    % one character at a time.
+    """
+    return "'" + text.replace(' ', '%s').replace("'", "'\\''") + "'"
+
+
+def build_text_command(text: str, mode: str = 'batch', delay_ms: int = 150) -> str:
     """
-    Execute text input character-by-character with delays
+    Build one shell command line that types text
+    
+    Args:
+        text: Text to input
+        mode: 'batch' (whole string at once), 'chunked' (TEXT_CHUNK_SIZE
+            characters at a time) or 'per_char' (one character at a time)
+        delay_ms: Pause between chunks/characters, run with `sleep` on the device
+    
+    Returns:
+        Command line for adb shell
+    """
+    if mode == 'per_char':
+        size = 1
+    elif mode == 'chunked':
+        size = TEXT_CHUNK_SIZE
+    else:
+        size = len(text) or 1
+    
+    chunks = []
+    for i in range(0, len(text), size):
+        chunk = text[i:i + size]
+        if '%' in chunk:
+            # input text reads "%s" as a space; a lone % or s is typed as is
+            chunks.extend(chunk)
+        else:
+            chunks.append(chunk)
+    
+    pause = f" && sleep {delay_ms / 1000.0:g} && " if delay_ms > 0 else " && "
+    return pause.join(f"input text {escape_input_text(chunk)}" for chunk in chunks)
+
+
+def execute_text(device_address: str, text: str, delay_ms: int = 150, mode: str = 'batch') -> bool:
+    """
+    Execute text input with a single shell command
+    
+    Delays between characters (per_char/chunked modes) run on the device, so
+    the whole text is one round trip through the shell session however it is
+    split up.
     
     Args:
         device_address: ADB device address
         text: Text to input
-        delay_ms: Delay between characters in milliseconds (default: 150ms)
+        delay_ms: Delay between characters/chunks in milliseconds (default: 150ms)
+        mode: Text input mode (see build_text_command)
     
     Returns:
         True if successful, False otherwise
     """
+    if not text:
+        return True
+    
     try:
-        # Type each character individually with delay
-        for char in text:
-            # Handle special characters
-            if char == ' ':
-                escaped_char = '%s'
-            elif char == '&':
-                escaped_char = '\\&'
-            elif char == '"':
-                escaped_char = '\\"'
-            elif char == "'":
-                escaped_char = "\\'"
-            elif char == '`':
-                escaped_char = '\\`'
-            elif char == '$':
-                escaped_char = '\\$'
-            elif char == '(':
-                escaped_char = '\\('
-            elif char == ')':
-                escaped_char = '\\)'
-            else:
-                escaped_char = char
-            
-            # Send character
-            success = execute_adb_command(device_address, ['shell', 'input', 'text', escaped_char])
-            
-            if not success:
-                print(f"Failed to input character: {char}")
-                return False
-            
-            # Delay between characters
-            if delay_ms > 0:
-                time.sleep(delay_ms / 1000.0)
+        command = build_text_command(text, mode, delay_ms)
+        timeout = 30 + len(text) * delay_ms / 1000.0
+        result = adb_shell.run_shell(device_address, [command], timeout=timeout, text=False)
         
+        if result.returncode != 0:
+            print(f"Failed to input text ({mode}): exit code {result.returncode}")
+            return False
         return True
     except Exception as e:
         print(f"Error executing text input: {e}")
         return False
 
 
-def execute_text_with_retry(device_address: str, text: str, delay_ms: int = 150, max_retries: int = 2) -> bool:
+def clear_text(device_address: str, count: int) -> bool:
+    """Delete up to count characters from the end of the focused field (MOVE_END, then DEL)"""
+    return execute_adb_command(
+        device_address,
+        ['shell', 'input', 'keyevent', '123'] + ['67'] * count
+    )
+
+
+def read_focused_field(device_address: str) -> Optional[Dict]:
+    """
+    Read the focused input field from a UI hierarchy dump
+    
+    The dump is written to UI_DUMP_PATH and read back with cat, since
+    dumping to /dev/tty prints nothing on a shell without a terminal.
+    
+    Returns:
+        Dict with 'text' and 'password', or None if the dump failed or no
+        field has focus
+    """
+    try:
+        result = adb_shell.run_shell(
+            device_address,
+            [f"uiautomator dump {UI_DUMP_PATH} >/dev/null && cat {UI_DUMP_PATH}"],
+            timeout=UI_DUMP_TIMEOUT
+        )
+        if result.returncode != 0:
+            return None
+        start = result.stdout.find('<?xml')
+        end = result.stdout.find('</hierarchy>')
+        if start < 0 or end < 0:
+            return None
+        root = ElementTree.fromstring(result.stdout[start:end + len('</hierarchy>')])
+    except Exception as e:
+        print(f"Could not read UI hierarchy: {e}")
+        return None
+    
+    for node in root.iter('node'):
+        if node.get('focused') == 'true':
+            return {'text': node.get('text', ''), 'password': node.get('password') == 'true'}
+    return None
+
+
+def verify_text_entry(field: Optional[Dict], text: str) -> Optional[bool]:
+    """
+    Check that the focused field holds exactly the typed text
+    
+    Password fields are dumped masked (one character per typed character),
+    so only their length is compared.
+    
+    Returns:
+        True/False, or None if it cannot be told (no field read, or a
+        password field the dump leaves empty)
+    """
+    if field is None:
+        return None
+    if field['password']:
+        return len(field['text']) == len(text) if field['text'] else None
+    return field['text'] == text
+
+
+def execute_text_with_retry(device_address: str, text: str, delay_ms: int = 150, max_retries: int = 2,
+                            mode: str = 'batch', screen: Optional[str] = None, verify: bool = False) -> bool:
     """
     Execute text input with retry logic
     
+    `input text` exits 0 even when keystrokes are dropped, so with verify the
+    focused field is read back (read_focused_field) after typing and the
+    attempt only succeeds if it holds the text. A field that can't be read
+    (or a password field dumped empty) counts as a failed attempt too. The
+    dump takes a second or more, so verify is off by default (execute_action
+    turns it on for devices not in batch mode).
+    
+    A failed attempt may have typed part of the text, so the field is cleared
+    before retrying. If screen is given, a retry only happens while that
+    screen is still detected; if the app has moved on, retyping would land in
+    the wrong place.
+    
     Args:
         device_address: ADB device address
         text: Text to input
         delay_ms: Delay between characters in milliseconds
         max_retries: Maximum number of retry attempts
+        mode: Text input mode (see build_text_command)
+        screen: Template name the text is being typed into (e.g. "login")
+        verify: Read the field back after typing (see above)
     
     Returns:
         True if successful, False otherwise
     """
     for attempt in range(max_retries + 1):
-        if execute_text(device_address, text, delay_ms):
-            return True
+        field = None
+        if execute_text(device_address, text, delay_ms, mode):
+            if not verify:
+                return True
+            field = read_focused_field(device_address)
+            verified = verify_text_entry(field, text)
+            if verified:
+                return True
+            if verified is None:
+                print("Text input unverified: could not read the focused field")
+            else:
+                print(f"Text input incomplete: field has {len(field['text'])} of {len(text)} characters")
         
         if attempt < max_retries:
-            print(f"Text input failed, retrying ({attempt + 1}/{max_retries})...")
-            time.sleep(0.5)
+            if screen:
+                check = screen_detector.wait_for_screen(device_address, screen, timeout=TEXT_VERIFY_TIMEOUT)
+                if not check['success']:
+                    print(f"Text input failed and {screen} screen is gone (now: {check['screen']}), not retrying")
+                    return False
+            
+            print(f"Text input failed, clearing field and retrying ({attempt + 1}/{max_retries})...")
+            clear_text(device_address, max(len(text), len(field['text']) if field else 0))
     
     print(f"Text input failed after {max_retries + 1} attempts")
     return False
@@ -151,6 +295,14 @@ def execute_wait(seconds: float) -> bool:
         return False
 
 
+def execute_wait_for_screen(device_address: str, screens: List[str], timeout: float = 10.0) -> bool:
+    """Wait until one of the given screens is detected (see screen_detector.wait_for_screen)"""
+    result = screen_detector.wait_for_screen(device_address, screens, timeout)
+    if not result['success']:
+        print(f"{result['error']} (last screen: {result['screen']})")
+    return result['success']
+
+
 def get_device_settings(device_address: str) -> Dict:
     """
     Get device settings from database
@@ -166,8 +318,9 @@ def get_device_settings(device_address: str) -> Dict:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
+        # SELECT * so databases without the newer columns still load
         cursor.execute("""
-            SELECT match_threshold, keystroke_delay_ms, post_login_wait_seconds
+            SELECT *
             FROM device_settings
             WHERE device_address = ?
         """, (device_address,))
@@ -175,27 +328,18 @@ def get_device_settings(device_address: str) -> Dict:
         row = cursor.fetchone()
         conn.close()
         
+        settings = dict(DEFAULT_DEVICE_SETTINGS)
         if row:
-            return {
-                'match_threshold': row['match_threshold'],
-                'keystroke_delay_ms': row['keystroke_delay_ms'],
-                'post_login_wait_seconds': row['post_login_wait_seconds']
-            }
-        else:
-            # Return defaults
-            return {
-                'match_threshold': 0.7,
-                'keystroke_delay_ms': 150,
-                'post_login_wait_seconds': 4
-            }
+            for key in settings:
+                if key in row.keys() and row[key] is not None:
+                    settings[key] = row[key]
+        if settings['text_input_mode'] not in TEXT_INPUT_MODES:
+            settings['text_input_mode'] = DEFAULT_DEVICE_SETTINGS['text_input_mode']
+        return settings
     except Exception as e:
         print(f"Error getting device settings: {e}")
         # Return defaults on error
-        return {
-            'match_threshold': 0.7,
-            'keystroke_delay_ms': 150,
-            'post_login_wait_seconds': 4
-        }
+        return dict(DEFAULT_DEVICE_SETTINGS)
 
 
 def execute_action(device_address: str, action: Dict, device_settings: Dict = None) -> bool:
@@ -229,14 +373,19 @@ def execute_action(device_address: str, action: Dict, device_settings: Dict = No
         )
     
     elif action_type == 'text':
-        # Use device-specific keystroke delay
+        # Use device-specific keystroke delay and input mode
         delay_ms = action.get('delay_ms', device_settings['keystroke_delay_ms'])
+        mode = action.get('mode', device_settings['text_input_mode'])
         use_retry = action.get('retry', True)
         
         if use_retry:
-            return execute_text_with_retry(device_address, action['value'], delay_ms)
+            # Devices set to chunked/per_char drop keystrokes, so check what arrived
+            return execute_text_with_retry(
+                device_address, action['value'], delay_ms, mode=mode, screen=action.get('screen'),
+                verify=action.get('verify', mode != 'batch')
+            )
         else:
-            return execute_text(device_address, action['value'], delay_ms)
+            return execute_text(device_address, action['value'], delay_ms, mode)
     
     elif action_type == 'keyevent':
         return execute_keyevent(device_address, action['code'])
@@ -254,6 +403,11 @@ def execute_action(device_address: str, action: Dict, device_settings: Dict = No
     elif action_type == 'wait':
         return execute_wait(action['seconds'])
     
+    elif action_type == 'wait_for_screen':
+        # Default timeout is the device's post-login wait, the worst case it replaces
+        timeout = action.get('timeout', device_settings['post_login_wait_seconds'])
+        return execute_wait_for_screen(device_address, action['screens'], timeout)
+    
     else:
         print(f"Unknown action type: {action_type}")
         return False
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Screen Stream - Continuous screen capture via screenrecord
+Runs `screenrecord --output-format=h264 -` over exec-out per device (through
+the adb server socket, or an `adb` process if that fails) and decodes it with
+OpenCV in a background thread, so the latest frame is always in memory
+instead of paying a full screencap per frame.
+
+Run `python3 screen_stream.py [recording.h264]` to play a recorded stream
+(e.g. from `adb exec-out screenrecord --output-format=h264 - > recording.h264`)
+through the same decoder as a device stand-in; without an argument it plays
+test_fixtures/screenrecord.h264.
+"""
+
+import atexit
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import adb_client
+
+STREAM_BIT_RATE = 4000000  # bits/s passed to screenrecord
+STREAM_RESTART_DELAY = 2  # Seconds before restarting a stream that ended
+STREAM_READ_CHUNK = 64 * 1024
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_QUALITY = 70
+MJPEG_KEEPALIVE = 5  # Seconds between repeats of an unchanged frame
+
+# Recorded stream played by self_test (see test_fixtures/make_screenrecord_fixture.py)
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures", "screenrecord.h264")
+
+# address -> ScreenStream
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+class ScreenStream:
+    """Decode one device's screenrecord output in the background
+    
+    screenrecord stops after its 3 minute time limit (or when the device
+    drops), so the stream restarts itself until stop() is called. The encoder
+    only emits frames when the screen changes, so the latest frame stays
+    current however old it is while screenrecord runs; when a run ends the
+    frame is dropped until the next run decodes one, so callers fall back to
+    screencap rather than see a stale screen. The H.264 data is fed to OpenCV's FFmpeg
+    backend through a FIFO, since VideoCapture cannot read from a pipe object.
+    
+    viewers counts the MJPEG responses reading the stream; unless pinned
+    (started through the API), the stream stops when the last one closes.
+    """
+    
+    def __init__(self, device_address: str, source: Optional[str] = None,
+                 bit_rate: int = STREAM_BIT_RATE, size: Optional[str] = None):
+        """
+        Args:
+            device_address: ADB device address
+            source: Recorded H.264 file to play instead of the device (played once)
+            bit_rate: screenrecord --bit-rate
+            size: screenrecord --size (e.g. "720x1520"), default device resolution
+        """
+        self.device_address = device_address
+        self.source = source
+        self.bit_rate = bit_rate
+        self.size = size
+        self.frame_count = 0
+        self.started_at = None
+        self.last_error = None
+        self.viewers = 0
+        self.pinned = False
+        self._frame = None
+        self._frame_time = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._process = None
+        self._conn = None
+        self._thread = None
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"screen-stream-{self.device_address}",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._end_recording()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        with self._cond:
+            self._cond.notify_all()
+    
+    def latest_frame(self) -> Optional[Tuple[int, np.ndarray, float]]:
+        """
+        Get the most recent decoded frame
+        
+        Returns:
+            Tuple of (frame number, BGR array, time.time() it was decoded), or
+            None before the first frame
+        """
+        with self._cond:
+            if self._frame is None:
+                return None
+            return self.frame_count, self._frame, self._frame_time
+    
+    def wait_for_frame(self, after: int = 0, timeout: float = 5) -> Optional[Tuple[int, np.ndarray, float]]:
+        """
+        Wait for a frame newer than frame number `after`
+        
+        Returns:
+            Same as latest_frame, or None on timeout or when the stream stops
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.frame_count <= after or self._frame is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set() or not self.running:
+                    return None
+                self._cond.wait(remaining)
+            return self.frame_count, self._frame, self._frame_time
+    
+    def _command(self) -> str:
+        command = f"screenrecord --output-format=h264 --bit-rate {int(self.bit_rate)}"
+        if self.size:
+            command += f" --size {self.size}"
+        return command + " -"
+    
+    def _open_recording(self):
+        """Start screenrecord on the device and return a file to read its output from"""
+        try:
+            self._conn = adb_client.client.exec_out_stream(self.device_address, self._command())
+            return self._conn.sock.makefile('rb')
+        except (OSError, adb_client.AdbError):
+            self._conn = None
+        
+        self._process = subprocess.Popen(
+            ['adb', '-s', self.device_address, 'exec-out'] + self._command().split(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        return self._process.stdout
+    
+    def _end_recording(self):
+        """Stop the running screenrecord, waking the pump if it is blocked reading"""
+        conn = self._conn
+        if conn:
+            conn.close()
+        process = self._process
+        if process and process.poll() is None:
+            process.kill()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._decode_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️  Screen stream for {self.device_address} failed: {e}")
+            
+            # Nothing is on screen record until the next run decodes a frame
+            with self._cond:
+                self._frame = None
+                self._frame_time = None
+                self._cond.notify_all()
+            
+            # A recording is played once; a device stream restarts after screenrecord's time limit
+            if self.source or self._stop.wait(STREAM_RESTART_DELAY):
+                break
+    
+    def _decode_once(self):
+        """Run one screenrecord (or play the source file) through the decoder until it ends"""
+        if self.source:
+            stream = open(self.source, 'rb')
+        else:
+            stream = self._open_recording()
+        
+        temp_dir = tempfile.mkdtemp(prefix="screen-stream-")
+        fifo_path = os.path.join(temp_dir, "stream.h264")
+        os.mkfifo(fifo_path)
+        
+        pump = threading.Thread(target=self._pump, args=(stream, fifo_path), daemon=True)
+        pump.start()
+        
+        capture = None
+        try:
+            capture = cv2.VideoCapture(fifo_path, cv2.CAP_FFMPEG)
+            while not self._stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                with self._cond:
+                    self._frame = frame
+                    self._frame_time = time.time()
+                    self.frame_count += 1
+                    self._cond.notify_all()
+        finally:
+            if capture is not None:
+                capture.release()
+            self._end_recording()
+            # Unblock the pump if the decoder never opened the FIFO
+            try:
+                fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+                os.close(fd)
+            except OSError:
+                pass
+            pump.join(5)
+            stream.close()
+            self._conn = None
+            if self._process:
+                self._process.wait()
+                self._process = None
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    def _pump(self, stream, fifo_path):
+        """Copy the H.264 stream into the FIFO the decoder reads"""
+        try:
+            with open(fifo_path, 'wb') as fifo:
+                while not self._stop.is_set():
+                    chunk = stream.read1(STREAM_READ_CHUNK) if hasattr(stream, 'read1') else stream.read(STREAM_READ_CHUNK)
+                    if not chunk:
+                        break
+                    fifo.write(chunk)
+        except (BrokenPipeError, OSError, ValueError):
+            # Decoder closed the FIFO or the stream was closed under us
+            pass
+    
+    def status(self) -> Dict:
+        """Stream state for the API"""
+        latest = self.latest_frame()
+        return {
+            'device_address': self.device_address,
+            'running': self.running,
+            'frame_count': self.frame_count,
+            'started_at': _isoformat(self.started_at),
+            'last_frame_at': _isoformat(latest[2]) if latest else None,
+            'resolution': [int(latest[1].shape[1]), int(latest[1].shape[0])] if latest else None,
+            'last_error': self.last_error
+        }
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def start_stream(device_address: str, pinned: bool = False, **kwargs) -> ScreenStream:
+    """
+    Start (or return the running) stream for a device
+    
+    Args:
+        device_address: ADB device address
+        pinned: Keep the stream running without viewers until stop_stream;
+            otherwise it stops when its last MJPEG viewer disconnects
+        **kwargs: Passed to ScreenStream for a new stream
+    """
+    with _streams_lock:
+        stream = _streams.get(device_address)
+        if stream is None or not stream.running:
+            stream = ScreenStream(device_address, **kwargs)
+            _streams[device_address] = stream
+            stream.start()
+        stream.pinned = stream.pinned or pinned
+        return stream
+
+
+def get_stream(device_address: str) -> Optional[ScreenStream]:
+    """Get the device's stream if it is running"""
+    with _streams_lock:
+        stream = _streams.get(device_address)
+    return stream if stream and stream.running else None
+
+
+def get_latest_frame(device_address: str) -> Optional[np.ndarray]:
+    """Latest frame of a running stream, or None (caller should use screencap)"""
+    stream = get_stream(device_address)
+    if not stream:
+        return None
+    latest = stream.latest_frame()
+    return latest[1] if latest else None
+
+
+def stop_stream(device_address: str) -> bool:
+    """Stop a device's stream; returns False if there was none"""
+    with _streams_lock:
+        stream = _streams.pop(device_address, None)
+    if not stream:
+        return False
+    stream.stop()
+    return True
+
+
+def stop_all_streams():
+    with _streams_lock:
+        streams = list(_streams.values())
+        _streams.clear()
+    for stream in streams:
+        stream.stop()
+
+
+def mjpeg_frames(stream: ScreenStream, quality: int = MJPEG_QUALITY):
+    """
+    Yield multipart/x-mixed-replace parts for each new frame of a stream
+    
+    The last frame is re-sent every MJPEG_KEEPALIVE seconds while the screen
+    is static, so clients and proxies keep the connection open. The generator
+    counts as one of the stream's viewers until it is closed (Flask closes it
+    when the client disconnects).
+    """
+    with _streams_lock:
+        stream.viewers += 1
+    try:
+        last = 0
+        while True:
+            latest = stream.wait_for_frame(last, timeout=MJPEG_KEEPALIVE)
+            if latest is None:
+                if not stream.running:
+                    return
+                latest = stream.latest_frame()
+                if latest is None:
+                    continue
+            
+            last = latest[0]
+            ok, jpeg = cv2.imencode('.jpg', latest[1], [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                continue
+            data = jpeg.tobytes()
+            yield (
+                b"--" + MJPEG_BOUNDARY.encode() + b"\r\n"
+                b"Content-Type: image/jpeg\r\n"
+                b"Content-Length: " + str(len(data)).encode() + b"\r\n\r\n" + data + b"\r\n"
+            )
+    finally:
+        _release_viewer(stream)
+
+
+def _release_viewer(stream: ScreenStream):
+    """Drop one viewer; stop the stream when it was the last one, unless pinned"""
+    with _streams_lock:
+        stream.viewers -= 1
+        idle = stream.viewers == 0 and not stream.pinned
+        if idle and _streams.get(stream.device_address) is stream:
+            del _streams[stream.device_address]
+    if idle:
+        stream.stop()
+
+
+# Decoder threads must not be inside FFmpeg when the interpreter tears down
+atexit.register(stop_all_streams)
+
+
+def self_test(recording: str = FIXTURE_PATH) -> bool:
+    """Play an H.264 recording through ScreenStream and check frames are decoded"""
+    print(f"Playing {recording} as device stand-in...")
+    stream = ScreenStream("stand-in", source=recording)
+    stream.start()
+    
+    first = stream.wait_for_frame(0, timeout=10)
+    stream._thread.join(30)
+    print(f"   First frame: {'yes' if first else 'no'}, frames decoded: {stream.frame_count}, "
+          f"resolution: {[first[1].shape[1], first[1].shape[0]] if first else None}")
+    
+    passed = first is not None and stream.frame_count > 0
+    print("✅ Screen stream self-test passed" if passed else "❌ Screen stream self-test failed")
+    return passed
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if self_test(*sys.argv[1:2]) else 1)
@@ -0,0 +1 @@
+"""Paperwork generators, importable by the server and runnable as scripts"""
@@ -4,6 +4,10 @@ N8N Loadsheet Generator
 
 This script generates loadsheets from JSON data passed via command line argument.
 Usage: python3 loadsheet.py '{json_data}'
+       python3 loadsheet.py - < data.json   (large payloads, avoids argv limits)
+
+The server imports generate_loadsheet() directly (see paperwork_engine.py);
+the command line is a thin wrapper around it.
 
 Output: /paperwork/[sunday_date]/[loadnumber]_[collection_name].xlsx and .pdf
 """
@@ -19,15 +23,22 @@ from openpyxl import load_workbook
 from openpyxl.drawing.image import Image as OpenpyxlImage
 
 # -------- Logging Setup --------
+# A named logger with its own file handler (not basicConfig on the root
+# logger), so importing this module into the server leaves its logging alone
 LOG_FILE = "logs/n8n_loadsheet.log"
-os.makedirs("logs", exist_ok=True)
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-logger = logging.getLogger()
-logger.addHandler(logging.StreamHandler())
+logger = logging.getLogger("loadsheet")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    os.makedirs("logs", exist_ok=True)
+    _file_handler = logging.FileHandler(LOG_FILE)
+    _file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    logger.addHandler(_file_handler)
+    logger.propagate = False
+
+# -------- Paths --------
+PAPERWORK_ROOT = "/app/paperwork"
+TEMPLATE_PATH = "/app/templates/loadsheet.xlsx"
+SIGNATURE_ROOT = "/app/signature"
 
 # -------- Date Helpers --------
 def get_week_end_from_date(load_date: date) -> date:
@@ -192,12 +203,20 @@ def generate_load_summary(cars: list) -> str:
     summary += f", {with_spare} CARS HAVE SPARE KEYS"
     return summary
 
-def add_signature(sig_folder, cell, sheet, custom_sig_path=None):
-    """Add a signature image to the given Excel sheet cell"""
+def add_signature(sig_folder, cell, sheet, custom_sig_path=None, templates=None):
+    """Add a signature image to the given Excel sheet cell
+    
+    templates is an optional cache (paperwork_engine.TemplateCache) that keeps
+    folder listings and image data in memory between documents.
+    """
     sig_path = None
     
     if custom_sig_path and os.path.exists(custom_sig_path):
         sig_path = custom_sig_path
+    elif templates is not None:
+        sig_files = templates.signature_files(sig_folder)
+        if sig_files:
+            sig_path = random.choice(sig_files)
     elif os.path.isdir(sig_folder):
         sig_files = [f for f in os.listdir(sig_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
         if sig_files:
@@ -205,7 +224,7 @@ def add_signature(sig_folder, cell, sheet, custom_sig_path=None):
     
     if sig_path:
         logger.info(f"Adding signature from {sig_path} to {cell}")
-        img = OpenpyxlImage(sig_path)
+        img = templates.image(sig_path) if templates is not None else OpenpyxlImage(sig_path)
         
         # Apply default scaling
         img.width = int(img.width * 1.0)
@@ -218,9 +237,12 @@ def add_signature(sig_folder, cell, sheet, custom_sig_path=None):
         logger.warning(f"No signature files found in {sig_folder}")
 
 # -------- Main Generation Function --------
-def generate_loadsheet(json_data, signature_path=None) -> tuple:
+def generate_loadsheet(json_data, signature_path=None, templates=None, converter=None) -> tuple:
     """
     Generate loadsheet from JSON data
+    templates: optional template cache; without it the workbook and
+    signatures are read from disk for this document
+    converter: optional callable(excel_path, output_folder) -> pdf_path or None
     Returns: (excel_path, pdf_path) or (None, None) if failed
     """
     logger.info("Starting loadsheet generation from JSON data")
@@ -238,7 +260,7 @@ def generate_loadsheet(json_data, signature_path=None) -> tuple:
     # Determine output folder based on week ending date (Sunday)
     week_end_date = get_week_end_from_date(load_info["load_date"])
     folder_date = format_folder_date(week_end_date)
-    output_folder = os.path.join("/app/paperwork", folder_date)
+    output_folder = os.path.join(PAPERWORK_ROOT, folder_date)
     os.makedirs(output_folder, exist_ok=True)
     
     # Create filename: loadnumber_collection.xlsx
@@ -247,9 +269,9 @@ def generate_loadsheet(json_data, signature_path=None) -> tuple:
     pdf_output_path = os.path.join(output_folder, f"{filename}.pdf")
     
     # Load template
-    template_path = "/app/templates/loadsheet.xlsx"
+    template_path = TEMPLATE_PATH
     try:
-        wb = load_workbook(template_path)
+        wb = templates.load_workbook(template_path) if templates is not None else load_workbook(template_path)
         logger.info(f"Loaded template from {template_path}")
     except Exception as e:
         logger.error(f"Error loading template: {e}")
@@ -298,10 +320,10 @@ def generate_loadsheet(json_data, signature_path=None) -> tuple:
     # Add signatures
     try:
         # Collection signature (sig1)
-        add_signature("/app/signature/sig1", "C42", ws, signature_path)
+        add_signature(os.path.join(SIGNATURE_ROOT, "sig1"), "C42", ws, signature_path, templates)
         
         # Delivery signature (sig2)
-        add_signature("/app/signature/sig2", "H42", ws, signature_path)
+        add_signature(os.path.join(SIGNATURE_ROOT, "sig2"), "H42", ws, signature_path, templates)
     except Exception as e:
         logger.error(f"Error adding signatures: {e}")
     
@@ -313,32 +335,41 @@ def generate_loadsheet(json_data, signature_path=None) -> tuple:
         logger.error(f"Error saving Excel file: {e}")
         return None, None
     
-    # Convert to PDF using LibreOffice
-    try:
-        logger.info("Converting Excel to PDF using LibreOffice...")
-        
-        # Run LibreOffice headless conversion
-        conversion_result = subprocess.run(
-            [
-                "libreoffice",
-                "--headless",
-                "--convert-to", "pdf",
-                "--outdir", output_folder,
-                excel_output_path
-            ],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if conversion_result.returncode == 0 and os.path.exists(pdf_output_path):
+    # Convert to PDF: through the caller's converter (the server's long-lived
+    # LibreOffice) if given, otherwise with a one-shot LibreOffice
+    if converter is not None:
+        logger.info("Converting Excel to PDF...")
+        pdf_output_path = converter(excel_output_path, output_folder)
+        if pdf_output_path:
             logger.info(f"PDF generated: {pdf_output_path}")
         else:
-            logger.warning(f"PDF conversion failed: {conversion_result.stderr}")
+            logger.warning("PDF conversion failed")
+    else:
+        try:
+            logger.info("Converting Excel to PDF using LibreOffice...")
+            
+            # Run LibreOffice headless conversion
+            conversion_result = subprocess.run(
+                [
+                    "libreoffice",
+                    "--headless",
+                    "--convert-to", "pdf",
+                    "--outdir", output_folder,
+                    excel_output_path
+                ],
+                capture_output=True,
+                text=True,
+                timeout=60
+            )
+            
+            if conversion_result.returncode == 0 and os.path.exists(pdf_output_path):
+                logger.info(f"PDF generated: {pdf_output_path}")
+            else:
+                logger.warning(f"PDF conversion failed: {conversion_result.stderr}")
+                pdf_output_path = None
+        except Exception as e:
+            logger.error(f"Error converting to PDF: {e}")
             pdf_output_path = None
-    except Exception as e:
-        logger.error(f"Error converting to PDF: {e}")
-        pdf_output_path = None
     
     # Return both Excel and PDF paths
     logger.info("Loadsheet generated successfully")
@@ -346,6 +377,8 @@ def generate_loadsheet(json_data, signature_path=None) -> tuple:
 
 def main():
     """Main function to handle command line execution"""
+    logger.addHandler(logging.StreamHandler())
+    
     if len(sys.argv) < 2:
         logger.error("Usage: python3 loadsheet.py '{json_data}'")
         print(json.dumps({"error": "No JSON data provided", "success": False}))
@@ -354,7 +387,7 @@ def main():
     try:
         # Parse JSON argument
         json_arg = sys.argv[1]
-        json_data = json.loads(json_arg)
+        json_data = json.load(sys.stdin) if json_arg == "-" else json.loads(json_arg)
         
         # Optional signature path
         signature_path = sys.argv[2] if len(sys.argv) > 2 else None
@@ -4,6 +4,10 @@ N8N Timesheet Generator
 
 This script generates timesheets from JSON data passed via command line argument.
 Usage: python3 timesheet.py '{json_data}'
+       python3 timesheet.py - < data.json   (large payloads, avoids argv limits)
+
+The server imports generate_timesheet() directly (see paperwork_engine.py);
+the command line is a thin wrapper around it.
 
 Output: /paperwork/[sunday_date]/timesheet_[week_ending].xlsx and .pdf
 """
@@ -17,15 +21,21 @@ from datetime import datetime, timedelta, date
 from openpyxl import load_workbook
 
 # -------- Logging Setup --------
+# A named logger with its own file handler (not basicConfig on the root
+# logger), so importing this module into the server leaves its logging alone
 LOG_FILE = "logs/n8n_timesheet.log"
-os.makedirs("logs", exist_ok=True)
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-logger = logging.getLogger()
-logger.addHandler(logging.StreamHandler())
+logger = logging.getLogger("timesheet")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    os.makedirs("logs", exist_ok=True)
+    _file_handler = logging.FileHandler(LOG_FILE)
+    _file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    logger.addHandler(_file_handler)
+    logger.propagate = False
+
+# -------- Paths --------
+PAPERWORK_ROOT = "/app/paperwork"
+TEMPLATE_PATH = "/app/templates/timesheet.xlsx"
 
 # -------- Date Helpers --------
 def get_week_end_from_date(load_date: date) -> date:
@@ -131,7 +141,9 @@ def process_json_data(json_data):
                     "finish_time": time_entry.get("finsh_time", ""),  # Note: typo in original data
                     "total_hours": time_entry.get("total_hours", ""),
                     "driver": time_entry.get("driver", ""),
-                    "fleet_reg": time_entry.get("fleet_reg", "")
+                    "fleet_reg": time_entry.get("fleet_reg", ""),
+                    "start_mileage": time_entry.get("start_mileage", ""),
+                    "end_mileage": time_entry.get("end_mileage", "")
                 }
             except Exception as e:
                 logger.error(f"Error processing time entry: {e}")
@@ -152,9 +164,12 @@ def process_json_data(json_data):
         return None, None, None
 
 # -------- Main Generation Function --------
-def generate_timesheet(json_data) -> tuple:
+def generate_timesheet(json_data, templates=None, converter=None) -> tuple:
     """
     Generate timesheet from JSON data
+    templates: optional template cache (paperwork_engine.TemplateCache);
+    without it the workbook is read from disk for this document
+    converter: optional callable(excel_path, output_folder) -> pdf_path or None
     Returns: (excel_path, pdf_path) or (None, None) if failed
     """
     logger.info("Starting timesheet generation from JSON data")
@@ -173,7 +188,7 @@ def generate_timesheet(json_data) -> tuple:
     
     # Determine output folder based on week ending date (Sunday)
     folder_date = format_folder_date(week_end_date)
-    output_folder = os.path.join("/app/paperwork", folder_date)
+    output_folder = os.path.join(PAPERWORK_ROOT, folder_date)
     os.makedirs(output_folder, exist_ok=True)
 
     # Create filename: timesheet_weekending_D#.xlsx
@@ -182,9 +197,9 @@ def generate_timesheet(json_data) -> tuple:
     pdf_output_path = os.path.join(output_folder, f"{filename}.pdf")
 
     # Load template
-    template_path = "/app/templates/timesheet.xlsx"
+    template_path = TEMPLATE_PATH
     try:
-        wb = load_workbook(template_path)
+        wb = templates.load_workbook(template_path) if templates is not None else load_workbook(template_path)
         logger.info(f"Loaded template from {template_path}")
     except Exception as e:
         logger.error(f"Error loading template: {e}")
@@ -371,32 +386,41 @@ def generate_timesheet(json_data) -> tuple:
         logger.error(f"Error saving Excel file: {e}")
         return None, None
 
-    # Convert to PDF using LibreOffice
-    try:
-        logger.info("Converting Excel to PDF using LibreOffice...")
-        
-        # Run LibreOffice headless conversion
-        conversion_result = subprocess.run(
-            [
-                "libreoffice",
-                "--headless",
-                "--convert-to", "pdf",
-                "--outdir", output_folder,
-                excel_output_path
-            ],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if conversion_result.returncode == 0 and os.path.exists(pdf_output_path):
+    # Convert to PDF: through the caller's converter (the server's long-lived
+    # LibreOffice) if given, otherwise with a one-shot LibreOffice
+    if converter is not None:
+        logger.info("Converting Excel to PDF...")
+        pdf_output_path = converter(excel_output_path, output_folder)
+        if pdf_output_path:
             logger.info(f"PDF generated: {pdf_output_path}")
         else:
-            logger.warning(f"PDF conversion failed: {conversion_result.stderr}")
+            logger.warning("PDF conversion failed")
+    else:
+        try:
+            logger.info("Converting Excel to PDF using LibreOffice...")
+            
+            # Run LibreOffice headless conversion
+            conversion_result = subprocess.run(
+                [
+                    "libreoffice",
+                    "--headless",
+                    "--convert-to", "pdf",
+                    "--outdir", output_folder,
+                    excel_output_path
+                ],
+                capture_output=True,
+                text=True,
+                timeout=60
+            )
+            
+            if conversion_result.returncode == 0 and os.path.exists(pdf_output_path):
+                logger.info(f"PDF generated: {pdf_output_path}")
+            else:
+                logger.warning(f"PDF conversion failed: {conversion_result.stderr}")
+                pdf_output_path = None
+        except Exception as e:
+            logger.error(f"Error converting to PDF: {e}")
             pdf_output_path = None
-    except Exception as e:
-        logger.error(f"Error converting to PDF: {e}")
-        pdf_output_path = None
 
     # Return both Excel and PDF paths
     logger.info("Timesheet generated successfully")
@@ -404,6 +428,8 @@ def generate_timesheet(json_data) -> tuple:
 
 def main():
     """Main function to handle command line execution"""
+    logger.addHandler(logging.StreamHandler())
+
     if len(sys.argv) < 2:
         logger.error("Usage: python3 timesheet.py '{json_data}'")
         print(json.dumps({"error": "No JSON data provided", "success": False}))
@@ -412,7 +438,7 @@ def main():
     try:
         # Parse JSON argument
         json_arg = sys.argv[1]
-        json_data = json.loads(json_arg)
+        json_data = json.load(sys.stdin) if json_arg == "-" else json.loads(json_arg)
 
         # Generate timesheet
         excel_path, pdf_path = generate_timesheet(json_data)
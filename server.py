@@ -5,28 +5,34 @@ Flask-based web interface and REST API for managing ADB devices
 Port: 5020
 """
 
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request, send_file
 from flask_cors import CORS
 import sqlite3
-import subprocess
 import os
 import sys
 import time
 import threading
+import hashlib
 import logging
+import re
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
-from collections import defaultdict
+from datetime import datetime, timedelta
 from pathlib import Path
 
 # Import our ADB manager
-from adb_manager import ADBManager, DEVICES, APP_PACKAGE, DATA_FOLDER
+from adb_manager import ADBManager, DeviceMonitor, DEVICES, APP_PACKAGE, DATA_FOLDER, _compute_sha1
 
 # Import screen control modules
 import credentials_manager
 import screen_detector
 import screen_macros
 import vehicle_lookup
+import load_index
+import adb_shell
+import screen_stream
+import paperwork_engine
+import paperwork_catalogue
+import pdf_converter
 import init_screen_control_db
 
 # Flask app setup
@@ -42,11 +48,18 @@ LOG_BACKUP_COUNT = 5
 # Global manager instance
 adb_manager = ADBManager()
 
+# Keeps adb_manager device state current in the background (started in main)
+device_monitor = DeviceMonitor(adb_manager)
+
 # Auto-refresh settings
 auto_refresh_enabled = False
 auto_refresh_interval = 600  # 10 minutes in seconds
 auto_refresh_thread = None
 
+# Parsed sql.db snapshot (see get_load_snapshot)
+load_snapshot = None
+load_snapshot_lock = threading.Lock()
+
 # Setup logging
 os.makedirs("logs", exist_ok=True)
 
@@ -73,6 +86,13 @@ console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s
 console_handler.setFormatter(console_formatter)
 app.logger.addHandler(console_handler)
 
+# Modules that log through their own named logger
+for module_logger in (pdf_converter.logger,):
+    module_logger.addHandler(file_handler)
+    module_logger.addHandler(console_handler)
+    module_logger.setLevel(logging.INFO)
+    module_logger.propagate = False
+
 
 # ==================== Database Functions ====================
 
@@ -140,153 +160,446 @@ def extract_vehicle_data(conn):
         return []
 
 
+# ==================== Load Snapshot Cache ====================
+
+def get_load_snapshot():
+    """Get the parsed DWJJOB/DWVVEH rows for the current sql.db
+    
+    The rows are read from the derived load index (see load_index) once and kept
+    in memory until the database file is replaced (pull_sql_file / auto-refresh).
+    The file's mtime, size and inode are checked on every call; the SHA1 checksum
+    is only recomputed when those change, so re-pulling an identical database
+    keeps the existing snapshot and version.
+    
+    Callers must treat the returned rows as read-only and copy before modifying.
+    
+    Returns:
+        Dict with 'version', 'jobs', 'vehicles', 'modified_at' and 'overviews', or None if
+        the database does not exist
+    """
+    global load_snapshot
+    
+    db_path = get_db_path()
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return None
+    
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    with load_snapshot_lock:
+        if load_snapshot and load_snapshot['signature'] == signature:
+            return load_snapshot
+        
+        try:
+            index = load_index.ensure_index(db_path)
+        except Exception as e:
+            app.logger.error(f"Error building load index: {e}")
+            index = None
+        
+        checksum = index['checksum'] if index else _compute_sha1(db_path)
+        if load_snapshot and load_snapshot['version'] == checksum:
+            # File was replaced with identical content - keep parsed data
+            load_snapshot['signature'] = signature
+            return load_snapshot
+        
+        if index:
+            conn = sqlite3.connect(index['path'])
+            conn.row_factory = sqlite3.Row
+        else:
+            # Index could not be built - read the pulled database directly
+            conn = connect_database()
+        if not conn:
+            return None
+        
+        try:
+            jobs = extract_job_data(conn)
+            vehicles = extract_vehicle_data(conn)
+        finally:
+            conn.close()
+        
+        load_snapshot = {
+            'signature': signature,
+            'version': checksum,
+            'jobs': jobs,
+            'vehicles': vehicles,
+            'modified_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            'overviews': {}
+        }
+        app.logger.info(f"Loaded sql.db snapshot {checksum[:12]} ({len(jobs)} jobs, {len(vehicles)} vehicles)")
+        
+        return load_snapshot
+
+
+def connect_load_index():
+    """Connect to the derived load index for the current sql.db
+    
+    Builds the index first if sql.db has changed since it was last built.
+    
+    Returns:
+        sqlite3 connection with Row factory, or None if the database is missing
+        or the index could not be built
+    """
+    try:
+        return load_index.connect_index(get_db_path())
+    except Exception as e:
+        app.logger.error(f"Error opening load index: {e}")
+        return None
+
+
+def refresh_load_cache():
+    """Rebuild the load index and snapshot after a pull instead of on the next request"""
+    try:
+        get_load_snapshot()
+    except Exception as e:
+        app.logger.error(f"Error refreshing load cache: {e}")
+
+
+def _new_load_entry(load_num):
+    """Create an empty load overview entry"""
+    return {
+        'load_number': load_num,
+        'collections': [],
+        'deliveries': [],
+        'prebook': None,
+        'vehicles': [],
+        'total_vehicles': 0,
+        'earliest_date': None,
+        'earliest_date_formatted': None
+    }
+
+
+def build_load_overview(job_data, vehicle_data, sort_order='date_desc', overrides=None):
+    """Group job and vehicle rows into the load overview structure
+    
+    Jobs and vehicles are bucketed by load number in a single pass each, so the
+    cost grows linearly with the number of rows rather than loads x jobs.
+    
+    Args:
+        job_data: DWJJOB rows as dicts (see extract_job_data)
+        vehicle_data: DWVVEH rows as dicts (see extract_vehicle_data)
+        sort_order: 'date_desc' (newest first), 'date_asc' (oldest first), or 'load_number'
+        overrides: Vehicle overrides keyed by normalized registration
+                   (default: vehicle_lookup.get_all_vehicle_overrides())
+    
+    Returns:
+        Dict with total_loads, loads, last_updated and sort_order
+    """
+    if overrides is None:
+        overrides = vehicle_lookup.get_all_vehicle_overrides()
+    
+    loads = {}
+    location_maps = {}
+    
+    # Process jobs - one pass builds the load entries and their location maps
+    for job in job_data:
+        load_num = job['dwjLoad']
+        load = loads.get(load_num)
+        if load is None:
+            load = loads[load_num] = _new_load_entry(load_num)
+            location_maps[load_num] = {'collections': {}, 'deliveries': {}}
+        
+        # Track earliest date for sorting
+        job_date = job.get('dwjDate')
+        if job_date:
+            if load['earliest_date'] is None or job_date < load['earliest_date']:
+                load['earliest_date'] = job_date
+                load['earliest_date_formatted'] = format_date(job_date)
+        
+        job_info = {
+            'date': format_date(job_date),
+            'time': job.get('dwjTime'),
+            'customer': job.get('dwjCust'),
+            'location': job.get('dwjName'),
+            'town': job.get('dwjTown'),
+            'postcode': job.get('dwjPostco'),
+            'vehicle_count': job.get('dwjVehs', 0),
+            'address_code': job.get('dwjAdrCod')
+        }
+        
+        job_type = job['dwjType']
+        if job_type == 'C' or job_type == 'D':
+            # Location mappings for multi-location loads
+            location_key = f"{job.get('dwjCust', '')}_{job.get('dwjAdrCod', '')}"
+            location_name = f"{job.get('dwjName', '')} - {job.get('dwjPostco', '')}"
+            
+            if job_type == 'C':
+                load['collections'].append(job_info)
+                location_maps[load_num]['collections'][location_key] = location_name
+            else:
+                load['deliveries'].append(job_info)
+                location_maps[load_num]['deliveries'][location_key] = location_name
+        elif job_type == 'B':
+            # PRE-BOOK type
+            load['prebook'] = job_info
+    
+    for loc_map in location_maps.values():
+        loc_map['is_multi_collection'] = len(loc_map['collections']) > 1
+        loc_map['is_multi_delivery'] = len(loc_map['deliveries']) > 1
+    
+    # Process vehicles
+    for vehicle in vehicle_data:
+        load_num = vehicle['dwvLoad']
+        load = loads.get(load_num)
+        if load is None:
+            continue
+        
+        # Check for vehicle override
+        reg = vehicle.get('dwvVehRef')
+        model = vehicle.get('dwvModDes')
+        
+        if reg and overrides:
+            override = overrides.get(vehicle_lookup.normalize_registration(reg))
+            if override:
+                model = override['make_model']
+                app.logger.debug(f"Using override for {reg}: {model}")
+        
+        vehicle_info = {
+            'ref': reg,
+            'model': model,
+            'color': vehicle.get('dwvColDes'),
+            'status': vehicle.get('dwvStatus'),
+            'position': vehicle.get('dwvPos')
+        }
+        
+        # Add location information for multi-location loads
+        location_info = []
+        loc_map = location_maps[load_num]
+        
+        if loc_map['is_multi_collection']:
+            col_key = f"{vehicle.get('dwvColCus', '')}_{vehicle.get('dwvColCod', '')}"
+            if col_key in loc_map['collections']:
+                location_info.append(f"FROM: {loc_map['collections'][col_key]}")
+        
+        if loc_map['is_multi_delivery']:
+            del_key = f"{vehicle.get('dwvDelCus', '')}_{vehicle.get('dwvDelCod', '')}"
+            if del_key in loc_map['deliveries']:
+                location_info.append(f"TO: {loc_map['deliveries'][del_key]}")
+        
+        if location_info:
+            vehicle_info['location_info'] = ' | '.join(location_info)
+        
+        load['vehicles'].append(vehicle_info)
+    
+    # Convert to list and sort
+    loads_list = list(loads.values())
+    for load in loads_list:
+        load['total_vehicles'] = len(load['vehicles'])
+    
+    # Sort based on requested order
+    if sort_order == 'date_desc':
+        # Newest first - loads without dates go to the end
+        loads_list.sort(key=lambda x: x['earliest_date'] if x['earliest_date'] else 0, reverse=True)
+    elif sort_order == 'date_asc':
+        # Oldest first - loads without dates go to the end
+        loads_list.sort(key=lambda x: x['earliest_date'] if x['earliest_date'] else float('inf'))
+    elif sort_order == 'load_number':
+        loads_list.sort(key=lambda x: x['load_number'])
+    
+    return {
+        'total_loads': len(loads),
+        'loads': loads_list,
+        'last_updated': datetime.now().isoformat(),
+        'sort_order': sort_order
+    }
+
+
 def get_load_overview(sort_order='date_desc'):
     """Get overview of all loads in the database
     
+    Built from the cached sql.db snapshot; the result (and its serialised JSON
+    response) is reused until the database or vehicle overrides change.
+    
     Args:
         sort_order: How to sort loads - 'date_desc' (newest first), 'date_asc' (oldest first), or 'load_number'
     """
-    conn = connect_database()
+    return get_load_overview_entry(sort_order)['overview']
+
+
+def get_load_overview_entry(sort_order='date_desc'):
+    """Get the cached overview for a sort order along with its response body and ETag
+    
+    Returns:
+        Dict with 'overview', 'body' (serialised /api/loads response) and 'etag'
+    """
+    try:
+        snapshot = get_load_snapshot()
+        if not snapshot:
+            return {'overview': {"error": "Database not found", "loads": []}, 'body': None, 'etag': None}
+        
+        # Overrides change the vehicle models, so they are part of the cache key
+        cache_key = (sort_order, vehicle_lookup.get_overrides_version())
+        with load_snapshot_lock:
+            entry = snapshot['overviews'].get(cache_key)
+        if entry:
+            return entry
+        
+        overrides = vehicle_lookup.get_all_vehicle_overrides()
+        overview = build_load_overview(snapshot['jobs'], snapshot['vehicles'], sort_order, overrides)
+        overview['last_updated'] = snapshot['modified_at']
+        
+        body = app.json.dumps({'success': True, **overview})
+        entry = {
+            'overview': overview,
+            'body': body,
+            'etag': hashlib.sha1(body.encode('utf-8')).hexdigest()
+        }
+        
+        with load_snapshot_lock:
+            # Keep only entries for the current overrides version
+            for key in [k for k in snapshot['overviews'] if k[1] != cache_key[1]]:
+                del snapshot['overviews'][key]
+            snapshot['overviews'][cache_key] = entry
+        
+        return entry
+        
+    except Exception as e:
+        app.logger.error(f"Error getting load overview: {e}")
+        return {'overview': {"error": str(e), "loads": []}, 'body': None, 'etag': None}
+
+
+# ==================== Filtered Load Queries ====================
+
+LOAD_FIELDS = [
+    'load_number', 'collections', 'deliveries', 'prebook', 'vehicles',
+    'total_vehicles', 'earliest_date', 'earliest_date_formatted'
+]
+
+LOAD_SORT_SQL = {
+    'date_desc': "(earliest_date IS NULL), earliest_date DESC, load_number",
+    'date_asc': "(earliest_date IS NULL), earliest_date, load_number",
+    'load_number': "load_number"
+}
+
+# Stay well below SQLite's bound-parameter limit when fetching rows by load number
+SQL_IN_CHUNK_SIZE = 500
+
+
+def _escape_like(value):
+    """Escape LIKE wildcards so user input matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fetch_rows_for_loads(conn, table, load_column, order_by, load_numbers):
+    """Fetch all rows of a table for the given load numbers"""
+    rows = []
+    cursor = conn.cursor()
+    for i in range(0, len(load_numbers), SQL_IN_CHUNK_SIZE):
+        chunk = load_numbers[i:i + SQL_IN_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(
+            f"SELECT * FROM {table} WHERE {load_column} IN ({placeholders}) ORDER BY {order_by}",
+            chunk
+        )
+        rows.extend(dict(row) for row in cursor.fetchall())
+    return rows
+
+
+def query_load_overview(sort_order='date_desc', start_date=None, end_date=None, location=None,
+                        load_prefix=None, limit=None, offset=0, fields=None):
+    """Get a filtered page of the load overview using the derived load index
+    
+    Loads are selected from the indexed per-load table and only the matching
+    page's DWJJOB/DWVVEH rows are read and grouped, so a narrow query stays
+    small however much history the database holds.
+    
+    Args:
+        sort_order: 'date_desc', 'date_asc' or 'load_number'
+        start_date: Earliest load date to include (YYYYMMDD int)
+        end_date: Latest load date to include (YYYYMMDD int)
+        location: Case-insensitive substring of a collection/delivery name, town, postcode or customer
+        load_prefix: Load number prefix
+        limit: Maximum number of loads to return (None for all)
+        offset: Number of matching loads to skip
+        fields: Load keys to include (None for all)
+    
+    Returns:
+        Dict with total_loads (matching), loads, offset, limit and next_offset, or 'error'
+    """
+    conn = connect_load_index()
     if not conn:
         return {"error": "Database not found", "loads": []}
     
     try:
-        job_data = extract_job_data(conn)
-        vehicle_data = extract_vehicle_data(conn)
-        
-        # Organize by load number
-        loads = defaultdict(lambda: {
-            'load_number': '',
-            'collections': [],
-            'deliveries': [],
-            'prebook': None,
-            'vehicles': [],
-            'total_vehicles': 0,
-            'earliest_date': None,
-            'earliest_date_formatted': None
-        })
+        where = []
+        params = []
+        
+        if load_prefix:
+            where.append("load_number LIKE ? ESCAPE '\\'")
+            params.append(_escape_like(load_prefix) + '%')
+        
+        if start_date is not None:
+            where.append("earliest_date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            where.append("earliest_date <= ?")
+            params.append(end_date)
+        
+        if location:
+            pattern = '%' + _escape_like(location) + '%'
+            where.append("""EXISTS (
+                SELECT 1 FROM DWJJOB
+                WHERE dwjLoad = loads.load_number AND dwjType IN ('C', 'D') AND (
+                    dwjName LIKE ? ESCAPE '\\' OR dwjTown LIKE ? ESCAPE '\\' OR
+                    dwjPostco LIKE ? ESCAPE '\\' OR dwjCust LIKE ? ESCAPE '\\'
+                )
+            )""")
+            params.extend([pattern] * 4)
+        
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ''
         
-        # Process jobs
-        for job in job_data:
-            load_num = job['dwjLoad']
-            loads[load_num]['load_number'] = load_num
-            
-            # Track earliest date for sorting
-            job_date = job.get('dwjDate')
-            if job_date:
-                if loads[load_num]['earliest_date'] is None or job_date < loads[load_num]['earliest_date']:
-                    loads[load_num]['earliest_date'] = job_date
-                    loads[load_num]['earliest_date_formatted'] = format_date(job_date)
-            
-            job_info = {
-                'date': format_date(job.get('dwjDate')),
-                'time': job.get('dwjTime'),
-                'customer': job.get('dwjCust'),
-                'location': job.get('dwjName'),
-                'town': job.get('dwjTown'),
-                'postcode': job.get('dwjPostco'),
-                'vehicle_count': job.get('dwjVehs', 0),
-                'address_code': job.get('dwjAdrCod')
-            }
-            
-            if job['dwjType'] == 'C':
-                loads[load_num]['collections'].append(job_info)
-            elif job['dwjType'] == 'D':
-                loads[load_num]['deliveries'].append(job_info)
-            elif job['dwjType'] == 'B':
-                # PRE-BOOK type
-                loads[load_num]['prebook'] = job_info
-        
-        # Build location mappings for multi-location loads
-        location_maps = {}
-        for load_num in loads:
-            collection_locations = {}
-            delivery_locations = {}
-            
-            # Build location maps from jobs
-            for job in job_data:
-                if job['dwjLoad'] == load_num:
-                    location_key = f"{job.get('dwjCust', '')}_{job.get('dwjAdrCod', '')}"
-                    location_name = f"{job.get('dwjName', '')} - {job.get('dwjPostco', '')}"
-                    
-                    if job['dwjType'] == 'C':
-                        collection_locations[location_key] = location_name
-                    elif job['dwjType'] == 'D':
-                        delivery_locations[location_key] = location_name
-            
-            location_maps[load_num] = {
-                'collections': collection_locations,
-                'deliveries': delivery_locations,
-                'is_multi_collection': len(collection_locations) > 1,
-                'is_multi_delivery': len(delivery_locations) > 1
-            }
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM loads {where_sql}", params)
+        total = cursor.fetchone()[0]
+        
+        page_sql = f"""
+            SELECT load_number FROM loads {where_sql}
+            ORDER BY {LOAD_SORT_SQL.get(sort_order, LOAD_SORT_SQL['date_desc'])}
+        """
+        page_params = list(params)
+        if limit is not None:
+            page_sql += " LIMIT ? OFFSET ?"
+            page_params.extend([limit, offset])
+        elif offset:
+            page_sql += " LIMIT -1 OFFSET ?"
+            page_params.append(offset)
+        
+        cursor.execute(page_sql, page_params)
+        load_numbers = [row['load_number'] for row in cursor.fetchall()]
+        
+        job_data = _fetch_rows_for_loads(conn, 'DWJJOB', 'dwjLoad', 'dwjLoad, dwjType', load_numbers)
+        
+        # Vehicles are the bulk of the rows - skip them when not requested
+        if fields is None or 'vehicles' in fields or 'total_vehicles' in fields:
+            vehicle_data = _fetch_rows_for_loads(conn, 'DWVVEH', 'dwvLoad', 'dwvLoad, dwvPos', load_numbers)
+        else:
+            vehicle_data = []
         
-        # Process vehicles
-        for vehicle in vehicle_data:
-            load_num = vehicle['dwvLoad']
-            if load_num in loads:
-                # Check for vehicle override
-                reg = vehicle.get('dwvVehRef')
-                model = vehicle.get('dwvModDes')
-                
-                if reg:
-                    override = vehicle_lookup.get_vehicle_override(reg)
-                    if override:
-                        model = override['make_model']
-                        app.logger.debug(f"Using override for {reg}: {model}")
-                
-                vehicle_info = {
-                    'ref': reg,
-                    'model': model,
-                    'color': vehicle.get('dwvColDes'),
-                    'status': vehicle.get('dwvStatus'),
-                    'position': vehicle.get('dwvPos')
-                }
-                
-                # Add location information for multi-location loads
-                location_info = []
-                loc_map = location_maps.get(load_num, {})
-                
-                if loc_map.get('is_multi_collection'):
-                    col_key = f"{vehicle.get('dwvColCus', '')}_{vehicle.get('dwvColCod', '')}"
-                    if col_key in loc_map.get('collections', {}):
-                        location_info.append(f"FROM: {loc_map['collections'][col_key]}")
-                
-                if loc_map.get('is_multi_delivery'):
-                    del_key = f"{vehicle.get('dwvDelCus', '')}_{vehicle.get('dwvDelCod', '')}"
-                    if del_key in loc_map.get('deliveries', {}):
-                        location_info.append(f"TO: {loc_map['deliveries'][del_key]}")
-                
-                if location_info:
-                    vehicle_info['location_info'] = ' | '.join(location_info)
-                
-                loads[load_num]['vehicles'].append(vehicle_info)
-                loads[load_num]['total_vehicles'] = len(loads[load_num]['vehicles'])
-        
-        # Convert to list and sort
-        loads_list = list(loads.values())
-        
-        # Sort based on requested order
-        if sort_order == 'date_desc':
-            # Newest first - loads without dates go to the end
-            loads_list.sort(key=lambda x: x['earliest_date'] if x['earliest_date'] else 0, reverse=True)
-        elif sort_order == 'date_asc':
-            # Oldest first - loads without dates go to the end
-            loads_list.sort(key=lambda x: x['earliest_date'] if x['earliest_date'] else float('inf'))
-        elif sort_order == 'load_number':
-            loads_list.sort(key=lambda x: x['load_number'])
-        
-        result = {
-            'total_loads': len(loads),
-            'loads': loads_list,
-            'last_updated': datetime.now().isoformat(),
+        overview = build_load_overview(job_data, vehicle_data, sort_order)
+        
+        # Keep the SQL page order
+        by_number = {load['load_number']: load for load in overview['loads']}
+        loads = [by_number[num] for num in load_numbers if num in by_number]
+        
+        if fields is not None:
+            loads = [{key: load[key] for key in fields} for load in loads]
+        
+        next_offset = offset + len(loads)
+        modified_at = datetime.fromtimestamp(os.path.getmtime(get_db_path())).isoformat()
+        
+        return {
+            'total_loads': total,
+            'returned': len(loads),
+            'offset': offset,
+            'limit': limit,
+            'next_offset': next_offset if next_offset < total else None,
+            'loads': loads,
+            'last_updated': modified_at,
             'sort_order': sort_order
         }
         
-        return result
-        
     except Exception as e:
-        app.logger.error(f"Error getting load overview: {e}")
+        app.logger.error(f"Error querying loads: {e}")
         return {"error": str(e), "loads": []}
     finally:
         conn.close()
@@ -309,6 +622,7 @@ def auto_refresh_task():
                 result = device.pull_sql_file()
                 if result:
                     app.logger.info(f"Auto-refresh: Successfully updated SQL data from {device.name}")
+                    refresh_load_cache()
                 else:
                     app.logger.warning(f"Auto-refresh: Failed to pull SQL from {device.name}")
             else:
@@ -365,9 +679,15 @@ def health_check():
 
 @app.route('/api/devices', methods=['GET'])
 def get_devices():
-    """Get status of all devices"""
+    """Get status of all devices
+    
+    Served from the state kept by device_monitor; pass ?refresh=1 to probe
+    the devices before responding.
+    """
     try:
-        adb_manager.refresh_status()
+        force = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        if force or adb_manager.status_updated_at is None:
+            device_monitor.refresh()
         
         devices = []
         for device in adb_manager.devices:
@@ -379,10 +699,15 @@ def get_devices():
                 'app_running': device.app_running
             })
         
+        updated_at = adb_manager.status_updated_at
+        
         return jsonify({
             'success': True,
             'devices': devices,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'last_updated': updated_at.isoformat() if updated_at else None,
+            'age_seconds': round((datetime.now() - updated_at).total_seconds(), 1) if updated_at else None,
+            'tracking': device_monitor.tracking
         })
     except Exception as e:
         app.logger.error(f"Error getting devices: {e}")
@@ -394,7 +719,7 @@ def connect_devices():
     """Connect to all devices"""
     try:
         adb_manager.connect_all()
-        adb_manager.refresh_status()
+        device_monitor.refresh()
         
         return jsonify({
             'success': True,
@@ -463,6 +788,9 @@ def remove_device():
         for i, device in enumerate(adb_manager.devices):
             if device.address == address:
                 removed_device = adb_manager.devices.pop(i)
+                adb_shell.close_session(address)
+                screen_detector.clear_detection_cache(address)
+                screen_stream.stop_stream(address)
                 app.logger.info(f"Removed device: {removed_device.name} ({address})")
                 
                 return jsonify({
@@ -823,6 +1151,7 @@ def pull_sql():
             result = available[0].pull_sql_file()
         
         if result:
+            refresh_load_cache()
             return jsonify({
                 'success': True,
                 'message': 'SQL file downloaded successfully',
@@ -897,12 +1226,38 @@ def get_dwvveh_data():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def parse_iso_date_param(name):
+    """Parse a YYYY-MM-DD query parameter into a YYYYMMDD int (None if absent)"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    return int(datetime.strptime(value, '%Y-%m-%d').strftime('%Y%m%d'))
+
+
+def conditional_json_response(body, etag=None):
+    """Build a JSON response with an ETag, answering If-None-Match with 304"""
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag or hashlib.sha1(body.encode('utf-8')).hexdigest())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/api/loads', methods=['GET'])
 def get_loads():
     """Get load overview with all details
     
     Query Parameters:
         sort: Sort order - 'date_desc' (newest first, default), 'date_asc' (oldest first), or 'load_number'
+        start_date: Only loads whose earliest date is on/after this date (YYYY-MM-DD)
+        end_date: Only loads whose earliest date is on/before this date (YYYY-MM-DD)
+        location: Substring of a collection/delivery location, town, postcode or customer
+        load_prefix: Load number prefix
+        limit: Maximum number of loads to return
+        offset: Number of matching loads to skip (use next_offset from the previous page)
+        fields: Comma-separated load keys to return (e.g. load_number,earliest_date_formatted)
+    
+    Without filter/paging parameters the full cached overview is returned.
+    Responses carry an ETag; requests with a matching If-None-Match get a 304.
     """
     try:
         # Get sort parameter from query string, default to date_desc
@@ -913,19 +1268,73 @@ def get_loads():
         if sort_order not in valid_sorts:
             sort_order = 'date_desc'
         
-        overview = get_load_overview(sort_order)
+        query_params = ['start_date', 'end_date', 'location', 'load_prefix', 'limit', 'offset', 'fields']
         
-        if 'error' in overview:
+        if not any(request.args.get(name) for name in query_params):
+            entry = get_load_overview_entry(sort_order)
+            overview = entry['overview']
+            
+            if 'error' in overview:
+                return jsonify({
+                    'success': False,
+                    'error': overview['error'],
+                    'loads': []
+                }), 404 if 'not found' in overview['error'] else 500
+            
+            # Serve the pre-serialised body; clients revalidate with If-None-Match
+            return conditional_json_response(entry['body'], entry['etag'])
+        
+        # Validate filter and paging parameters
+        try:
+            start_date = parse_iso_date_param('start_date')
+            end_date = parse_iso_date_param('end_date')
+        except ValueError:
             return jsonify({
                 'success': False,
-                'error': overview['error'],
+                'error': 'start_date and end_date must be in YYYY-MM-DD format'
+            }), 400
+        
+        try:
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            offset = int(request.args.get('offset') or 0)
+            if (limit is not None and limit < 1) or offset < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'limit must be a positive integer and offset a non-negative integer'
+            }), 400
+        
+        fields = None
+        if request.args.get('fields'):
+            fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+            invalid = [f for f in fields if f not in LOAD_FIELDS]
+            if invalid:
+                return jsonify({
+                    'success': False,
+                    'error': f"Unknown fields: {', '.join(invalid)}",
+                    'valid_fields': LOAD_FIELDS
+                }), 400
+        
+        result = query_load_overview(
+            sort_order=sort_order,
+            start_date=start_date,
+            end_date=end_date,
+            location=request.args.get('location') or None,
+            load_prefix=request.args.get('load_prefix') or None,
+            limit=limit,
+            offset=offset,
+            fields=fields
+        )
+        
+        if 'error' in result:
+            return jsonify({
+                'success': False,
+                'error': result['error'],
                 'loads': []
-            }), 404 if 'not found' in overview['error'] else 500
+            }), 404 if 'not found' in result['error'] else 500
         
-        return jsonify({
-            'success': True,
-            **overview
-        })
+        return conditional_json_response(app.json.dumps({'success': True, **result}))
         
     except Exception as e:
         app.logger.error(f"Error getting loads: {e}")
@@ -1036,6 +1445,136 @@ def database_info():
 
 # ==================== Paperwork Generation Routes ====================
 
+PAPERWORK_EVENTS_KEEPALIVE = 15  # Seconds between keepalives on a quiet job event stream
+
+def _paperwork_error_status(output):
+    """HTTP status for a failed paperwork_engine result"""
+    return {'queue_full': 503, 'timeout': 504}.get(output.get('reason'), 500)
+
+
+@app.route('/api/paperwork/status', methods=['GET'])
+def paperwork_status():
+    """Paperwork worker pool, template cache and PDF converter state"""
+    try:
+        return jsonify({'success': True, **paperwork_engine.get_status()})
+    except Exception as e:
+        app.logger.error(f"Error getting paperwork status: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _paperwork_row(row):
+    """Lower-case a DWJJOB/DWVVEH row's keys and stringify dwjdate, as the generators expect"""
+    converted = {}
+    for k, v in row.items():
+        key = k.lower()
+        # Convert date integers to strings
+        if key == 'dwjdate' and isinstance(v, int):
+            converted[key] = str(v)
+        else:
+            converted[key] = v
+    return converted
+
+
+def build_loadsheet_data(load_jobs, load_vehicles, overrides):
+    """
+    Build loadsheet generator input for one load
+    
+    Args:
+        load_jobs: The load's DWJJOB rows
+        load_vehicles: The load's DWVVEH rows (make/model overrides are applied in place)
+        overrides: vehicle_lookup.get_all_vehicle_overrides()
+    
+    Returns:
+        {'data': [...]} for scripts/loadsheet.py
+    """
+    for vehicle in load_vehicles:
+        reg = vehicle.get('dwvVehRef')
+        if reg and overrides:
+            override = overrides.get(vehicle_lookup.normalize_registration(reg))
+            if override:
+                vehicle['dwvModDes'] = override['make_model']
+                app.logger.info(f"Applied override for {reg}: {override['make_model']}")
+    
+    return {
+        'data': [_paperwork_row(j) for j in load_jobs] + [_paperwork_row(v) for v in load_vehicles]
+    }
+
+
+def build_timesheet_data(conn, start_dt, end_dt):
+    """
+    Build timesheet generator input for a date range
+    
+    Args:
+        conn: Open load index connection (DWJJOB is read from it)
+        start_dt: First day (datetime)
+        end_dt: Last day (datetime); its week's entries come from timesheet_entries
+    
+    Returns:
+        {'data': [...]} for scripts/timesheet.py (jobs and time entries)
+    """
+    # Filter jobs by date range using the dwjDate index
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT * FROM DWJJOB
+        WHERE CAST(dwjDate AS INTEGER) BETWEEN ? AND ?
+        ORDER BY dwjLoad, dwjType
+    """, (int(start_dt.strftime('%Y%m%d')), int(end_dt.strftime('%Y%m%d'))))
+    filtered_jobs = [dict(row) for row in cursor.fetchall()]
+    
+    # Get timesheet entries from screen_control.db for this week
+    time_entries = []
+    try:
+        control_conn = sqlite3.connect('data/screen_control.db')
+        control_conn.row_factory = sqlite3.Row
+        cursor = control_conn.cursor()
+        
+        # Calculate week ending date (Sunday) from end_date
+        days_to_sunday = 6 - end_dt.weekday()
+        week_end = end_dt + timedelta(days=days_to_sunday)
+        week_ending_str = week_end.strftime('%Y-%m-%d')
+        
+        cursor.execute("""
+            SELECT * FROM timesheet_entries
+            WHERE week_ending_date = ?
+            ORDER BY 
+                CASE day_name
+                    WHEN 'Monday' THEN 1
+                    WHEN 'Tuesday' THEN 2
+                    WHEN 'Wednesday' THEN 3
+                    WHEN 'Thursday' THEN 4
+                    WHEN 'Friday' THEN 5
+                    WHEN 'Saturday' THEN 6
+                    WHEN 'Sunday' THEN 7
+                END
+        """, (week_ending_str,))
+        
+        rows = cursor.fetchall()
+        control_conn.close()
+        
+        # Convert to format expected by timesheet script
+        for row in rows:
+            time_entries.append({
+                'date': row['entry_date'] or '',
+                'day': row['day_name'] or '',
+                'start_time': row['start_time'] or '',
+                'finsh_time': row['finish_time'] or '',  # Note: typo in script
+                'total_hours': row['total_hours'] or '',
+                'driver': row['driver'] or '',
+                'fleet_reg': row['fleet_reg'] or '',
+                'start_mileage': row['start_mileage'] or '',
+                'end_mileage': row['end_mileage'] or ''
+            })
+        
+        app.logger.info(f"Found {len(time_entries)} timesheet entries for week ending {week_ending_str}")
+    except Exception as e:
+        app.logger.warning(f"Could not fetch timesheet entries: {e}")
+    
+    # Both jobs and time entries go to the timesheet script
+    return {
+        'data': [_paperwork_row(j) for j in filtered_jobs] + time_entries
+    }
+
+
 @app.route('/api/paperwork/loadsheet', methods=['POST'])
 def generate_loadsheet():
     """Generate loadsheet for a specific load"""
@@ -1049,22 +1588,19 @@ def generate_loadsheet():
                 'error': 'Load number is required'
             }), 400
         
-        # Get database connection
-        conn = connect_database()
+        conn = connect_load_index()
         if not conn:
             return jsonify({
                 'success': False,
                 'error': 'Database not found. Please pull SQL file first.'
             }), 404
         
-        # Extract job and vehicle data for this load
-        jobs = extract_job_data(conn)
-        vehicles = extract_vehicle_data(conn)
-        conn.close()
-        
-        # Filter for this load number
-        load_jobs = [j for j in jobs if j.get('dwjLoad') == load_number]
-        load_vehicles = [v for v in vehicles if v.get('dwvLoad') == load_number]
+        # Indexed lookup of just this load's rows
+        try:
+            load_jobs = _fetch_rows_for_loads(conn, 'DWJJOB', 'dwjLoad', 'dwjType', [load_number])
+            load_vehicles = _fetch_rows_for_loads(conn, 'DWVVEH', 'dwvLoad', 'dwvPos', [load_number])
+        finally:
+            conn.close()
         
         if not load_jobs:
             return jsonify({
@@ -1073,61 +1609,24 @@ def generate_loadsheet():
             }), 404
         
         # Enrich vehicle data with overrides
-        for vehicle in load_vehicles:
-            reg = vehicle.get('dwvVehRef')
-            if reg:
-                override = vehicle_lookup.get_vehicle_override(reg)
-                if override:
-                    vehicle['dwvModDes'] = override['make_model']
-                    app.logger.info(f"Applied override for {reg}: {override['make_model']}")
-        
-        # Convert keys to lowercase and ensure dates are strings for script compatibility
-        def convert_for_script(d):
-            converted = {}
-            for k, v in d.items():
-                key = k.lower()
-                # Convert date integers to strings
-                if key == 'dwjdate' and isinstance(v, int):
-                    converted[key] = str(v)
-                else:
-                    converted[key] = v
-            return converted
+        json_data = build_loadsheet_data(load_jobs, load_vehicles, vehicle_lookup.get_all_vehicle_overrides())
         
-        # Build JSON data for loadsheet script
-        json_data = {
-            'data': [convert_for_script(j) for j in load_jobs] + [convert_for_script(v) for v in load_vehicles]
-        }
-        
-        # Execute loadsheet script
-        import json as json_lib
-        script_path = os.path.join(os.getcwd(), 'scripts', 'loadsheet.py')
-        
-        result = subprocess.run(
-            ['python3', script_path, json_lib.dumps(json_data)],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        # Generate on the paperwork pool
+        output = paperwork_engine.generate('loadsheet', json_data)
         
-        if result.returncode == 0:
-            output = json_lib.loads(result.stdout)
-            if output.get('success'):
-                return jsonify({
-                    'success': True,
-                    'message': 'Loadsheet generated successfully',
-                    'xlsx_path': output.get('excel_path'),
-                    'load_number': load_number
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': output.get('error', 'Unknown error')
-                }), 500
+        if output['success']:
+            return jsonify({
+                'success': True,
+                'message': 'Loadsheet generated successfully',
+                'xlsx_path': output.get('excel_path'),
+                'load_number': load_number
+            })
         else:
             return jsonify({
                 'success': False,
-                'error': f'Script execution failed: {result.stderr}'
-            }), 500
+                'error': output.get('error', 'Unknown error'),
+                'reason': output.get('reason')
+            }), _paperwork_error_status(output)
             
     except Exception as e:
         app.logger.error(f"Error generating loadsheet: {e}")
@@ -1148,139 +1647,195 @@ def generate_timesheet():
                 'error': 'Start date and end date are required'
             }), 400
         
-        # Get database connection
-        conn = connect_database()
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+        
+        conn = connect_load_index()
         if not conn:
             return jsonify({
                 'success': False,
                 'error': 'Database not found. Please pull SQL file first.'
             }), 404
         
-        # Extract all data
-        jobs = extract_job_data(conn)
-        vehicles = extract_vehicle_data(conn)
-        conn.close()
-        
-        # Filter jobs by date range (convert dates for comparison)
-        from datetime import datetime as dt
-        start_dt = dt.strptime(start_date, '%Y-%m-%d')
-        end_dt = dt.strptime(end_date, '%Y-%m-%d')
-        
-        filtered_jobs = []
-        for job in jobs:
-            if job.get('dwjDate'):
-                try:
-                    job_date = dt.strptime(str(job['dwjDate']), '%Y%m%d')
-                    if start_dt <= job_date <= end_dt:
-                        filtered_jobs.append(job)
-                except:
-                    pass
-        
-        # Get timesheet entries from screen_control.db for this week
-        time_entries = []
         try:
-            control_conn = sqlite3.connect('data/screen_control.db')
-            control_conn.row_factory = sqlite3.Row
-            cursor = control_conn.cursor()
-            
-            # Calculate week ending date (Sunday) from end_date
-            days_to_sunday = 6 - end_dt.weekday()
-            week_end = end_dt + timedelta(days=days_to_sunday)
-            week_ending_str = week_end.strftime('%Y-%m-%d')
-            
-            cursor.execute("""
-                SELECT * FROM timesheet_entries
-                WHERE week_ending_date = ?
-                ORDER BY 
-                    CASE day_name
-                        WHEN 'Monday' THEN 1
-                        WHEN 'Tuesday' THEN 2
-                        WHEN 'Wednesday' THEN 3
-                        WHEN 'Thursday' THEN 4
-                        WHEN 'Friday' THEN 5
-                        WHEN 'Saturday' THEN 6
-                        WHEN 'Sunday' THEN 7
-                    END
-            """, (week_ending_str,))
-            
-            rows = cursor.fetchall()
-            control_conn.close()
-            
-            # Convert to format expected by timesheet script
-            for row in rows:
-                time_entries.append({
-                    'date': row['entry_date'] or '',
-                    'day': row['day_name'] or '',
-                    'start_time': row['start_time'] or '',
-                    'finsh_time': row['finish_time'] or '',  # Note: typo in script
-                    'total_hours': row['total_hours'] or '',
-                    'driver': row['driver'] or '',
-                    'fleet_reg': row['fleet_reg'] or '',
-                    'start_mileage': row.get('start_mileage') or '',
-                    'end_mileage': row.get('end_mileage') or ''
-                })
-            
-            app.logger.info(f"Found {len(time_entries)} timesheet entries for week ending {week_ending_str}")
-        except Exception as e:
-            app.logger.warning(f"Could not fetch timesheet entries: {e}")
-        
-        # Convert keys to lowercase and ensure dates are strings for script compatibility
-        def convert_for_script(d):
-            converted = {}
-            for k, v in d.items():
-                key = k.lower()
-                # Convert date integers to strings
-                if key == 'dwjdate' and isinstance(v, int):
-                    converted[key] = str(v)
-                else:
-                    converted[key] = v
-            return converted
-        
-        # Build JSON data for timesheet script (include both jobs and time entries)
-        json_data = {
-            'data': [convert_for_script(j) for j in filtered_jobs] + time_entries
-        }
+            json_data = build_timesheet_data(conn, start_dt, end_dt)
+        finally:
+            conn.close()
         
-        # Execute timesheet script
-        import json as json_lib
-        script_path = os.path.join(os.getcwd(), 'scripts', 'timesheet.py')
+        # Generate on the paperwork pool
+        output = paperwork_engine.generate('timesheet', json_data)
         
-        result = subprocess.run(
-            ['python3', script_path, json_lib.dumps(json_data)],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        if output['success']:
+            return jsonify({
+                'success': True,
+                'message': 'Timesheet generated successfully',
+                'xlsx_path': output.get('excel_path')
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': output.get('error', 'Unknown error'),
+                'reason': output.get('reason')
+            }), _paperwork_error_status(output)
+            
+    except Exception as e:
+        app.logger.error(f"Error generating timesheet: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def collect_batch_documents(start_dt, end_dt, include_timesheet=True):
+    """
+    Build generator input for every load in a date range from one database read
+    
+    Args:
+        start_dt: First day (datetime)
+        end_dt: Last day (datetime)
+        include_timesheet: Add the range's timesheet as the last document
+    
+    Returns:
+        List of (kind, name, json_data) for paperwork_engine.start_batch, or
+        None if the database is missing
+    """
+    conn = connect_load_index()
+    if not conn:
+        return None
+    
+    # Loads are selected like /api/loads?start_date=&end_date= (by earliest date)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT load_number FROM loads
+            WHERE earliest_date BETWEEN ? AND ?
+            ORDER BY earliest_date, load_number
+        """, (int(start_dt.strftime('%Y%m%d')), int(end_dt.strftime('%Y%m%d'))))
+        load_numbers = [row['load_number'] for row in cursor.fetchall()]
+        
+        jobs = _fetch_rows_for_loads(conn, 'DWJJOB', 'dwjLoad', 'dwjLoad, dwjType', load_numbers)
+        vehicles = _fetch_rows_for_loads(conn, 'DWVVEH', 'dwvLoad', 'dwvLoad, dwvPos', load_numbers)
+        timesheet_data = build_timesheet_data(conn, start_dt, end_dt) if include_timesheet else None
+    finally:
+        conn.close()
+    
+    jobs_by_load = {}
+    for job in jobs:
+        jobs_by_load.setdefault(job['dwjLoad'], []).append(job)
+    vehicles_by_load = {}
+    for vehicle in vehicles:
+        vehicles_by_load.setdefault(vehicle['dwvLoad'], []).append(vehicle)
+    
+    overrides = vehicle_lookup.get_all_vehicle_overrides()
+    documents = [
+        ('loadsheet', load_number,
+         build_loadsheet_data(jobs_by_load[load_number], vehicles_by_load.get(load_number, []), overrides))
+        for load_number in load_numbers if load_number in jobs_by_load
+    ]
+    if timesheet_data is not None:
+        documents.append(('timesheet', f"timesheet {end_dt.strftime('%Y-%m-%d')}", timesheet_data))
+    return documents
+
+
+@app.route('/api/paperwork/jobs', methods=['GET', 'POST'])
+def paperwork_jobs():
+    """List batch jobs, or start one for a week or date range"""
+    try:
+        if request.method == 'GET':
+            return jsonify({
+                'success': True,
+                'jobs': [job.to_dict(include_results=False) for job in paperwork_engine.list_batches()]
+            })
         
-        if result.returncode == 0:
-            output = json_lib.loads(result.stdout)
-            if output.get('success'):
-                return jsonify({
-                    'success': True,
-                    'message': 'Timesheet generated successfully',
-                    'xlsx_path': output.get('excel_path')
-                })
+        data = request.get_json(silent=True) or {}
+        try:
+            if data.get('week_ending'):
+                end_dt = datetime.strptime(data['week_ending'], '%Y-%m-%d')
+                start_dt = end_dt - timedelta(days=6)
+            elif data.get('start_date') and data.get('end_date'):
+                start_dt = datetime.strptime(data['start_date'], '%Y-%m-%d')
+                end_dt = datetime.strptime(data['end_date'], '%Y-%m-%d')
             else:
                 return jsonify({
                     'success': False,
-                    'error': output.get('error', 'Unknown error')
-                }), 500
-        else:
+                    'error': 'week_ending or start_date and end_date are required'
+                }), 400
+        except ValueError:
             return jsonify({
                 'success': False,
-                'error': f'Script execution failed: {result.stderr}'
-            }), 500
-            
+                'error': 'Dates must be in YYYY-MM-DD format'
+            }), 400
+        
+        documents = collect_batch_documents(start_dt, end_dt, data.get('include_timesheet', True))
+        if documents is None:
+            return jsonify({
+                'success': False,
+                'error': 'Database not found. Please pull SQL file first.'
+            }), 404
+        
+        description = f"{start_dt.strftime('%Y-%m-%d')} to {end_dt.strftime('%Y-%m-%d')}"
+        job = paperwork_engine.start_batch(documents, bool(data.get('bundle', False)), description)
+        app.logger.info(f"Paperwork batch {job.id} started: {len(documents)} document(s) for {description}")
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': f'/api/paperwork/jobs/{job.id}',
+            'events_url': f'/api/paperwork/jobs/{job.id}/events'
+        }), 202
     except Exception as e:
-        app.logger.error(f"Error generating timesheet: {e}")
+        app.logger.error(f"Error with paperwork jobs: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/paperwork/jobs/<job_id>', methods=['GET'])
+def paperwork_job_status(job_id):
+    """Progress and per-document results of a batch job"""
+    job = paperwork_engine.get_batch(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': f'Job {job_id} not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@app.route('/api/paperwork/jobs/<job_id>/events', methods=['GET'])
+def paperwork_job_events(job_id):
+    """Server-sent events: a 'progress' event per change, then 'done'"""
+    job = paperwork_engine.get_batch(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': f'Job {job_id} not found'}), 404
+    
+    def events():
+        version = -1
+        while True:
+            current = job.wait_for_change(version, timeout=PAPERWORK_EVENTS_KEEPALIVE)
+            if current == version and not job.done:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            version = current
+            state = job.to_dict(include_results=job.done)
+            yield f"event: {'done' if job.done else 'progress'}\ndata: {app.json.dumps(state)}\n\n"
+            if job.done:
+                return
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/api/paperwork/jobs/<job_id>/download', methods=['GET'])
+def download_paperwork_job(job_id):
+    """Download a finished batch job's ZIP (jobs started with "bundle": true)"""
+    job = paperwork_engine.get_batch(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': f'Job {job_id} not found'}), 404
+    if not job.done:
+        return jsonify({'success': False, 'error': 'Job is still running'}), 409
+    if not job.zip_path or not os.path.exists(job.zip_path):
+        return jsonify({'success': False, 'error': 'No ZIP for this job (start it with "bundle": true)'}), 404
+    return send_file(job.zip_path, as_attachment=True, download_name=os.path.basename(job.zip_path))
+
+
 @app.route('/api/paperwork/weeks', methods=['GET'])
 def get_paperwork_weeks():
     """Get available weeks with loads"""
     try:
-        conn = connect_database()
+        conn = connect_load_index()
         if not conn:
             return jsonify({
                 'success': False,
@@ -1288,42 +1843,17 @@ def get_paperwork_weeks():
                 'weeks': []
             }), 404
         
-        jobs = extract_job_data(conn)
-        conn.close()
-        
-        from datetime import datetime as dt, timedelta
-        
-        # Extract unique week endings and track unique loads per week
-        weeks = {}
-        for job in jobs:
-            if job.get('dwjDate') and job.get('dwjLoad'):
-                try:
-                    job_date = dt.strptime(str(job['dwjDate']), '%Y%m%d')
-                    # Calculate week ending (Sunday) - UK work week is Monday to Sunday
-                    days_to_sunday = 6 - job_date.weekday()
-                    week_end = job_date + timedelta(days=days_to_sunday)
-                    week_start = week_end - timedelta(days=6)
-                    
-                    week_key = week_end.strftime('%Y-%m-%d')
-                    if week_key not in weeks:
-                        weeks[week_key] = {
-                            'week_ending': week_key,
-                            'monday': week_start.strftime('%Y-%m-%d'),
-                            'sunday': week_end.strftime('%Y-%m-%d'),
-                            'loads': set()  # Track unique load numbers
-                        }
-                    # Add the unique load number to the set
-                    weeks[week_key]['loads'].add(job['dwjLoad'])
-                except:
-                    pass
-        
-        # Convert sets to counts
-        for week_data in weeks.values():
-            week_data['load_count'] = len(week_data['loads'])
-            del week_data['loads']  # Remove the set from output
-        
-        # Sort by week ending (newest first)
-        sorted_weeks = sorted(weeks.values(), key=lambda x: x['week_ending'], reverse=True)
+        # Unique loads per week ending (Sunday) are materialised when the index is built
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT week_ending, monday, sunday, load_count
+                FROM paperwork_weeks
+                ORDER BY week_ending DESC
+            """)
+            sorted_weeks = [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
         
         return jsonify({
             'success': True,
@@ -1335,25 +1865,47 @@ def get_paperwork_weeks():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/paperwork/weeks/<week_ending>/files', methods=['GET'])
+def get_paperwork_week_files(week_ending):
+    """List a week's generated documents (week_ending as YYYY-MM-DD or DD-MM-YY)"""
+    folder = paperwork_catalogue.folder_from_week(week_ending)
+    files = [
+        {
+            'filename': entry['filename'],
+            'kind': entry['kind'],
+            'load_number': entry['load_number'],
+            'format': entry['format'],
+            'size': entry['size'],
+            'modified': datetime.fromtimestamp(entry['modified']).isoformat(),
+            'download_url': f"/api/paperwork/download/{entry['folder']}/{entry['filename']}"
+        }
+        for entry in paperwork_catalogue.catalogue.list_week(week_ending)
+    ]
+    return jsonify({
+        'success': True,
+        'week_ending': paperwork_catalogue.week_from_folder(folder),
+        'folder': folder,
+        'files': files
+    })
+
+
 @app.route('/api/paperwork/exists/<load_number>', methods=['GET'])
 def check_loadsheet_exists(load_number):
     """Check if loadsheet exists for a load"""
     try:
-        paperwork_dir = 'paperwork'
-        
-        # Search for loadsheet file
-        for root, dirs, files in os.walk(paperwork_dir):
-            for file in files:
-                if file.startswith(load_number) and file.endswith('.xlsx'):
-                    return jsonify({
-                        'success': True,
-                        'exists': True,
-                        'xlsx_path': os.path.join(root, file)
-                    })
+        xlsx = paperwork_catalogue.catalogue.find_load(load_number, 'xlsx')
+        if not xlsx:
+            return jsonify({
+                'success': True,
+                'exists': False
+            })
         
+        pdf = paperwork_catalogue.catalogue.find_load(load_number, 'pdf')
         return jsonify({
             'success': True,
-            'exists': False
+            'exists': True,
+            'xlsx_path': xlsx['path'],
+            'pdf_path': pdf['path'] if pdf else None
         })
         
     except Exception as e:
@@ -1363,48 +1915,14 @@ def check_loadsheet_exists(load_number):
 
 @app.route('/api/paperwork/download/<path:filename>', methods=['GET'])
 def download_paperwork(filename):
-    """Download a paperwork file"""
+    """Download a paperwork file (a filename, <week folder>/<filename>, or a load number plus .xlsx/.pdf)"""
     try:
-        paperwork_dir = 'paperwork'
-        
-        # Determine requested file type
-        requested_type = None
-        if filename.endswith('.pdf'):
-            requested_type = '.pdf'
-            base_filename = filename.replace('.pdf', '')
-        elif filename.endswith('.xlsx'):
-            requested_type = '.xlsx'
-            base_filename = filename.replace('.xlsx', '')
-        else:
-            base_filename = filename
-        
-        # Search for files starting with the load number
-        for root, dirs, files in os.walk(paperwork_dir):
-            for file in files:
-                # Match if the file starts with the base filename
-                if file.startswith(base_filename):
-                    # If a specific type was requested, only match that type
-                    if requested_type:
-                        if file.endswith(requested_type):
-                            return send_file(
-                                os.path.join(root, file),
-                                as_attachment=True,
-                                download_name=file
-                            )
-                    # Otherwise match any valid type (.xlsx or .pdf)
-                    elif file.endswith('.xlsx') or file.endswith('.pdf'):
-                        return send_file(
-                            os.path.join(root, file),
-                            as_attachment=True,
-                            download_name=file
-                        )
-        
-        # Direct file path (fallback)
-        if os.path.exists(filename):
+        entry = paperwork_catalogue.catalogue.find(filename)
+        if entry:
             return send_file(
-                filename,
+                entry['path'],
                 as_attachment=True,
-                download_name=os.path.basename(filename)
+                download_name=entry['filename']
             )
         
         return jsonify({
@@ -1422,18 +1940,25 @@ def download_paperwork(filename):
 # Screenshot Management
 @app.route('/api/devices/<path:address>/screenshot', methods=['GET'])
 def capture_screenshot(address):
-    """Capture screenshot from device"""
+    """Capture screenshot from device
+    
+    Kept in memory only; pass ?save=1 to also write it to screenshots/.
+    """
     try:
-        screenshot_path = screen_detector.capture_screenshot(address)
+        screenshot = screen_detector.capture_screenshot_array(address)
         
-        if not screenshot_path:
+        if screenshot is None:
             return jsonify({
                 'success': False,
                 'error': 'Failed to capture screenshot'
             }), 500
         
+        screenshot_path = None
+        if request.args.get('save', '').lower() in ('1', 'true', 'yes'):
+            screenshot_path = screen_detector.save_screenshot(address, screenshot)
+        
         # Get base64 image for web display
-        base64_image = screen_detector.get_screenshot_as_base64(screenshot_path)
+        base64_image = screen_detector.get_screenshot_as_base64(screenshot)
         
         return jsonify({
             'success': True,
@@ -1446,21 +1971,95 @@ def capture_screenshot(address):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/devices/<path:address>/stream', methods=['GET', 'POST', 'DELETE'])
+def manage_screen_stream(address):
+    """Get, start or stop the continuous screen stream for a device
+    
+    While a stream runs, screenshots, screen detection and wait_for_screen
+    use its latest frame instead of running screencap.
+    """
+    try:
+        if request.method == 'GET':
+            stream = screen_stream.get_stream(address)
+            return jsonify({
+                'success': True,
+                'stream': stream.status() if stream else None
+            })
+        
+        elif request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            try:
+                bit_rate = int(data.get('bit_rate', screen_stream.STREAM_BIT_RATE))
+                if bit_rate <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'error': 'bit_rate must be a positive integer (bits per second)'
+                }), 400
+            size = data.get('size')
+            if size is not None and not re.fullmatch(r'\d+x\d+', str(size)):
+                return jsonify({
+                    'success': False,
+                    'error': 'size must be WIDTHxHEIGHT, e.g. 720x1520'
+                }), 400
+            
+            # Started explicitly, so it keeps running without MJPEG viewers
+            stream = screen_stream.start_stream(address, pinned=True, bit_rate=bit_rate, size=size)
+            return jsonify({
+                'success': True,
+                'message': f'Screen stream started for {address}',
+                'stream': stream.status()
+            })
+        
+        elif request.method == 'DELETE':
+            if screen_stream.stop_stream(address):
+                return jsonify({
+                    'success': True,
+                    'message': f'Screen stream stopped for {address}'
+                })
+            return jsonify({
+                'success': False,
+                'error': 'No screen stream running for this device'
+            }), 404
+    except Exception as e:
+        app.logger.error(f"Error managing screen stream: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/devices/<path:address>/stream.mjpeg', methods=['GET'])
+def stream_mjpeg(address):
+    """Live MJPEG view of a device's screen
+    
+    Starts the stream if needed; a stream started here stops when its last
+    viewer disconnects.
+    """
+    try:
+        stream = screen_stream.start_stream(address)
+        return Response(
+            screen_stream.mjpeg_frames(stream),
+            mimetype=f'multipart/x-mixed-replace; boundary={screen_stream.MJPEG_BOUNDARY}'
+        )
+    except Exception as e:
+        app.logger.error(f"Error streaming screen: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/devices/<path:address>/current-screen', methods=['GET'])
 def detect_screen(address):
     """Detect current screen on device"""
     try:
-        # First capture screenshot
-        screenshot_path = screen_detector.capture_screenshot(address)
+        # First capture screenshot (in memory)
+        screenshot = screen_detector.capture_screenshot_array(address)
         
-        if not screenshot_path:
+        if screenshot is None:
             return jsonify({
                 'success': False,
                 'error': 'Failed to capture screenshot'
             }), 500
         
-        # Detect screen
-        result = screen_detector.detect_current_screen(screenshot_path)
+        # Detect screen (an unchanged frame reuses the previous detection)
+        result = screen_detector.detect_current_screen(screenshot, device_address=address)
         
         if result['success'] and result.get('screen'):
             # Get linked macros for detected screen
@@ -1539,7 +2138,8 @@ def manage_credentials(address):
 def list_templates():
     """List all screen templates"""
     try:
-        templates = screen_detector.load_templates_from_db()
+        # Listing re-reads screen_templates, which also refreshes the detector's registry
+        templates = screen_detector.get_templates(refresh=True)
         
         # Get linked macros for each template
         for template in templates:
@@ -1554,6 +2154,22 @@ def list_templates():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/templates/reload', methods=['POST'])
+def reload_templates():
+    """Reload template definitions after screen_templates was changed outside the server"""
+    try:
+        templates = screen_detector.get_templates(refresh=True)
+        
+        return jsonify({
+            'success': True,
+            'message': f'Reloaded {len(templates)} templates',
+            'count': len(templates)
+        })
+    except Exception as e:
+        app.logger.error(f"Error reloading templates: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/templates/<int:template_id>/test', methods=['POST'])
 def test_template(template_id):
     """Test template against current screenshot"""
@@ -1567,17 +2183,17 @@ def test_template(template_id):
                 'error': 'Device address is required'
             }), 400
         
-        # Capture screenshot
-        screenshot_path = screen_detector.capture_screenshot(device_address)
+        # Capture screenshot (in memory)
+        screenshot = screen_detector.capture_screenshot_array(device_address)
         
-        if not screenshot_path:
+        if screenshot is None:
             return jsonify({
                 'success': False,
                 'error': 'Failed to capture screenshot'
             }), 500
         
-        # Detect screen
-        result = screen_detector.detect_current_screen(screenshot_path)
+        # Detect screen, evaluating every template so all matches are reported
+        result = screen_detector.detect_current_screen(screenshot, exhaustive=True)
         
         return jsonify(result)
     except Exception as e:
@@ -1765,6 +2381,10 @@ def manage_template_macro_link(template_id, macro_id):
 
 
 # Auto-Login
+# Seconds to wait for the login screen before typing credentials anyway
+LOGIN_SCREEN_TIMEOUT = 5
+
+
 @app.route('/api/devices/<path:address>/auto-login', methods=['POST'])
 def auto_login(address):
     """Execute enhanced auto-login on device with screen detection"""
@@ -1784,63 +2404,56 @@ def auto_login(address):
         post_login_wait = device_settings['post_login_wait_seconds']
         
         app.logger.info(f"Starting enhanced auto-login for {address}")
-        app.logger.info(f"Using keystroke delay: {keystroke_delay}ms, post-login wait: {post_login_wait}s")
+        app.logger.info(
+            f"Using keystroke delay: {keystroke_delay}ms, text input: {device_settings['text_input_mode']}, "
+            f"post-login wait: {post_login_wait}s"
+        )
         
-        # Step 1: Check current screen and handle bionag if present
-        current_screen = screen_detector.detect_current_screen(address)
+        # Step 1: Wait for the login screen, dismissing bionag if it shows first
+        current = screen_detector.wait_for_screen(address, ['login', 'bionag'], timeout=LOGIN_SCREEN_TIMEOUT)
         
-        if current_screen and 'bionag' in current_screen.lower():
+        if current['screen'] and current['screen'].lower() == 'bionag':
             app.logger.info("Bionag detected, dismissing...")
             # Dismiss bionag with back button
-            dismiss_actions = [
-                {"type": "back"},
-                {"type": "wait", "seconds": 1}
-            ]
-            screen_macros.execute_macro(address, dismiss_actions)
-            
-            # Re-check screen after dismissal
-            current_screen = screen_detector.detect_current_screen(address)
-        
-        # Step 2: Wait for login screen
-        max_retries = 3
-        for attempt in range(max_retries):
-            current_screen = screen_detector.detect_current_screen(address)
-            
-            if current_screen and 'login' in current_screen.lower():
-                app.logger.info(f"Login screen detected on attempt {attempt + 1}")
-                break
-            
-            if attempt < max_retries - 1:
-                app.logger.info(f"Login screen not detected, waiting... (attempt {attempt + 1}/{max_retries})")
-                time.sleep(1)
+            screen_macros.execute_macro(address, [{"type": "back"}])
+            current = screen_detector.wait_for_screen(address, 'login', timeout=LOGIN_SCREEN_TIMEOUT)
+        
+        # Step 2: Proceed once the login screen is up
+        if current['success']:
+            app.logger.info(f"Login screen detected after {current['elapsed']}s")
         else:
-            app.logger.warning("Login screen not detected after retries, proceeding anyway")
+            app.logger.warning(
+                f"Login screen not detected within {LOGIN_SCREEN_TIMEOUT}s "
+                f"(last screen: {current['screen']}), proceeding anyway"
+            )
         
         # Step 3: Build enhanced login actions with proper delays
         login_actions = [
-            {"type": "wait", "seconds": 0.5},
             {"type": "keyevent", "code": 61},  # TAB to username field
             {"type": "wait", "seconds": 0.3},
-            {"type": "text", "value": creds['username'], "delay_ms": keystroke_delay, "retry": True},
+            {"type": "text", "value": creds['username'], "delay_ms": keystroke_delay, "retry": True, "screen": "login"},
             {"type": "wait", "seconds": 0.3},
             {"type": "keyevent", "code": 61},  # TAB to password field
             {"type": "wait", "seconds": 0.3},
-            {"type": "text", "value": creds['password'], "delay_ms": keystroke_delay, "retry": True},
+            {"type": "text", "value": creds['password'], "delay_ms": keystroke_delay, "retry": True, "screen": "login"},
             {"type": "wait", "seconds": 0.5},
-            {"type": "keyevent", "code": 66},  # ENTER key (more reliable than tap)
-            {"type": "wait", "seconds": post_login_wait}
+            {"type": "keyevent", "code": 66}  # ENTER key (more reliable than tap)
         ]
 
         # Step 4: Execute login macro
         app.logger.info("Executing login actions...")
         result = screen_macros.execute_macro(address, login_actions)
         
-        # Step 5: Check post-login screen
-        time.sleep(1)
-        post_login_screen = screen_detector.detect_current_screen(address)
+        # Step 5: Wait for any screen other than login, up to the post-login wait (+1s as before)
+        after_login = [
+            template['name'] for template in screen_detector.get_templates()
+            if template['name'].lower() not in ('login', 'bionag')
+        ]
+        post_login = screen_detector.wait_for_screen(address, after_login, timeout=post_login_wait + 1)
+        post_login_screen = post_login['screen']
         
         if post_login_screen:
-            app.logger.info(f"Post-login screen: {post_login_screen}")
+            app.logger.info(f"Post-login screen: {post_login_screen} after {post_login['elapsed']}s")
             result['post_login_screen'] = post_login_screen
             
             # Check if still on login screen (login failed)
@@ -1869,7 +2482,7 @@ def manage_device_settings(address):
             cursor = conn.cursor()
             
             cursor.execute("""
-                SELECT match_threshold, keystroke_delay_ms, post_login_wait_seconds, updated_at
+                SELECT match_threshold, keystroke_delay_ms, post_login_wait_seconds, text_input_mode, updated_at
                 FROM device_settings
                 WHERE device_address = ?
             """, (address,))
@@ -1884,6 +2497,7 @@ def manage_device_settings(address):
                         'match_threshold': row['match_threshold'],
                         'keystroke_delay_ms': row['keystroke_delay_ms'],
                         'post_login_wait_seconds': row['post_login_wait_seconds'],
+                        'text_input_mode': row['text_input_mode'] or 'batch',
                         'updated_at': row['updated_at']
                     }
                 })
@@ -1895,6 +2509,7 @@ def manage_device_settings(address):
                         'match_threshold': 0.7,
                         'keystroke_delay_ms': 150,
                         'post_login_wait_seconds': 4,
+                        'text_input_mode': 'batch',
                         'updated_at': None
                     }
                 })
@@ -1905,6 +2520,7 @@ def manage_device_settings(address):
             match_threshold = data.get('match_threshold', 0.7)
             keystroke_delay_ms = data.get('keystroke_delay_ms', 150)
             post_login_wait_seconds = data.get('post_login_wait_seconds', 4)
+            text_input_mode = data.get('text_input_mode', 'batch')
             
             # Validate values
             if not (0.5 <= match_threshold <= 0.95):
@@ -1925,18 +2541,25 @@ def manage_device_settings(address):
                     'error': 'post_login_wait_seconds must be between 2 and 10'
                 }), 400
             
+            if text_input_mode not in screen_macros.TEXT_INPUT_MODES:
+                return jsonify({
+                    'success': False,
+                    'error': f"text_input_mode must be one of: {', '.join(screen_macros.TEXT_INPUT_MODES)}"
+                }), 400
+            
             conn = sqlite3.connect('data/screen_control.db')
             cursor = conn.cursor()
             
             cursor.execute("""
-                INSERT INTO device_settings (device_address, match_threshold, keystroke_delay_ms, post_login_wait_seconds, updated_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                INSERT INTO device_settings (device_address, match_threshold, keystroke_delay_ms, post_login_wait_seconds, text_input_mode, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(device_address) DO UPDATE SET
                     match_threshold = excluded.match_threshold,
                     keystroke_delay_ms = excluded.keystroke_delay_ms,
                     post_login_wait_seconds = excluded.post_login_wait_seconds,
+                    text_input_mode = excluded.text_input_mode,
                     updated_at = CURRENT_TIMESTAMP
-            """, (address, match_threshold, keystroke_delay_ms, post_login_wait_seconds))
+            """, (address, match_threshold, keystroke_delay_ms, post_login_wait_seconds, text_input_mode))
             
             conn.commit()
             conn.close()
@@ -1949,7 +2572,8 @@ def manage_device_settings(address):
                 'settings': {
                     'match_threshold': match_threshold,
                     'keystroke_delay_ms': keystroke_delay_ms,
-                    'post_login_wait_seconds': post_login_wait_seconds
+                    'post_login_wait_seconds': post_login_wait_seconds,
+                    'text_input_mode': text_input_mode
                 }
             })
     except Exception as e:
@@ -2508,6 +3132,15 @@ if __name__ == '__main__':
             app.logger.error(f"✗ Failed to initialize screen_control database: {e}")
     else:
         app.logger.info("✓ Screen control database found and valid")
+        try:
+            conn = sqlite3.connect(screen_control_db_path)
+            added = init_screen_control_db.migrate_database(conn.cursor())
+            conn.commit()
+            conn.close()
+            if added:
+                app.logger.info(f"✓ Screen control database migrated (added {', '.join(added)})")
+        except Exception as e:
+            app.logger.error(f"✗ Failed to migrate screen_control database: {e}")
     
     # Auto-connect to all configured devices on startup
     app.logger.info("Auto-connecting to configured devices...")
@@ -2526,6 +3159,20 @@ if __name__ == '__main__':
     except Exception as e:
         app.logger.error(f"Error during auto-connect: {e}")
     
+    # Keep device status current for /api/devices
+    device_monitor.start()
+    app.logger.info(f"Device monitor started (full re-probe every {device_monitor.poll_interval}s)")
+    
+    # Index generated paperwork so downloads don't walk the week folders
+    file_count = paperwork_catalogue.catalogue.rebuild()
+    app.logger.info(f"Paperwork catalogue: {file_count} files under {paperwork_catalogue.catalogue.root}")
+    
+    # Start LibreOffice in the background so the first PDF doesn't wait for it
+    if pdf_converter.start():
+        app.logger.info(f"PDF converter starting {pdf_converter.CONVERTER_WORKERS} LibreOffice instance(s)")
+    else:
+        app.logger.info("PDF converter unavailable (needs soffice and python3-uno), using one-shot conversion")
+    
     # Run the Flask app
     app.run(
         host='0.0.0.0',
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Tests for adb_client.AdbClient against a fake adb server, and for
+DeviceMonitor's use of host:track-devices
+
+Run with: python3 -m pytest test_adb_client.py
+"""
+
+import os
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+import adb_client
+import adb_manager
+from adb_client import AdbClient, AdbError
+
+
+class FakeAdbServer:
+    """Minimal adb server stand-in for exercising AdbClient without devices
+    
+    Devices are dicts of serial -> {'state', 'files', 'shell'} where shell is
+    a callable(command) -> (returncode, stdout, stderr).
+    """
+    
+    def __init__(self, devices, shell_v2=True):
+        self.devices = devices
+        self.shell_v2 = shell_v2
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+    
+    def close(self):
+        self.sock.close()
+    
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+    
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+    
+    @staticmethod
+    def _fail(conn, message):
+        data = message.encode()
+        conn.sendall(b"FAIL" + b"%04x" % len(data) + data)
+    
+    def _device_list(self):
+        return "".join(f"{serial}\t{d['state']}\n" for serial, d in self.devices.items()).encode()
+    
+    def _handle(self, conn):
+        device = None
+        try:
+            while True:
+                length = int(self._recv_exact(conn, 4), 16)
+                request = self._recv_exact(conn, length).decode()
+                self.requests.append(request)
+                
+                if request == "host:version":
+                    conn.sendall(b"OKAY0004" + b"0029")
+                elif request == "host:devices":
+                    data = self._device_list()
+                    conn.sendall(b"OKAY" + b"%04x" % len(data) + data)
+                elif request == "host:track-devices":
+                    data = self._device_list()
+                    conn.sendall(b"OKAY" + b"%04x" % len(data) + data)
+                elif request.startswith("host:connect:"):
+                    data = f"connected to {request[13:]}".encode()
+                    conn.sendall(b"OKAY" + b"%04x" % len(data) + data)
+                elif request.startswith("host:transport:"):
+                    device = self.devices.get(request[15:])
+                    if not device:
+                        self._fail(conn, f"device '{request[15:]}' not found")
+                        return
+                    conn.sendall(b"OKAY")
+                elif request.startswith("shell,v2,raw:") and self.shell_v2:
+                    returncode, out, err = device["shell"](request[13:])
+                    conn.sendall(b"OKAY")
+                    if out:
+                        conn.sendall(struct.pack("<BI", adb_client.SHELL_STDOUT, len(out)) + out)
+                    if err:
+                        conn.sendall(struct.pack("<BI", adb_client.SHELL_STDERR, len(err)) + err)
+                    conn.sendall(struct.pack("<BIB", adb_client.SHELL_EXIT, 1, returncode))
+                    return
+                elif request.startswith("shell:"):
+                    command, _, _ = request[6:].rpartition("; echo __ADBRC__$?")
+                    returncode, out, err = device["shell"](command)
+                    conn.sendall(b"OKAY" + out + err + f"__ADBRC__{returncode}\n".encode())
+                    return
+                elif request.startswith("exec:"):
+                    _, out, _ = device["shell"](request[5:])
+                    conn.sendall(b"OKAY" + out)
+                    return
+                elif request == "sync:":
+                    conn.sendall(b"OKAY")
+                    self._handle_sync(conn, device)
+                    return
+                else:
+                    self._fail(conn, f"unknown service {request}")
+                    return
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+    
+    def _handle_sync(self, conn, device):
+        files = device["files"]
+        while True:
+            command, length = struct.unpack("<4sI", self._recv_exact(conn, 8))
+            if command == b"QUIT":
+                return
+            path = self._recv_exact(conn, length).decode()
+            if command == b"STAT":
+                data = files.get(path)
+                mode = 0o100644 if data is not None else 0
+                conn.sendall(b"STAT" + struct.pack("<III", mode, len(data or b""), 0))
+            elif command == b"RECV":
+                data = files.get(path)
+                if data is None:
+                    message = b"No such file or directory"
+                    conn.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    return
+                for i in range(0, len(data), adb_client.SYNC_CHUNK_SIZE):
+                    chunk = data[i:i + adb_client.SYNC_CHUNK_SIZE]
+                    conn.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                conn.sendall(b"DONE" + struct.pack("<I", 0))
+            elif command == b"SEND":
+                remote_path = path.rsplit(",", 1)[0]
+                data = b""
+                while True:
+                    chunk_command, chunk_length = struct.unpack("<4sI", self._recv_exact(conn, 8))
+                    if chunk_command == b"DONE":
+                        break
+                    data += self._recv_exact(conn, chunk_length)
+                files[remote_path] = data
+                conn.sendall(b"OKAY" + struct.pack("<I", 0))
+
+
+def fake_shell(command):
+    if command == "echo hello":
+        return 0, b"hello\n", b""
+    if command == "screencap":
+        return 0, bytes(range(256)) * 4, b""
+    return 127, b"", f"{command.split()[0]}: not found\n".encode()
+
+
+@pytest.fixture(params=[True, False], ids=["shell-v2", "shell-v1"])
+def server(request):
+    devices = {
+        "10.0.0.1:5555": {"state": "device", "files": {"/sdcard/sql.db": os.urandom(200000)}, "shell": fake_shell},
+        "10.0.0.2:5555": {"state": "offline", "files": {}, "shell": fake_shell},
+    }
+    fake = FakeAdbServer(devices, shell_v2=request.param)
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def adb(server):
+    return AdbClient(port=server.port)
+
+
+def test_host_services(adb):
+    assert adb.is_available()
+    assert adb.devices() == {"10.0.0.1:5555": "device", "10.0.0.2:5555": "offline"}
+    assert next(adb.track_devices())["10.0.0.1:5555"] == "device"
+    assert adb.connect_device("10.0.0.3:5555") == "connected to 10.0.0.3:5555"
+
+
+def test_shell(adb):
+    assert adb.shell("10.0.0.1:5555", "echo hello") == (0, b"hello\n", b"")
+    assert adb.shell("10.0.0.1:5555", "bogus")[0] == 127
+    assert adb.exec_out("10.0.0.1:5555", "screencap") == bytes(range(256)) * 4
+
+
+def test_unknown_device(adb):
+    with pytest.raises(AdbError, match="not found"):
+        adb.shell("10.9.9.9:5555", "echo hello")
+
+
+def test_sync(adb, server, tmp_path):
+    local = str(tmp_path / "sql.db")
+    files = server.devices["10.0.0.1:5555"]["files"]
+    remote = files["/sdcard/sql.db"]
+    
+    assert adb.pull("10.0.0.1:5555", "/sdcard/sql.db", local) == len(remote)
+    with open(local, "rb") as handle:
+        assert handle.read() == remote
+    assert adb.stat("10.0.0.1:5555", "/sdcard/sql.db")[1] == len(remote)
+    
+    with pytest.raises(AdbError):
+        adb.pull("10.0.0.1:5555", "/sdcard/missing.db", local)
+    assert not os.path.exists(f"{local}.part")
+    
+    adb.push("10.0.0.1:5555", local, "/sdcard/copy.db")
+    assert files["/sdcard/copy.db"] == remote
+    assert adb.stat("10.0.0.1:5555", "/sdcard/nothing")[0] == 0
+
+
+class StubManager:
+    """The parts of ADBManager DeviceMonitor uses"""
+    
+    status_updated_at = None
+    
+    def __init__(self, refresh_seconds=0):
+        self.states = []
+        self.refresh_seconds = refresh_seconds
+        self.refreshing = threading.Event()
+    
+    def refresh_status(self):
+        self.refreshing.set()
+        time.sleep(self.refresh_seconds)
+    
+    def apply_device_states(self, states):
+        self.states.append(states)
+
+
+def _monitor_threads(name):
+    return [thread for thread in threading.enumerate() if thread.name == name]
+
+
+def _track_threads():
+    return _monitor_threads("adb-track")
+
+
+def test_device_monitor_stop_ends_native_tracking(server, monkeypatch):
+    monkeypatch.setattr(adb_client, "client", AdbClient(port=server.port))
+    manager = StubManager()
+    monitor = adb_manager.DeviceMonitor(manager, poll_interval=60)
+    
+    monitor.start()
+    deadline = time.monotonic() + 5
+    while not manager.states and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.states and monitor.tracking
+    
+    # The fake server keeps the track-devices stream open without further updates
+    threads = _track_threads()
+    monitor.stop()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_device_monitor_restart_runs_one_set_of_threads(server, monkeypatch):
+    monkeypatch.setattr(adb_client, "client", AdbClient(port=server.port))
+    manager = StubManager(refresh_seconds=0.5)
+    monitor = adb_manager.DeviceMonitor(manager, poll_interval=60)
+    
+    monitor.start()
+    assert manager.refreshing.wait(5)
+    old_threads = list(monitor._threads)
+    # The poll thread is still inside refresh() when the monitor restarts
+    monitor.stop(timeout=0)
+    assert monitor.start()
+    
+    for thread in old_threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in old_threads)
+    assert len(_monitor_threads("adb-poll")) == 1
+    assert len(_track_threads()) == 1
+    
+    monitor.stop()
+    assert not _monitor_threads("adb-poll") and not _track_threads()
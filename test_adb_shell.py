@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for adb_shell.ShellSession against a stand-in `adb` that runs a local sh
+
+Run with: python3 -m pytest test_adb_shell.py
+"""
+
+import os
+import stat
+
+import pytest
+
+import adb_shell
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """A ShellSession whose `adb -s <address> shell` is a plain local sh"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake_adb = bin_dir / "adb"
+    fake_adb.write_text("#!/bin/sh\nexec sh\n")
+    fake_adb.chmod(fake_adb.stat().st_mode | stat.S_IXUSR)
+    
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.chdir(work_dir)
+    
+    shell = adb_shell.ShellSession("stand-in:5555")
+    shell.start()
+    yield shell
+    shell.close()
+
+
+def run(shell, command):
+    with shell.lock:
+        return shell.run(command, timeout=5)
+
+
+def test_output_and_exit_code(session):
+    assert run(session, "echo hello; echo oops >&2; false") == (1, b"hello\n", b"oops\n")
+
+
+def test_cd_does_not_leak_into_later_commands(session):
+    start_dir = run(session, "pwd")[1]
+    assert run(session, "cd /")[0] == 0
+    assert run(session, "pwd")[1] == start_dir
+
+
+def test_variables_do_not_leak_into_later_commands(session):
+    run(session, "LEAKED=yes")
+    assert run(session, "echo \"[$LEAKED]\"")[1] == b"[]\n"
+
+
+def test_exit_ends_only_the_command(session):
+    assert run(session, "exit 3")[0] == 3
+    assert session.alive
+    assert run(session, "echo still here") == (0, b"still here\n", b"")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Write screenrecord.h264, the H.264 fixture test_screen_stream.py decodes
+
+The sandbox OpenCV/FFmpeg builds have H.264 decoders but no encoder, so the
+stream is written by hand: an Annex B elementary stream (start codes, SPS,
+PPS, no container, as `screenrecord --output-format=h264` emits) of
+Baseline IDR frames made of I_PCM macroblocks, i.e. raw YUV 4:2:0 samples.
+Frame n has luma frame_luma(n) with a white bar at column n * BAR_STEP.
+
+Usage: python3 test_fixtures/make_screenrecord_fixture.py
+"""
+
+import os
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "screenrecord.h264")
+WIDTH = 96
+HEIGHT = 64
+FRAMES = 8
+BAR_WIDTH = 8
+BAR_STEP = 8
+
+I_PCM = 25  # mb_type of a raw macroblock in an I slice
+
+
+def frame_luma(index):
+    """Background luma of a frame"""
+    return 40 + index * 20
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = []
+    
+    def u(self, value, width):
+        self.bits.extend((value >> shift) & 1 for shift in range(width - 1, -1, -1))
+    
+    def ue(self, value):
+        code = value + 1
+        self.u(0, code.bit_length() - 1)
+        self.u(code, code.bit_length())
+    
+    def se(self, value):
+        self.ue(2 * value - 1 if value > 0 else -2 * value)
+    
+    def align_zero(self):
+        while len(self.bits) % 8:
+            self.bits.append(0)
+    
+    def trailing(self):
+        self.bits.append(1)
+        self.align_zero()
+    
+    def bytes(self):
+        return bytes(
+            int("".join(map(str, self.bits[i:i + 8])), 2) for i in range(0, len(self.bits), 8)
+        )
+
+
+def nal(nal_type, rbsp):
+    """Annex B NAL unit (nal_ref_idc 3) with emulation prevention"""
+    payload = bytearray()
+    zeros = 0
+    for byte in rbsp:
+        if zeros >= 2 and byte <= 3:
+            payload.append(3)
+            zeros = 0
+        payload.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return b"\x00\x00\x00\x01" + bytes([0x60 | nal_type]) + bytes(payload)
+
+
+def sps():
+    bits = BitWriter()
+    bits.u(66, 8)  # Baseline
+    bits.u(0xC0, 8)  # constraint_set0/1
+    bits.u(30, 8)  # level 3.0
+    bits.ue(0)  # seq_parameter_set_id
+    bits.ue(0)  # log2_max_frame_num_minus4
+    bits.ue(2)  # pic_order_cnt_type
+    bits.ue(1)  # max_num_ref_frames
+    bits.u(0, 1)  # gaps_in_frame_num_value_allowed_flag
+    bits.ue(WIDTH // 16 - 1)
+    bits.ue(HEIGHT // 16 - 1)
+    bits.u(1, 1)  # frame_mbs_only_flag
+    bits.u(1, 1)  # direct_8x8_inference_flag
+    bits.u(0, 1)  # frame_cropping_flag
+    bits.u(0, 1)  # vui_parameters_present_flag
+    bits.trailing()
+    return nal(7, bits.bytes())
+
+
+def pps():
+    bits = BitWriter()
+    bits.ue(0)  # pic_parameter_set_id
+    bits.ue(0)  # seq_parameter_set_id
+    bits.u(0, 1)  # entropy_coding_mode_flag (CAVLC)
+    bits.u(0, 1)  # bottom_field_pic_order_in_frame_present_flag
+    bits.ue(0)  # num_slice_groups_minus1
+    bits.ue(0)  # num_ref_idx_l0_default_active_minus1
+    bits.ue(0)  # num_ref_idx_l1_default_active_minus1
+    bits.u(0, 1)  # weighted_pred_flag
+    bits.u(0, 2)  # weighted_bipred_idc
+    bits.se(0)  # pic_init_qp_minus26
+    bits.se(0)  # pic_init_qs_minus26
+    bits.se(0)  # chroma_qp_index_offset
+    bits.u(0, 1)  # deblocking_filter_control_present_flag
+    bits.u(0, 1)  # constrained_intra_pred_flag
+    bits.u(0, 1)  # redundant_pic_cnt_present_flag
+    bits.trailing()
+    return nal(8, bits.bytes())
+
+
+def idr_frame(index):
+    luma = [[frame_luma(index)] * WIDTH for _ in range(HEIGHT)]
+    bar = index * BAR_STEP
+    for row in luma:
+        row[bar:bar + BAR_WIDTH] = [235] * BAR_WIDTH
+    
+    bits = BitWriter()
+    bits.ue(0)  # first_mb_in_slice
+    bits.ue(7)  # slice_type: I (all slices)
+    bits.ue(0)  # pic_parameter_set_id
+    bits.u(0, 4)  # frame_num
+    bits.ue(index % 2)  # idr_pic_id, differs between consecutive IDRs
+    bits.u(0, 1)  # no_output_of_prior_pics_flag
+    bits.u(0, 1)  # long_term_reference_flag
+    bits.se(0)  # slice_qp_delta
+    
+    for mb_y in range(HEIGHT // 16):
+        for mb_x in range(WIDTH // 16):
+            bits.ue(I_PCM)
+            bits.align_zero()
+            for y in range(16):
+                for x in range(16):
+                    bits.u(luma[mb_y * 16 + y][mb_x * 16 + x], 8)
+            for _ in range(2 * 8 * 8):
+                bits.u(128, 8)  # Neutral chroma
+    bits.trailing()
+    return nal(5, bits.bytes())
+
+
+def write_fixture(path=FIXTURE_PATH):
+    with open(path, "wb") as handle:
+        handle.write(sps() + pps())
+        for index in range(FRAMES):
+            handle.write(idr_frame(index))
+    return path
+
+
+if __name__ == "__main__":
+    print(f"Wrote {write_fixture()}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for paperwork_catalogue.PaperworkCatalogue over a temporary paperwork tree
+
+Run with: python3 -m pytest test_paperwork_catalogue.py
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import paperwork_catalogue
+
+
+def write(root, folder, filename, mtime=None):
+    path = os.path.join(root, folder, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as handle:
+        handle.write('x')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path)
+    write(root, '05-10-25', '$S275052_Leeds.xlsx')
+    write(root, '05-10-25', '$S275052_Leeds.pdf')
+    write(root, '05-10-25', 'timesheet_2025-10-05_D3.xlsx')
+    write(root, 'batches', 'paperwork_abc.zip')
+    return root
+
+
+@pytest.fixture
+def catalogue(root):
+    catalogue = paperwork_catalogue.PaperworkCatalogue(root)
+    catalogue.rebuild()
+    return catalogue
+
+
+def test_lookups(catalogue):
+    assert catalogue.status()['files'] == 3
+    assert catalogue.find_load('$S275052', 'pdf')['filename'] == '$S275052_Leeds.pdf'
+    assert catalogue.find('$S275052.xlsx')['filename'] == '$S275052_Leeds.xlsx'
+    assert catalogue.find('05-10-25/timesheet_2025-10-05_D3.xlsx')['kind'] == 'timesheet'
+    assert catalogue.find('paperwork_abc.zip') is None
+    assert catalogue.find('../server.py') is None
+    assert [e['filename'] for e in catalogue.list_week('05-10-25')] == [
+        '$S275052_Leeds.pdf', '$S275052_Leeds.xlsx', 'timesheet_2025-10-05_D3.xlsx'
+    ]
+    assert catalogue.list_week('2025-10-05') == catalogue.list_week('05-10-25')
+
+
+def test_removed_file_falls_back_to_the_other_folder(root, catalogue):
+    older = time.time() - 3600
+    os.utime(os.path.join(root, '05-10-25', '$S275052_Leeds.xlsx'), (older, older))
+    newer = catalogue.add_file(write(root, '12-10-25', '$S275052_Leeds.xlsx'))
+    assert catalogue.find_load('$S275052')['week_ending'] == newer['week_ending'] == '2025-10-12'
+    
+    os.remove(newer['path'])
+    assert catalogue.find_load('$S275052')['week_ending'] == '2025-10-05'
+    assert catalogue.find('$S275052_Leeds.xlsx')['week_ending'] == '2025-10-05'
+
+
+def test_file_added_during_a_rebuild_is_kept(root, catalogue, monkeypatch):
+    scan = catalogue._scan
+    added = {}
+    
+    def scan_then_generate():
+        entries = scan()
+        # Generated after the listing, before the index is replaced
+        added['entry'] = catalogue.add_file(write(root, '05-10-25', '$S300000_York.xlsx'))
+        return entries
+    
+    monkeypatch.setattr(catalogue, '_scan', scan_then_generate)
+    catalogue.rebuild()
+    assert catalogue.find_load('$S300000') == added['entry']
+
+
+def test_concurrent_misses_scan_once(catalogue, monkeypatch):
+    scan = catalogue._scan
+    scans = []
+    
+    def slow_scan():
+        scans.append(1)
+        time.sleep(0.2)
+        return scan()
+    
+    monkeypatch.setattr(catalogue, '_scan', slow_scan)
+    catalogue.last_scan = 0.0
+    threads = [threading.Thread(target=catalogue.find, args=('missing.pdf',)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(scans) == 1
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for paperwork_engine's worker pool and batch jobs, with a stubbed
+generator in place of the loadsheet/timesheet scripts
+
+Run with: python3 -m pytest test_paperwork_engine.py
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+import paperwork_engine
+
+GENERATE_SECONDS = 0.2
+
+
+@pytest.fixture
+def slow_generator(monkeypatch, tmp_path):
+    """Replace the loadsheet generator with one that takes GENERATE_SECONDS"""
+    def generate(json_data, templates=None, converter=None, **kwargs):
+        time.sleep(GENERATE_SECONDS)
+        path = tmp_path / f"{json_data['name']}.xlsx"
+        path.write_text("x")
+        return str(path), None
+    
+    monkeypatch.setitem(paperwork_engine.GENERATORS, 'loadsheet', generate)
+
+
+def test_generate(slow_generator):
+    result = paperwork_engine.generate('loadsheet', {'name': 'single'})
+    assert result['success']
+    assert result['excel_path'].endswith('single.xlsx')
+
+
+def test_single_requests_get_a_slot_while_a_batch_runs(slow_generator):
+    documents = [('loadsheet', f'load-{i}', {'name': f'load-{i}'}) for i in range(60)]
+    job = paperwork_engine.start_batch(documents, description='test')
+    time.sleep(GENERATE_SECONDS)
+    
+    results = []
+    
+    def single(index):
+        results.append(paperwork_engine.generate('loadsheet', {'name': f'single-{index}'}, timeout=30))
+    
+    threads = [threading.Thread(target=single, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    
+    assert not job.done, "batch finished before the single requests ran alongside it"
+    assert [result.get('reason') for result in results if not result['success']] == []
+    
+    deadline = time.monotonic() + 60
+    while not job.done and time.monotonic() < deadline:
+        job.wait_for_change(job.version, timeout=1)
+    state = job.to_dict()
+    assert state['status'] == 'completed'
+    assert all(entry['status'] == 'succeeded' for entry in state['results'])
+
+
+def test_evicted_jobs_take_their_zip_with_them(slow_generator, monkeypatch, tmp_path):
+    monkeypatch.setattr(paperwork_engine.loadsheet, 'PAPERWORK_ROOT', str(tmp_path))
+    monkeypatch.setattr(paperwork_engine, 'BATCH_JOB_HISTORY', 2)
+    monkeypatch.setattr(paperwork_engine, '_batch_jobs', OrderedDict())
+    # Bundle of a job from an earlier server run
+    (tmp_path / 'batches').mkdir()
+    leftover = tmp_path / 'batches' / 'paperwork_earlier.zip'
+    leftover.write_text("x")
+    
+    jobs = []
+    for index in range(4):
+        job = paperwork_engine.start_batch([('loadsheet', f'load-{index}', {'name': f'load-{index}'})], bundle=True)
+        while not job.done:
+            job.wait_for_change(job.version, timeout=1)
+        jobs.append(job)
+    
+    assert all(job.zip_path for job in jobs)
+    assert [os.path.exists(job.zip_path) for job in jobs] == [False, False, True, True]
+    assert not leftover.exists()
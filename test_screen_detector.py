@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for screen_detector.wait_for_screen with a stubbed capture and matcher
+
+Run with: python3 -m pytest test_screen_detector.py
+"""
+
+import numpy as np
+
+import screen_detector
+
+
+def test_failed_detection_on_a_static_screen_is_retried(monkeypatch):
+    frame = np.zeros((64, 96, 3), dtype=np.uint8)
+    frame[:, :48] = 255
+    monkeypatch.setattr(screen_detector, "capture_screenshot_array", lambda address: frame)
+    
+    detections = iter([
+        {'success': False, 'error': 'database is locked'},
+        {'success': True, 'screen': 'login'}
+    ])
+    monkeypatch.setattr(screen_detector, "detect_current_screen", lambda *args, **kwargs: next(detections))
+    
+    result = screen_detector.wait_for_screen("stand-in", "login", timeout=2, poll_interval=0.01)
+    
+    assert result['success']
+    assert result['screen'] == 'login'
+    assert result['frames_matched'] == 2
+
+
+def test_unchanged_frame_reuses_a_successful_detection(monkeypatch):
+    frame = np.zeros((64, 96, 3), dtype=np.uint8)
+    monkeypatch.setattr(screen_detector, "capture_screenshot_array", lambda address: frame)
+    calls = []
+    
+    def detect(*args, **kwargs):
+        calls.append(1)
+        return {'success': True, 'screen': 'home'}
+    
+    monkeypatch.setattr(screen_detector, "detect_current_screen", detect)
+    
+    result = screen_detector.wait_for_screen("stand-in", "login", timeout=0.2, poll_interval=0.01)
+    
+    assert not result['success']
+    assert result['frames'] > 1
+    assert len(calls) == 1
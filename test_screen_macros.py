@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for screen_macros text input against a stand-in device that drops
+keystrokes
+
+Run with: python3 -m pytest test_screen_macros.py
+"""
+
+import re
+import subprocess
+from xml.sax.saxutils import quoteattr
+
+import pytest
+
+import screen_macros
+
+DUMP = ('<?xml version=\'1.0\' encoding=\'UTF-8\' standalone=\'yes\' ?><hierarchy rotation="0">'
+        '<node class="android.widget.EditText" text={text} focused="true" password="{password}" />'
+        '</hierarchy>')
+
+
+class FakeDevice:
+    """Focused text field fed by `input text` / `input keyevent` shell commands"""
+    
+    def __init__(self, drop_attempts=0, password=False, dump_text=None):
+        self.field = ""
+        self.drop_attempts = drop_attempts  # Attempts that lose their last character
+        self.password = password
+        self.dump_text = dump_text  # Force what the dump shows (e.g. "" for hidden passwords)
+        self.attempts = 0
+        self.dumps = 0
+    
+    def run_shell(self, address, args, timeout=30, text=True):
+        command = " ".join(str(a) for a in args)
+        stdout = ""
+        if command == f"uiautomator dump {screen_macros.UI_DUMP_PATH} >/dev/null && cat {screen_macros.UI_DUMP_PATH}":
+            self.dumps += 1
+            shown = self.field if self.dump_text is None else self.dump_text
+            if self.password and self.dump_text is None:
+                shown = "•" * len(shown)
+            stdout = DUMP.format(text=quoteattr(shown), password=str(self.password).lower())
+        elif command.startswith("input keyevent"):
+            codes = command.split()[2:]
+            if codes[0] == "123":
+                self.field = self.field[:max(0, len(self.field) - codes.count("67"))]
+        else:
+            self.attempts += 1
+            typed = "".join(
+                chunk.replace("'\\''", "'").replace("%s", " ")
+                for chunk in re.findall(r"input text '((?:[^']|'\\'')*)'", command)
+            )
+            if self.attempts <= self.drop_attempts:
+                typed = typed[:-1]
+            self.field += typed
+        return subprocess.CompletedProcess(args, 0, stdout if text else stdout.encode(), "" if text else b"")
+
+
+@pytest.fixture
+def device(request, monkeypatch):
+    fake = FakeDevice(**getattr(request, "param", {}))
+    monkeypatch.setattr(screen_macros.adb_shell, "run_shell", fake.run_shell)
+    return fake
+
+
+def test_text_typed_and_verified(device):
+    assert screen_macros.execute_text_with_retry("stand-in", "it's a pa$$", delay_ms=0, verify=True)
+    assert device.field == "it's a pa$$"
+    assert device.attempts == 1
+
+
+@pytest.mark.parametrize("device", [{"drop_attempts": 1}], indirect=True)
+def test_dropped_keystrokes_are_retried(device):
+    assert screen_macros.execute_text_with_retry("stand-in", "username", delay_ms=0, verify=True)
+    assert device.field == "username"
+    assert device.attempts == 2
+
+
+@pytest.mark.parametrize("device", [{"drop_attempts": 5}], indirect=True)
+def test_gives_up_when_keystrokes_keep_dropping(device):
+    assert not screen_macros.execute_text_with_retry("stand-in", "username", delay_ms=0, max_retries=2, verify=True)
+    assert device.attempts == 3
+
+
+@pytest.mark.parametrize("device", [{"drop_attempts": 1, "password": True}], indirect=True)
+def test_masked_password_checked_by_length(device):
+    assert screen_macros.execute_text_with_retry("stand-in", "secret", delay_ms=0, verify=True)
+    assert device.field == "secret"
+    assert device.attempts == 2
+
+
+@pytest.mark.parametrize("device", [{"drop_attempts": 1, "password": True, "dump_text": ""}], indirect=True)
+def test_unreadable_field_is_not_taken_as_typed(device):
+    assert not screen_macros.execute_text_with_retry("stand-in", "secret", delay_ms=0, max_retries=1, verify=True)
+    assert device.attempts == 2
+
+
+@pytest.mark.parametrize("mode", ["batch", "chunked"])
+def test_percent_s_is_typed_literally(device, mode):
+    text = "50%sale 100%s"
+    assert screen_macros.execute_text_with_retry("stand-in", text, delay_ms=0, mode=mode, verify=True)
+    assert device.field == text
+
+
+def test_verify_off_by_default(device):
+    assert screen_macros.execute_text_with_retry("stand-in", "hello", delay_ms=0)
+    assert device.dumps == 0
+
+
+@pytest.mark.parametrize("mode, dumps", [("batch", 0), ("per_char", 1)])
+def test_text_action_verifies_outside_batch_mode(device, mode, dumps):
+    settings = dict(screen_macros.DEFAULT_DEVICE_SETTINGS, keystroke_delay_ms=0, text_input_mode=mode)
+    assert screen_macros.execute_action("stand-in", {"type": "text", "value": "hello"}, settings)
+    assert device.field == "hello"
+    assert device.dumps == dumps
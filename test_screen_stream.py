@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for screen_stream.ScreenStream, decoding the recorded H.264 fixture
+through the same FIFO/FFmpeg path as a device's screenrecord output, played
+from a file and from a fake adb server
+
+Run with: python3 -m pytest test_screen_stream.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+import adb_client
+import screen_stream
+from test_adb_client import FakeAdbServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures"))
+
+import make_screenrecord_fixture as fixture
+
+
+def play_fixture():
+    """Play the fixture to the end; returns (stream, frames seen while it played)"""
+    stream = screen_stream.ScreenStream("stand-in", source=screen_stream.FIXTURE_PATH)
+    stream.start()
+    seen = []
+    latest = stream.wait_for_frame(0, timeout=10)
+    while latest is not None:
+        seen.append(latest)
+        latest = stream.wait_for_frame(latest[0], timeout=5)
+    stream.stop()
+    return stream, seen
+
+
+def test_fixture_is_raw_h264():
+    with open(screen_stream.FIXTURE_PATH, "rb") as handle:
+        data = handle.read()
+    # Annex B start code followed by an SPS, like screenrecord's output
+    assert data[:5] == b"\x00\x00\x00\x01\x67"
+
+
+def test_decodes_every_frame():
+    stream, seen = play_fixture()
+    
+    assert stream.last_error is None
+    assert stream.frame_count == fixture.FRAMES
+    assert seen, "no H.264 frame was decoded"
+    
+    for number, frame, decoded_at in seen:
+        assert frame.shape == (fixture.HEIGHT, fixture.WIDTH, 3)
+        assert decoded_at is not None
+        # Each fixture frame has its white bar in a different column
+        bar = (number - 1) * fixture.BAR_STEP
+        luma = frame[:, :, 1].astype(int)
+        assert luma[:, bar:bar + fixture.BAR_WIDTH].min() > 200
+        background = np.delete(luma, range(bar, bar + fixture.BAR_WIDTH), axis=1)
+        assert background.max() < 200
+
+
+def test_no_stale_frame_after_the_recording_ends():
+    stream, seen = play_fixture()
+    
+    assert seen
+    assert not stream.running
+    assert stream.latest_frame() is None
+    assert stream.wait_for_frame(0, timeout=0.1) is None
+
+
+@pytest.fixture
+def adb_server(monkeypatch):
+    """Fake adb server whose device answers screenrecord with the fixture"""
+    with open(screen_stream.FIXTURE_PATH, "rb") as handle:
+        recording = handle.read()
+    
+    def shell(command):
+        if command.startswith("screenrecord --output-format=h264 "):
+            return 0, recording, b""
+        return 127, b"", b"not found\n"
+    
+    server = FakeAdbServer({"10.0.0.1:5555": {"state": "device", "files": {}, "shell": shell}})
+    monkeypatch.setattr(adb_client, "client", adb_client.AdbClient(port=server.port))
+    yield server
+    screen_stream.stop_all_streams()
+    server.close()
+
+
+def test_device_stream_reads_through_adb_server(adb_server):
+    stream = screen_stream.ScreenStream("10.0.0.1:5555")
+    stream.start()
+    try:
+        first = stream.wait_for_frame(0, timeout=10)
+    finally:
+        stream.stop()
+    
+    assert first is not None
+    assert first[1].shape == (fixture.HEIGHT, fixture.WIDTH, 3)
+    assert "exec:screenrecord --output-format=h264 --bit-rate 4000000 -" in adb_server.requests
+
+
+def test_viewer_stream_stops_with_its_last_viewer(adb_server):
+    stream = screen_stream.start_stream("10.0.0.1:5555")
+    first = screen_stream.mjpeg_frames(stream)
+    second = screen_stream.mjpeg_frames(stream)
+    assert next(first).startswith(b"--frame\r\n")
+    next(second)
+    assert stream.viewers == 2
+    
+    first.close()
+    assert screen_stream.get_stream("10.0.0.1:5555") is stream
+    second.close()
+    assert stream.viewers == 0
+    assert not stream.running
+    assert screen_stream.get_stream("10.0.0.1:5555") is None
+
+
+def test_pinned_stream_outlives_its_viewers(adb_server):
+    stream = screen_stream.start_stream("10.0.0.1:5555")
+    frames = screen_stream.mjpeg_frames(stream)
+    next(frames)
+    # Started through the API while a viewer was watching
+    assert screen_stream.start_stream("10.0.0.1:5555", pinned=True) is stream
+    
+    frames.close()
+    assert screen_stream.get_stream("10.0.0.1:5555") is stream
@@ -7,6 +7,7 @@ Scrapes motorcheck.co.uk to retrieve vehicle make and model information
 import re
 import sqlite3
 import logging
+import threading
 from datetime import datetime, timedelta
 import requests
 from bs4 import BeautifulSoup
@@ -15,6 +16,11 @@ DB_PATH = "data/screen_control.db"
 
 logger = logging.getLogger(__name__)
 
+# In-memory copy of vehicle_overrides keyed by registration (see get_all_vehicle_overrides)
+_overrides_cache = None
+_overrides_version = 0
+_overrides_lock = threading.Lock()
+
 
 def normalize_registration(reg):
     """Normalize vehicle registration (remove spaces, dashes, uppercase)"""
@@ -136,31 +142,60 @@ def title_case(slug):
     return ' '.join(w.capitalize() if w else '' for w in words).strip()
 
 
+def get_all_vehicle_overrides():
+    """
+    Get all saved overrides keyed by normalized registration
+    
+    Loaded with a single query and kept in memory until an override is saved or
+    cleaned up, so enriching every DWVVEH row costs one dict lookup per vehicle.
+    Treat the returned mapping as read-only.
+    """
+    global _overrides_cache
+    
+    with _overrides_lock:
+        if _overrides_cache is not None:
+            return _overrides_cache
+        
+        try:
+            conn = sqlite3.connect(DB_PATH)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT registration, make_model, created_date, last_used_date
+                FROM vehicle_overrides
+            """)
+            
+            rows = cursor.fetchall()
+            conn.close()
+            
+            _overrides_cache = {row['registration']: dict(row) for row in rows}
+            return _overrides_cache
+            
+        except Exception as e:
+            logger.error(f"Error loading vehicle overrides: {e}")
+            return {}
+
+
+def get_overrides_version():
+    """Get a counter that changes whenever an override's make/model is added, changed or removed"""
+    return _overrides_version
+
+
+def _invalidate_overrides_cache():
+    """Drop the in-memory overrides so the next lookup reloads them"""
+    global _overrides_cache, _overrides_version
+    
+    with _overrides_lock:
+        _overrides_cache = None
+        _overrides_version += 1
+
+
 def get_vehicle_override(registration):
     """Get saved override for a registration"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        clean_reg = normalize_registration(registration)
-        
-        cursor.execute("""
-            SELECT registration, make_model, created_date, last_used_date
-            FROM vehicle_overrides
-            WHERE registration = ?
-        """, (clean_reg,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return dict(row)
-        return None
-        
-    except Exception as e:
-        logger.error(f"Error getting vehicle override: {e}")
-        return None
+    clean_reg = normalize_registration(registration)
+    override = get_all_vehicle_overrides().get(clean_reg)
+    return dict(override) if override else None
 
 
 def save_vehicle_override(registration, make_model):
@@ -182,6 +217,8 @@ def save_vehicle_override(registration, make_model):
         conn.commit()
         conn.close()
         
+        _update_cached_override(clean_reg, make_model)
+        
         return True
         
     except Exception as e:
@@ -189,6 +226,18 @@ def save_vehicle_override(registration, make_model):
         return False
 
 
+def _update_cached_override(clean_reg, make_model):
+    """Apply a saved override to the in-memory map"""
+    with _overrides_lock:
+        existing = _overrides_cache.get(clean_reg) if _overrides_cache is not None else None
+        if existing and existing['make_model'] == make_model:
+            # Only last_used_date moved - enriched load data is unchanged
+            existing['last_used_date'] = datetime.now().isoformat()
+            return
+    
+    _invalidate_overrides_cache()
+
+
 def cleanup_old_overrides(days=14):
     """Delete vehicle overrides older than specified days"""
     try:
@@ -206,6 +255,9 @@ def cleanup_old_overrides(days=14):
         conn.commit()
         conn.close()
         
+        if deleted_count:
+            _invalidate_overrides_cache()
+        
         logger.info(f"Cleaned up {deleted_count} old vehicle overrides (older than {days} days)")
         return deleted_count
         